@@ -1,16 +1,22 @@
 import json
-import yfinance as yf
 import pandas as pd
+import numpy as np
 import os
-import requests
-import telebot
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import cassete
+from metricas import metricas
+from cotacoes import servico_cotacoes
+from referencias import carregar_referencias, comparar_trades
+from notificador import notificador
+from contabilidade import CAPITAL_INICIAL, APOSTA_POR_TRADE, TAXA_OPERACIONAL
+from banco_trades import (conectar, ler_meta, gravar_meta, listar_trades, trades_abertos, atualizar_trades,
+                          fechar_trade, registrar_ponto_curva, ler_curva, limpar_curva, ultimos_trades,
+                          contar_trades, primeiro_dia, trades_por_id)
 
 # --- INFRAESTRUTURA BLINDADA ---
 DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
 CAMINHO_ENV = os.path.join(DIRETORIO_BASE, '.env')
-CAMINHO_TRADES = os.path.join(DIRETORIO_BASE, 'trades_simulados.json')
 CAMINHO_HTML = os.path.join(DIRETORIO_BASE, 'dashboard.html')
 
 load_dotenv(CAMINHO_ENV)
@@ -18,50 +24,147 @@ load_dotenv(CAMINHO_ENV)
 # --- CONFIGURAÇÕES ---
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-CAPITAL_INICIAL = 10000.00
-APOSTA_POR_TRADE = 2000.00
 
-# --- CHOQUE DE REALIDADE (TAXAS) ---
-# 0.03% B3 + 0.07% Slippage estimado = 0.1% por ponta (0.001)
-# Total Ida e Volta = 0.2% aprox.
-TAXA_OPERACIONAL = 0.001 
+# --- FUNÇÕES AUXILIARES ---
+# CDI e IBOV vêm do armazenamento local do referencias.py (só baixa o que é
+# novo) e cada trade é comparado com a referência na MESMA janela
+# (entrada -> saída), em vez de um único acumulado desde o primeiro trade.
+def _janelas(trades, hoje):
+    """(entradas, saídas, resultado líquido %) dos trades; os abertos vão até hoje."""
+    entradas = [t['data'][:10] for t in trades]
+    saidas = [hoje if t['status'] == "ABERTO" else t.get('data_saida', t['data'])[:10] for t in trades]
+    resultados = [t['resultado_liquido_pct'] if t['status'] == "ABERTO" and 'resultado_liquido_pct' in t
+                  else _resultado_salvo(t) / APOSTA_POR_TRADE * 100 for t in trades]
+    return entradas, saidas, resultados
+
+def _somar_comparacao(checkpoint, trades, referencias, hoje):
+    """
+    Acumula no checkpoint quantos trades fechados bateram cada referência no
+    próprio período. Só entra a janela que a referência já cobre por inteiro
+    (o CDI do dia sai no dia seguinte e a barra de hoje do IBOV é parcial); as
+    demais ficam em pendentes_<nome> e são refeitas nas próximas auditorias.
+    """
+    if not trades:
+        return
+    entradas, saidas, resultados = _janelas(trades, hoje)
+    ids = np.array([t['id'] for t in trades])
+    antes_de_hoje = np.array(saidas) < hoje
+    for nome, (periodo, excesso) in comparar_trades(referencias, entradas, saidas, resultados).items():
+        prontos = antes_de_hoje & referencias[nome].cobre(saidas)
+        validos = prontos & np.isfinite(excesso)
+        checkpoint[f'comparados_{nome}'] = checkpoint.get(f'comparados_{nome}', 0) + int(validos.sum())
+        checkpoint[f'acima_{nome}'] = checkpoint.get(f'acima_{nome}', 0) + int((excesso[validos] > 0).sum())
+        checkpoint[f'excesso_{nome}'] = checkpoint.get(f'excesso_{nome}', 0.0) + float(excesso[validos].sum())
+        checkpoint[f'pendentes_{nome}'] = checkpoint.get(f'pendentes_{nome}', []) + ids[~prontos].tolist()
 
-bot = telebot.TeleBot(TELEGRAM_TOKEN)
+def _somar_pendentes(conn, checkpoint, referencias, hoje):
+    """Refaz as janelas que ainda não estavam cobertas (cada referência com a sua lista)."""
+    for nome, serie in referencias.items():
+        pendentes = checkpoint.get(f'pendentes_{nome}', [])
+        if pendentes:
+            checkpoint[f'pendentes_{nome}'] = []
+            _somar_comparacao(checkpoint, trades_por_id(pendentes, conn), {nome: serie}, hoje)
 
-# --- FUNÇÕES AUXILIARES ---
-def get_cdi_acumulado(data_inicio):
-    try:
-        data_fmt = datetime.strptime(data_inicio, "%Y-%m-%d").strftime("%d/%m/%Y")
-        hoje_fmt = datetime.now().strftime("%d/%m/%Y")
-        url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.11/dados?formato=json&dataInicial={data_fmt}&dataFinal={hoje_fmt}"
-        response = requests.get(url)
-        dados = response.json()
-        fator = 1.0
-        for dia in dados:
-            taxa = float(dia['valor']) / 100
-            fator *= (1 + taxa/100)
-        return (fator - 1) * 100
-    except:
-        return 0.5
-
-def get_ibov_acumulado(data_inicio):
-    try:
-        ibov = yf.download("^BVSP", start=data_inicio, progress=False)
-        if ibov.empty: return 0.0
-        inicio = ibov['Close'].iloc[0].item()
-        fim = ibov['Close'].iloc[-1].item()
-        return ((fim - inicio) / inicio) * 100
-    except:
-        return 0.0
+def _comparar_recentes(trades, referencias, hoje):
+    """Anexa a cada trade da tabela o retorno do CDI/IBOV no período dele (não é gravado)."""
+    for nome, (periodo, _) in comparar_trades(referencias, *_janelas(trades, hoje)).items():
+        for trade, valor in zip(trades, periodo):
+            trade[f'{nome}_periodo_pct'] = float(valor)
+
+def _resumo_benchmarks(checkpoint, referencias, hoje):
+    benchmarks = {}
+    for nome, serie in referencias.items():
+        comparados = checkpoint.get(f'comparados_{nome}', 0)
+        inicio = checkpoint.get('data_inicio')
+        benchmarks[nome] = serie.retorno(inicio, hoje) if inicio else float('nan')
+        benchmarks[f'acima_{nome}_pct'] = checkpoint[f'acima_{nome}'] / comparados * 100 if comparados else float('nan')
+        benchmarks[f'excesso_{nome}_medio'] = checkpoint[f'excesso_{nome}'] / comparados if comparados else float('nan')
+    return benchmarks
+
+def _pct(valor, casas=2):
+    return "--" if valor is None or not np.isfinite(valor) else f"{valor:.{casas}f}%"
 
 # --- GERADOR DE DASHBOARD ---
-def gerar_html(stats, trades, benchmarks):
+# O arquivo vai inteiro pelo Telegram: tamanho e tempo de render não podem
+# crescer com o histórico. A tabela traz só os trades mais recentes (paginada
+# no navegador) e a curva de capital é reduzida por LTTB a um nº fixo de pontos.
+DASHBOARD_MAX_TRADES = int(os.getenv("DASHBOARD_MAX_TRADES", "1000"))
+DASHBOARD_MAX_PONTOS = int(os.getenv("DASHBOARD_MAX_PONTOS", "500"))
+TRADES_POR_PAGINA = 50
+
+def lttb(valores, limite):
+    """
+    Largest-Triangle-Three-Buckets: índices de `limite` pontos que preservam o
+    formato da série (picos e vales ficam). Primeiro e último sempre entram.
+    """
+    n = len(valores)
+    if limite >= n or limite < 3:
+        return np.arange(n)
+    y = np.asarray(valores, dtype='f8')
+    x = np.arange(n, dtype='f8')
+    passo = (n - 2) / (limite - 2)
+    indices = np.empty(limite, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(limite - 2):
+        ini = int(i * passo) + 1
+        fim = int((i + 1) * passo) + 1
+        # Vértice C: média do balde seguinte (o último balde usa o ponto final)
+        prox_fim = min(int((i + 2) * passo) + 1, n) if i < limite - 3 else n
+        cx, cy = x[fim:prox_fim].mean(), y[fim:prox_fim].mean()
+        area = np.abs((x[a] - cx) * (y[ini:fim] - y[a]) - (x[a] - x[ini:fim]) * (cy - y[a]))
+        a = ini + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+def _linha_trade(t):
+    # Mostra o resultado LÍQUIDO (já descontado taxas)
+    res_val = t.get('resultado_liquido_pct', 0)
+    
+    tag_class = "tag"
+    if t['status'] == "GAIN": tag_class += " gain"
+    elif t['status'] == "LOSS": tag_class += " loss"
+
+    ft = t.get('features_tecnicas', {})
+    if ft:
+        raio_x = (f"<div class=\"tech-data\">RSI: <b>{ft.get('rsi', 0):.1f}</b> | Vol: <b>{ft.get('volume_ratio', 0):.2f}x</b><br>"
+                  f"MM200: <b>{ft.get('distancia_sma200_pct', 0):.1f}%</b></div>")
+    else:
+        raio_x = "<span class='tech-data'>--</span>"
+
+    return (f"<tr><td>{t['data'].split(' ')[0]}</td>"
+            f"<td><b style=\"color: #58a6ff\">{t['ticker']}</b></td>"
+            f"<td>{raio_x}</td>"
+            f"<td>Ent: {t['entrada']}<br>Sai: {float(t.get('preco_atual', 0)):.2f}</td>"
+            f"<td style=\"color: {'#00ff88' if res_val>=0 else '#ff4d4d'}\">{res_val:.2f}%</td>"
+            f"<td class=\"tech-data\">{_pct(t.get('cdi_periodo_pct'))} / {_pct(t.get('ibov_periodo_pct'))}</td>"
+            f"<td><span class=\"{tag_class}\">{t['status']}</span></td></tr>\n")
+
+def gerar_html(stats, trades, benchmarks, curva=None, total_trades=None):
+    """
+    Grava o dashboard em streaming (linha a linha no arquivo, sem montar a
+    página numa string). `trades` em ordem de registro: só os últimos
+    DASHBOARD_MAX_TRADES entram na tabela; `total_trades` é o tamanho do
+    histórico completo (padrão: len(trades)).
+    """
     cor_saldo = "#00ff88" if stats['lucro_liquido'] >= 0 else "#ff4d4d"
+    total_trades = len(trades) if total_trades is None else total_trades
+    recentes = trades[-DASHBOARD_MAX_TRADES:] if DASHBOARD_MAX_TRADES > 0 else trades
     
-    chart_labels = json.dumps(["Início"] + [t['data'].split(' ')[0] for t in trades])
-    chart_data = json.dumps([CAPITAL_INICIAL] + [CAPITAL_INICIAL + t['acumulado'] for t in trades])
+    # Curva de capital: pontos (data, acumulado) do checkpoint; sem ela, usa os trades
+    if curva is None:
+        curva = [(t['data'].split(' ')[0], t.get('acumulado', 0)) for t in trades]
+    labels = ["Início"] + [data for data, _ in curva]
+    valores = [CAPITAL_INICIAL] + [CAPITAL_INICIAL + acumulado for _, acumulado in curva]
+    pontos = lttb(valores, DASHBOARD_MAX_PONTOS)
+    chart_labels = json.dumps([labels[i] for i in pontos])
+    chart_data = json.dumps([round(valores[i], 2) for i in pontos])
+
+    aviso = ""
+    if len(recentes) < total_trades:
+        aviso = f"<div class=\"obs\" style=\"color: #8b949e\">Tabela com os {len(recentes)} trades mais recentes de {total_trades}.</div>"
     
-    html = f"""
+    cabecalho = f"""
     <!DOCTYPE html>
     <html lang="pt-br">
     <head>
@@ -85,6 +188,8 @@ def gerar_html(stats, trades, benchmarks):
             .loss {{ background: rgba(255,77,77,0.15); color: #ff4d4d; }}
             .tech-data {{ font-family: 'Courier New', monospace; font-size: 11px; color: #8b949e; }}
             .obs {{ font-size: 10px; color: #ff4d4d; margin-top: 5px; }}
+            .paginas {{ display: flex; gap: 10px; align-items: center; justify-content: flex-end; margin: 10px 0; color: #8b949e; font-size: 13px; }}
+            .paginas button {{ background: #21262d; color: #c9d1d9; border: 1px solid #30363d; border-radius: 6px; padding: 4px 12px; cursor: pointer; }}
         </style>
     </head>
     <body>
@@ -101,13 +206,20 @@ def gerar_html(stats, trades, benchmarks):
                 <div class="card"><h3>Saldo Líquido</h3><div class="value" style="color: {cor_saldo}">R$ {stats['lucro_liquido']:.2f}</div></div>
                 <div class="card"><h3>Win Rate</h3><div class="value">{stats['win_rate']:.0f}%</div></div>
                 <div class="card"><h3>Rentabilidade</h3><div class="value">{stats['rentabilidade_pct']:.2f}%</div></div>
-                <div class="card"><h3>CDI Ref.</h3><div class="value" style="color: #58a6ff">{benchmarks['cdi']:.2f}%</div></div>
+                <div class="card"><h3>CDI Ref.</h3><div class="value" style="color: #58a6ff">{_pct(benchmarks['cdi'])}</div></div>
+                <div class="card"><h3>IBOV Ref.</h3><div class="value" style="color: #58a6ff">{_pct(benchmarks['ibov'])}</div></div>
+                <div class="card"><h3>Trades &gt; CDI / IBOV</h3><div class="value">{_pct(benchmarks.get('acima_cdi_pct'), 0)} / {_pct(benchmarks.get('acima_ibov_pct'), 0)}</div>
+                    <div class="obs" style="color: #8b949e">Mesma janela de cada trade | excesso médio {_pct(benchmarks.get('excesso_cdi_medio'))} / {_pct(benchmarks.get('excesso_ibov_medio'))}</div></div>
             </div>
 
             <div class="card" style="height: 300px; margin-bottom: 30px;">
                 <canvas id="equityCurve"></canvas>
             </div>
 
+            {aviso}
+            <div class="paginas">
+                <button onclick="mudarPagina(-1)">‹</button><span id="pagina"></span><button onclick="mudarPagina(1)">›</button>
+            </div>
             <table>
                 <thead>
                     <tr>
@@ -116,44 +228,14 @@ def gerar_html(stats, trades, benchmarks):
                         <th>Raio-X Técnico</th>
                         <th>Entrada / Saída</th>
                         <th>Res Liq %</th>
+                        <th>CDI / IBOV no período</th>
                         <th>Status</th>
                     </tr>
                 </thead>
-                <tbody>
+                <tbody id="trades">
     """
-    
-    for t in reversed(trades):
-        # Mostra o resultado LÍQUIDO (já descontado taxas)
-        res_val = t.get('resultado_liquido_pct', 0)
-        
-        tag_class = "tag"
-        if t['status'] == "GAIN": tag_class += " gain"
-        elif t['status'] == "LOSS": tag_class += " loss"
-
-        ft = t.get('features_tecnicas', {})
-        raio_x = ""
-        if ft:
-            raio_x = f"""
-            <div class="tech-data">
-                RSI: <b>{ft.get('rsi', 0):.1f}</b> | Vol: <b>{ft.get('volume_ratio', 0):.2f}x</b><br>
-                MM200: <b>{ft.get('distancia_sma200_pct', 0):.1f}%</b>
-            </div>
-            """
-        else:
-            raio_x = "<span class='tech-data'>--</span>"
-
-        html += f"""
-            <tr>
-                <td>{t['data'].split(' ')[0]}</td>
-                <td><b style="color: #58a6ff">{t['ticker']}</b></td>
-                <td>{raio_x}</td>
-                <td>Ent: {t['entrada']}<br>Sai: {float(t.get('preco_atual', 0)):.2f}</td>
-                <td style="color: {'#00ff88' if res_val>=0 else '#ff4d4d'}">{res_val:.2f}%</td>
-                <td><span class="{tag_class}">{t['status']}</span></td>
-            </tr>
-        """
-
-    html += f"""
+
+    rodape = f"""
                 </tbody>
             </table>
         </div>
@@ -168,128 +250,204 @@ def gerar_html(stats, trades, benchmarks):
                         data: {chart_data},
                         borderColor: '#58a6ff',
                         backgroundColor: 'rgba(88, 166, 255, 0.1)',
-                        tension: 0.3, fill: true
+                        tension: 0.3, fill: true, pointRadius: 0
                     }}]
                 }},
-                options: {{ maintainAspectRatio: false, plugins: {{ legend: {{ display: false }} }}, scales: {{ x: {{ display: false }}, y: {{ grid: {{ color: '#30363d' }} }} }} }}
+                options: {{ animation: false, maintainAspectRatio: false, plugins: {{ legend: {{ display: false }} }}, scales: {{ x: {{ display: false }}, y: {{ grid: {{ color: '#30363d' }} }} }} }}
             }});
+
+            // Paginação: só as linhas da página atual ficam visíveis
+            const linhas = document.getElementById('trades').rows;
+            const porPagina = {TRADES_POR_PAGINA};
+            const totalPaginas = Math.max(1, Math.ceil(linhas.length / porPagina));
+            let pagina = 0;
+            function mudarPagina(delta) {{
+                pagina = Math.min(totalPaginas - 1, Math.max(0, pagina + delta));
+                for (let i = 0; i < linhas.length; i++) {{
+                    linhas[i].style.display = Math.floor(i / porPagina) === pagina ? '' : 'none';
+                }}
+                document.getElementById('pagina').textContent = `Página ${{pagina + 1}} de ${{totalPaginas}}`;
+            }}
+            mudarPagina(0);
         </script>
     </body>
     </html>
     """
     
     with open(CAMINHO_HTML, "w", encoding='utf-8') as f:
-        f.write(html)
+        f.write(cabecalho)
+        f.writelines(_linha_trade(t) for t in reversed(recentes))
+        f.write(rodape)
     return CAMINHO_HTML
 
 # --- LÓGICA DE AUDITORIA ---
-def auditar():
-    print("--- AUDITORIA REALISTA V7.2 (COM CUSTOS) ---")
+def _resultado_salvo(trade):
+    """Resultado líquido de um trade já fechado."""
+    # Aqui assumimos que trades antigos já calcularam custos ou deixamos como está
+    # Para o futuro, o ideal é recalcular se tiver o preço de saída
+    res_liquido = trade.get('resultado_liquido_financeiro', 0)
+    # Se não tiver o campo novo (legado), usa o antigo
+    if res_liquido == 0 and trade.get('resultado_pct', 0) != 0:
+         res_liquido = (trade.get('resultado_pct')/100) * APOSTA_POR_TRADE
+    return res_liquido
+
+def _reconstruir_checkpoint(conn, referencias):
+    """Passada completa (só na primeira vez ou com reconstruir=True): soma o histórico fechado."""
+    print("🧮 Reconstruindo checkpoint da auditoria a partir do histórico...")
+    trades = listar_trades(conn=conn)
+    checkpoint = {
+        "saldo": 0.0, "vitorias": 0, "derrotas": 0,
+        **{f'pendentes_{nome}': [] for nome in referencias},
+        # Banco vazio: fica sem data e o primeiro trade que aparecer define o início
+        "data_inicio": trades[0]['data'].split(' ')[0] if trades else None,
+    }
+    limpar_curva(conn)
+    for trade in trades:
+        if trade['status'] == "ABERTO": continue
+        checkpoint['saldo'] += _resultado_salvo(trade)
+        if trade['status'] == "GAIN": checkpoint['vitorias'] += 1
+        elif trade['status'] == "LOSS": checkpoint['derrotas'] += 1
+        data_saida = trade.get('data_saida', trade['data']).split(' ')[0]
+        registrar_ponto_curva(conn, trade['id'], data_saida, checkpoint['saldo'])
+    # Comparação com CDI/IBOV de todo o histórico fechado numa única passada vetorizada
+    fechados = [t for t in trades if t['status'] != "ABERTO"]
+    _somar_comparacao(checkpoint, fechados, referencias, datetime.now().strftime("%Y-%m-%d"))
+    gravar_meta(conn, 'auditoria', checkpoint)
+    return checkpoint
+
+def _avaliar_aberto(trade, ultimo):
+    """Atualiza o trade com a última barra. Retorna o resultado líquido se fechou, senão None."""
+    entrada = float(trade['entrada'])
+    alvo = float(trade['alvo'])
+    stop = float(trade['stop'])
+
+    high = float(ultimo['High'])
+    low = float(ultimo['Low'])
+    close = float(ultimo['Close'])
+
+    novo_status = "ABERTO"
+    preco_saida = close
+
+    if high >= alvo:
+        novo_status = "GAIN"
+        preco_saida = alvo
+    elif low <= stop:
+        novo_status = "LOSS"
+        preco_saida = stop
     
-    if not os.path.exists(CAMINHO_TRADES):
-        print("Arquivo de trades não encontrado.")
-        return
+    # --- CÁLCULO FINANCEIRO REALISTA ---
+    # Resultado Bruto
+    res_bruto_pct = ((preco_saida - entrada) / entrada)
+    
+    # Custos: Taxa na entrada + Taxa na saída
+    # Simplificação: Subtraímos a taxa do percentual bruto
+    # Se a taxa é 0.1% (0.001) por trade completo
+    res_liquido_pct = res_bruto_pct - TAXA_OPERACIONAL
+    
+    # Resultado Financeiro
+    res_financeiro_liquido = res_liquido_pct * APOSTA_POR_TRADE
+    
+    # Atualiza o trade
+    trade['status'] = novo_status
+    trade['preco_atual'] = preco_saida
+    trade['resultado_pct'] = res_bruto_pct * 100 # Mantemos o bruto para referência
+    trade['resultado_liquido_pct'] = res_liquido_pct * 100 # O que importa pro bolso
+    trade['resultado_liquido_financeiro'] = res_financeiro_liquido
+    
+    return res_financeiro_liquido if novo_status != "ABERTO" else None
+
+def auditar(reconstruir=False, enviar=True):
+    """
+    Auditoria incremental: o checkpoint (saldo, vitórias, derrotas) e a curva
+    de capital ficam no banco. Cada execução só baixa preços e reprocessa os
+    trades ABERTOS; fechamentos novos são anexados ao checkpoint.
+    Com `enviar=False` só atualiza banco e dashboard (sem Telegram).
+    """
+    print("--- AUDITORIA REALISTA V7.2 (COM CUSTOS) ---")
+    metricas.iniciar("auditoria")
+    resumo = {}
+    # Auditoria que falha no meio também deixa o registro de métricas
+    try:
+        return _auditar(reconstruir, enviar, resumo)
+    finally:
+        metricas.finalizar(**resumo)
+
+def _auditar(reconstruir, enviar, resumo):
+    hoje = datetime.now().strftime("%Y-%m-%d")
 
+    with metricas.cronometro("benchmarks"):
+        referencias = carregar_referencias()
+    
     try:
-        with open(CAMINHO_TRADES, "r") as f:
-            trades = json.load(f)
-    except:
+        with metricas.cronometro("banco"), conectar() as conn:
+            checkpoint = ler_meta(conn, 'auditoria')
+            # Checkpoint anterior à comparação com CDI/IBOV (ou às janelas pendentes): refaz uma vez
+            if checkpoint is None or reconstruir or 'pendentes_cdi' not in checkpoint:
+                checkpoint = _reconstruir_checkpoint(conn, referencias)
+            abertos = trades_abertos(conn)
+    except Exception as e:
+        print(f"Erro ao ler o banco de trades: {e}")
+        resumo['erro'] = str(e)
         return
 
-    if not trades: return
+    # Um único request em lote para todos os ativos em aberto
+    with metricas.cronometro("cotacoes"):
+        cotacoes = servico_cotacoes.obter([t['ticker'] for t in abertos])
 
-    data_inicio = trades[0]['data'].split(' ')[0]
-    saldo_acumulado = 0
-    vitorias = 0
-    derrotas = 0
-    trades_processados = []
+    # Fechamentos + checkpoint gravados na mesma transação (nunca ficam dessincronizados).
+    # BEGIN IMMEDIATE trava a escrita antes de reler o checkpoint: o que uma
+    # auditoria concorrente (serviço residente + auditor.py) gravou nesse meio
+    # tempo já está no checkpoint relido, e os nossos fechamentos somam sobre ele.
+    with metricas.cronometro("fechamentos"), conectar() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        checkpoint = ler_meta(conn, 'auditoria', checkpoint)
+        ainda_abertos = {t['id'] for t in trades_abertos(conn)}
+        # Início = primeiro trade (checkpoints antigos criados com o banco vazio guardavam a data da auditoria)
+        primeiro = primeiro_dia(conn)
+        if primeiro and (checkpoint.get('data_inicio') is None or primeiro < checkpoint['data_inicio']):
+            checkpoint['data_inicio'] = primeiro
+        _somar_pendentes(conn, checkpoint, referencias, hoje)
+        for trade in abertos:
+            ticker = trade['ticker']
+            if trade['id'] not in ainda_abertos:
+                continue  # Outra auditoria já fechou este trade
+            try:
+                cotacao = cotacoes.get(ticker)
+                if cotacao is None:
+                    trade['preco_atual'] = float(trade['entrada'])
+                    resultado = None
+                else:
+                    resultado = _avaliar_aberto(trade, cotacao)
+            except Exception as e:
+                print(f"Erro {ticker}: {e}")
+                continue
 
-    for trade in trades:
-        ticker = trade['ticker']
-        entrada = float(trade['entrada'])
-        alvo = float(trade['alvo'])
-        stop = float(trade['stop'])
-        
-        # Se já fechou, usa o dado salvo
-        if trade['status'] != "ABERTO":
-            # Aqui assumimos que trades antigos já calcularam custos ou deixamos como está
-            # Para o futuro, o ideal é recalcular se tiver o preço de saída
-            res_liquido = trade.get('resultado_liquido_financeiro', 0)
-            # Se não tiver o campo novo (legado), usa o antigo
-            if res_liquido == 0 and trade.get('resultado_pct', 0) != 0:
-                 res_liquido = (trade.get('resultado_pct')/100) * APOSTA_POR_TRADE
-            
-            saldo_acumulado += res_liquido
-            
-            if trade['status'] == "GAIN": vitorias += 1
-            elif trade['status'] == "LOSS": derrotas += 1
-            
-            trade['acumulado'] = saldo_acumulado
-            trades_processados.append(trade)
-            continue
-
-        # Se está ABERTO, atualiza
-        try:
-            df = yf.download(ticker, period="5d", progress=False)
-            if df.empty:
-                trade['preco_atual'] = entrada
-                trade['acumulado'] = saldo_acumulado
-                trades_processados.append(trade)
+            if resultado is None:
+                trade['acumulado'] = checkpoint['saldo']
+                atualizar_trades([trade], conn)
                 continue
-                
-            ultimo = df.iloc[-1]
-            high = float(ultimo['High'].iloc[0]) if isinstance(ultimo['High'], pd.Series) else float(ultimo['High'])
-            low = float(ultimo['Low'].iloc[0]) if isinstance(ultimo['Low'], pd.Series) else float(ultimo['Low'])
-            close = float(ultimo['Close'].iloc[0]) if isinstance(ultimo['Close'], pd.Series) else float(ultimo['Close'])
-
-            novo_status = "ABERTO"
-            preco_saida = close
-
-            if high >= alvo:
-                novo_status = "GAIN"
-                preco_saida = alvo
-                vitorias += 1
-            elif low <= stop:
-                novo_status = "LOSS"
-                preco_saida = stop
-                derrotas += 1
-            
-            # --- CÁLCULO FINANCEIRO REALISTA ---
-            # Resultado Bruto
-            res_bruto_pct = ((preco_saida - entrada) / entrada)
-            
-            # Custos: Taxa na entrada + Taxa na saída
-            # Simplificação: Subtraímos a taxa do percentual bruto
-            # Se a taxa é 0.1% (0.001) por trade completo
-            res_liquido_pct = res_bruto_pct - TAXA_OPERACIONAL
-            
-            # Resultado Financeiro
-            res_financeiro_liquido = res_liquido_pct * APOSTA_POR_TRADE
-            
-            # Atualiza o trade
-            trade['status'] = novo_status
-            trade['preco_atual'] = preco_saida
-            trade['resultado_pct'] = res_bruto_pct * 100 # Mantemos o bruto para referência
-            trade['resultado_liquido_pct'] = res_liquido_pct * 100 # O que importa pro bolso
-            trade['resultado_liquido_financeiro'] = res_financeiro_liquido
-            
-            if novo_status != "ABERTO": 
-                saldo_acumulado += res_financeiro_liquido
-            
-            trade['acumulado'] = saldo_acumulado
-            trades_processados.append(trade)
 
-        except Exception as e:
-            print(f"Erro {ticker}: {e}")
-            trade['acumulado'] = saldo_acumulado
-            trades_processados.append(trade)
+            trade['acumulado'] = checkpoint['saldo'] + resultado
+            trade['data_saida'] = hoje
+            if not fechar_trade(conn, trade):
+                continue  # Outra auditoria já fechou este trade
+            checkpoint['saldo'] += resultado
+            if trade['status'] == "GAIN": checkpoint['vitorias'] += 1
+            elif trade['status'] == "LOSS": checkpoint['derrotas'] += 1
+            registrar_ponto_curva(conn, trade['id'], hoje, checkpoint['saldo'])
+            _somar_comparacao(checkpoint, [trade], referencias, hoje)
+            print(f"🏁 {ticker} fechado: {trade['status']} (R$ {resultado:.2f})")
 
-    # Salva e Envia
-    with open(CAMINHO_TRADES, "w") as f:
-        json.dump(trades_processados, f, indent=4)
+        gravar_meta(conn, 'auditoria', checkpoint)
+        curva = ler_curva(conn)
+        # Dashboard: só os trades que cabem na tabela saem do banco
+        recentes = ultimos_trades(DASHBOARD_MAX_TRADES, conn)
+        total_trades = contar_trades(conn)
 
-    total = vitorias + derrotas
-    win_rate = (vitorias / total * 100) if total > 0 else 0
+    saldo_acumulado = checkpoint['saldo']
+    total = checkpoint['vitorias'] + checkpoint['derrotas']
+    resumo.update(abertos=len(abertos), fechados=total)
+    win_rate = (checkpoint['vitorias'] / total * 100) if total > 0 else 0
     patrimonio = CAPITAL_INICIAL + saldo_acumulado
     rentabilidade = ((patrimonio - CAPITAL_INICIAL) / CAPITAL_INICIAL) * 100
     
@@ -299,14 +457,22 @@ def auditar():
         "rentabilidade_pct": rentabilidade,
         "patrimonio_final": patrimonio
     }
-    benchmarks = {"cdi": get_cdi_acumulado(data_inicio), "ibov": 0.0}
+    with metricas.cronometro("benchmarks"):
+        benchmarks = _resumo_benchmarks(checkpoint, referencias, hoje)
+        _comparar_recentes(recentes, referencias, hoje)
     
-    arquivo_final = gerar_html(stats, trades_processados, benchmarks)
+    with metricas.cronometro("html"):
+        arquivo_final = gerar_html(stats, recentes, benchmarks, curva, total_trades)
+    if not enviar:
+        return arquivo_final
     
     print("📤 Enviando Relatório Realista...")
-    with open(arquivo_final, 'rb') as doc:
-        caption = f"🦅 **Auditoria Realista**\n(Descontando custos B3/Slippage)\n\n💰 Líquido: R$ {saldo_acumulado:.2f}\n📊 Rentab.: {rentabilidade:.2f}%"
-        bot.send_document(TELEGRAM_CHAT_ID, doc, caption=caption)
+    caption = f"🦅 **Auditoria Realista**\n(Descontando custos B3/Slippage)\n\n💰 Líquido: R$ {saldo_acumulado:.2f}\n📊 Rentab.: {rentabilidade:.2f}%"
+    # Vai para a fila do notificador (cópia do arquivo): Telegram lento não segura a auditoria
+    notificador.enviar_documento(TELEGRAM_CHAT_ID, arquivo_final, legenda=caption)
+    if cassete.cassete.ativo:
+        print(f"📼 {cassete.cassete.resumo()}")
 
 if __name__ == "__main__":
     auditar()
+    notificador.aguardar()
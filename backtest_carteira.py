@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from painel import montar_do_cache
+from contabilidade import CAPITAL_INICIAL, APOSTA_POR_TRADE, TAXA_OPERACIONAL
+from motor_backtest import (BARRA_INICIAL, RSI_MIN, RSI_MAX, ADX_MIN, STOP_PCT, ALVO_R, DIAS_MAX,
+                            painel_indicadores, sinais_entrada, saidas_por_barra)
+
+# --- CONFIGURAÇÃO (capital, aposta e taxa vêm do contabilidade.py, como no auditor.py) ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_CARTEIRA = os.path.join(DIRETORIO_BASE, 'carteira_alvo.json')
+CAMINHO_CURVA = os.path.join(DIRETORIO_BASE, 'curva_carteira.csv')
+MAX_POSICOES = int(CAPITAL_INICIAL // APOSTA_POR_TRADE)
+DATA_INICIO = "2016-01-01"
+
+# --- BACKTEST DE CARTEIRA ---
+# O backtester.py simula cada ativo sozinho e soma os R. Aqui todos os ativos
+# dividem o mesmo caixa: o motor anda data a data pelo painel ativo x data e,
+# em cada pregão, (1) realiza as saídas, (2) abre os sinais do dia enquanto
+# houver vaga e caixa para a aposta + taxa, (3) marca a carteira a mercado.
+# Saídas e sinais vêm pré-calculados para todas as barras (kernel vetorizado
+# do motor_backtest), então cada pregão é só aritmética de vetores por ativo.
+
+
+def preparar_carteira(painel, rsi_min=RSI_MIN, rsi_max=RSI_MAX, adx_min=ADX_MIN,
+                      stop_pct=STOP_PCT, alvo_r=ALVO_R, dias_max=DIAS_MAX, barra_inicial=BARRA_INICIAL):
+    """
+    Matrizes [ativo, data] na grade de datas do painel de indicadores:
+    sinal de entrada, data (índice) e preço de saída de uma entrada naquela
+    barra, fechamento com forward-fill (marcação a mercado) e ADX (prioridade).
+    """
+    n_ativos, n_datas = len(painel.tickers), len(painel.datas)
+    sinal = np.zeros((n_ativos, n_datas), dtype=bool)
+    saida = np.full((n_ativos, n_datas), n_datas, dtype=np.int64)
+    preco_saida = np.full((n_ativos, n_datas), np.nan)
+    adx = np.full((n_ativos, n_datas), -np.inf)
+
+    for i, ticker in enumerate(painel.tickers):
+        a = {c: np.asarray(v, dtype='f8') if c != 'datas' else v for c, v in painel.arrays(ticker).items()}
+        n = len(a['close'])
+        if n <= barra_inicial:
+            continue
+        linhas = np.searchsorted(painel.datas, a['datas'])   # Barra local -> coluna do painel
+        s = sinais_entrada(a, rsi_min, rsi_max, adx_min)
+        s[:barra_inicial] = False
+        fim, res = saidas_por_barra(a['close'], a['high'], a['low'], stop_pct, alvo_r, dias_max)
+        risco = a['close'] * (1 - stop_pct)
+
+        sinal[i, linhas] = s
+        encerra = fim < n
+        saida[i, linhas[encerra]] = linhas[fim[encerra]]      # Sem saída nos dados: fica aberta até o fim
+        preco_saida[i, linhas] = a['close'] + res * risco
+        adx[i, linhas] = np.nan_to_num(a['adx'], nan=-np.inf)
+
+    # Fechamento do dia para marcar a mercado (dia sem negócio = último preço)
+    close = painel.valores[:, :, painel.campos.index("close")].astype('f8')
+    close = pd.DataFrame(close.T).ffill().to_numpy().T
+    return {"sinal": sinal, "saida": saida, "preco_saida": preco_saida, "close": close, "prioridade": adx}
+
+
+def simular_carteira(painel, capital=CAPITAL_INICIAL, aposta=APOSTA_POR_TRADE, max_posicoes=MAX_POSICOES,
+                     taxa=TAXA_OPERACIONAL, preparado=None, **regras):
+    """
+    Simula a carteira no painel de indicadores (CAMPOS_MOTOR). Retorna
+    {'curva': DataFrame diário, 'trades': DataFrame, 'metricas': dict}.
+    Empate de sinais no mesmo dia: maior ADX primeiro.
+    """
+    m = preparado or preparar_carteira(painel, **regras)
+    n_ativos, n_datas = m['sinal'].shape
+
+    caixa = float(capital)
+    posicionado = np.zeros(n_ativos, dtype=bool)
+    livre_em = np.zeros(n_ativos, dtype=np.int64)     # Reentrada só depois da barra de saída
+    qtd = np.zeros(n_ativos)
+    saida_pos = np.zeros(n_ativos, dtype=np.int64)
+    preco_saida_pos = np.zeros(n_ativos)
+    entrada_pos = np.zeros(n_ativos)
+    data_entrada = np.zeros(n_ativos, dtype=np.int64)
+
+    patrimonio = np.empty(n_datas)
+    caixa_dia = np.empty(n_datas)
+    abertas_dia = np.empty(n_datas, dtype=np.int64)
+    trades = []
+    sem_vaga = sem_caixa = 0
+
+    for d in range(n_datas):
+        # 1) Saídas do dia (stop/alvo durante o pregão, time stop no fechamento)
+        saindo = np.flatnonzero(posicionado & (saida_pos == d))
+        if len(saindo):
+            bruto = qtd[saindo] * preco_saida_pos[saindo]
+            caixa += float((bruto * (1 - taxa)).sum())
+            custo = qtd[saindo] * entrada_pos[saindo] * (1 + taxa)
+            for k, i in enumerate(saindo):
+                trades.append((i, data_entrada[i], d, entrada_pos[i], preco_saida_pos[i], qtd[i],
+                               bruto[k] * (1 - taxa) - custo[k]))
+            posicionado[saindo] = False
+            livre_em[saindo] = d + 1
+
+        # 2) Entradas no fechamento, enquanto houver vaga e caixa
+        candidatos = np.flatnonzero(m['sinal'][:, d] & ~posicionado & (livre_em <= d))
+        if len(candidatos):
+            candidatos = candidatos[np.argsort(-m['prioridade'][candidatos, d], kind='stable')]
+            vagas = max_posicoes - int(posicionado.sum())
+            for i in candidatos:
+                preco = m['close'][i, d]
+                quantidade = np.floor(aposta / preco)
+                custo = quantidade * preco * (1 + taxa)
+                if vagas <= 0:
+                    sem_vaga += 1
+                    continue
+                if quantidade < 1 or custo > caixa:
+                    sem_caixa += 1
+                    continue
+                caixa -= custo
+                vagas -= 1
+                posicionado[i] = True
+                qtd[i], entrada_pos[i], data_entrada[i] = quantidade, preco, d
+                saida_pos[i], preco_saida_pos[i] = m['saida'][i, d], m['preco_saida'][i, d]
+
+        # 3) Marcação a mercado
+        abertas = np.flatnonzero(posicionado)
+        patrimonio[d] = caixa + float((qtd[abertas] * m['close'][abertas, d]).sum())
+        caixa_dia[d] = caixa
+        abertas_dia[d] = len(abertas)
+
+    datas = pd.DatetimeIndex(np.asarray(painel.datas).astype('datetime64[ns]'), name="Date")
+    curva = pd.DataFrame({"patrimonio": patrimonio, "caixa": caixa_dia, "posicoes": abertas_dia}, index=datas)
+    df_trades = pd.DataFrame(trades, columns=["ativo", "i_entrada", "i_saida", "preco_entrada", "preco_saida",
+                                              "quantidade", "resultado"])
+    if len(df_trades):
+        df_trades.insert(0, "ticker", [painel.tickers[i] for i in df_trades.pop("ativo")])
+        df_trades.insert(1, "data_entrada", datas[df_trades.pop("i_entrada").to_numpy()])
+        df_trades.insert(2, "data_saida", datas[df_trades.pop("i_saida").to_numpy()])
+    return {"curva": curva, "trades": df_trades,
+            "metricas": metricas_carteira(curva, df_trades, capital, int(posicionado.sum()), sem_vaga, sem_caixa)}
+
+
+def metricas_carteira(curva, trades, capital, abertas_no_fim=0, sem_vaga=0, sem_caixa=0):
+    patrimonio = curva['patrimonio'].to_numpy()
+    if len(patrimonio) == 0:
+        return {}
+    pico = np.maximum.accumulate(np.concatenate([[capital], patrimonio]))[1:]
+    anos = max((curva.index[-1] - curva.index[0]).days / 365.25, 1e-9)
+    final = float(patrimonio[-1])
+    total = len(trades)
+    return {
+        "capital_final": final,
+        "retorno_pct": (final / capital - 1) * 100,
+        "cagr_pct": ((final / capital) ** (1 / anos) - 1) * 100 if final > 0 else -100.0,
+        "drawdown_pct": float(((pico - patrimonio) / pico).max() * 100),
+        "trades": total,
+        "win_rate": float((trades['resultado'] > 0).mean() * 100) if total else 0.0,
+        "exposicao_media": float(curva['posicoes'].mean()),
+        "abertas_no_fim": abertas_no_fim,
+        "sinais_sem_vaga": sem_vaga,
+        "sinais_sem_caixa": sem_caixa,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest de carteira: caixa compartilhado entre os ativos")
+    parser.add_argument("--inicio", default=DATA_INICIO)
+    parser.add_argument("--capital", type=float, default=CAPITAL_INICIAL)
+    parser.add_argument("--aposta", type=float, default=APOSTA_POR_TRADE)
+    parser.add_argument("--max-posicoes", type=int, default=MAX_POSICOES)
+    parser.add_argument("--taxa", type=float, default=TAXA_OPERACIONAL, help="por ponta")
+    parser.add_argument("--universo", action="store_true", help="Universo B3 inteiro (padrão: carteira_alvo.json)")
+    args = parser.parse_args()
+
+    if args.universo:
+        from gerador_universo import carregar_universo
+        ativos = carregar_universo()
+    else:
+        try:
+            with open(CAMINHO_CARTEIRA, "r") as f:
+                ativos = json.load(f)
+        except:
+            raise SystemExit("Erro: Gere a carteira_alvo.json primeiro.")
+
+    print(f"--- BACKTEST DE CARTEIRA ({len(ativos)} ativos desde {args.inicio}) ---")
+    inicio = time.perf_counter()
+    ohlcv = montar_do_cache(ativos, inicio=args.inicio)
+    painel = painel_indicadores(ohlcv)
+    ohlcv.liberar()
+    t_indicadores = time.perf_counter() - inicio
+    try:
+        t0 = time.perf_counter()
+        resultado = simular_carteira(painel, args.capital, args.aposta, args.max_posicoes, args.taxa)
+        t_simulacao = time.perf_counter() - t0
+    finally:
+        painel.liberar()
+
+    m = resultado['metricas']
+    resultado['curva'].to_csv(CAMINHO_CURVA)
+    print("\n" + "="*40)
+    print(f"CARTEIRA (máx. {args.max_posicoes} posições de R$ {args.aposta:.0f}, taxa {args.taxa * 100:.2f}%/ponta)")
+    print("="*40)
+    print(f"Total Trades: {m['trades']} ({m['abertas_no_fim']} abertas no fim)")
+    print(f"Win Rate: {m['win_rate']:.2f}%")
+    print(f"Rentabilidade: {m['retorno_pct']:.2f}% | CAGR {m['cagr_pct']:.2f}% | Drawdown máx. {m['drawdown_pct']:.2f}%")
+    print(f"Capital Final: R$ {m['capital_final']:.2f}")
+    print(f"Posições médias: {m['exposicao_media']:.2f} | Sinais perdidos: {m['sinais_sem_vaga']} sem vaga, "
+          f"{m['sinais_sem_caixa']} sem caixa")
+    print(f"⏱️ Dados + indicadores {t_indicadores:.1f}s | simulação {t_simulacao:.2f}s")
+    print(f"Curva diária salva em {CAMINHO_CURVA}")
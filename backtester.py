@@ -1,9 +1,11 @@
-import yfinance as yf
 import pandas as pd
 import json
+import os
 import numpy as np
-from ta.momentum import RSIIndicator
-from ta.trend import SMAIndicator, ADXIndicator
+from painel import DIRETORIO_PAINEL, montar_do_cache
+from motor_backtest import preparar_arrays, simular_ativo
+from metricas import metricas
+from robustez import monte_carlo, resumo_monte_carlo, imprimir_monte_carlo, robusto
 
 # --- CONFIGURAÇÃO ---
 CAPITAL_INICIAL = 10000.0
@@ -12,94 +14,51 @@ DATA_INICIO = "2023-01-01"
 
 def executar_backtest_otimizado():
     print(f"--- BACKTEST V2: OTIMIZADO ({DATA_INICIO}) ---")
-    
+    metricas.iniciar("backtest")
+    resumo = {}
+    # Saídas antecipadas (sem carteira, sem trades) também gravam as métricas
+    try:
+        _executar_backtest(resumo)
+    finally:
+        metricas.finalizar(**resumo)
+
+def _executar_backtest(resumo):
     try:
         with open("carteira_alvo.json", "r") as f:
             ativos = json.load(f)
     except:
         print("Erro: Gere a carteira_alvo.json primeiro.")
         return
+    resumo['ativos'] = len(ativos)
 
     trades_log = []
+    # Painel OHLCV float32 num arquivo mapeado: um DataFrame vivo por vez
+    with metricas.cronometro("dados"):
+        painel = montar_do_cache(ativos, os.path.join(DIRETORIO_PAINEL, 'backtest.npy'), inicio=DATA_INICIO)
     
     for ticker in ativos:
         # print(f"Analisando {ticker}...") # Comentei para limpar o terminal
         try:
-            df = yf.download(ticker, start=DATA_INICIO, progress=False)
-            if df.empty: continue
-            
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
+            if ticker not in painel: continue
+            df = painel.para_df(ticker)
 
-            # INDICADORES OTIMIZADOS
-            df['SMA200'] = SMAIndicator(df['Close'], window=200).sma_indicator()
-            df['SMA50'] = SMAIndicator(df['Close'], window=50).sma_indicator() # Tendência Média
-            df['RSI'] = RSIIndicator(df['Close'], window=14).rsi()
-            
-            # ADX - Mede a força da tendência (Evita mercado lateral)
-            adx = ADXIndicator(df['High'], df['Low'], df['Close'], window=14)
-            df['ADX'] = adx.adx()
+            # INDICADORES OTIMIZADOS (SMA200, SMA50, RSI, ADX) em arrays NumPy
+            with metricas.cronometro("indicadores", ticker):
+                arrays = preparar_arrays(df)
 
-            posicionado = False
-            preco_entrada = 0.0
-            stop_loss = 0.0
-            take_profit = 0.0
-            dias = 0
-            
-            for i in range(200, len(df)):
-                hoje = df.iloc[i]
-                
-                if not posicionado:
-                    # REGRA 1: Tendência Sólida (Preço > SMA200 E SMA50)
-                    tendencia = (hoje['Close'] > hoje['SMA200']) and (hoje['Close'] > hoje['SMA50'])
-                    
-                    # REGRA 2: Tendência Forte (ADX > 20) - O segredo para evitar falsos rompimentos
-                    forca = hoje['ADX'] > 20
-                    
-                    # REGRA 3: Pullback Controlado (RSI não pode estar morto < 30, tem que estar reagindo)
-                    # Entramos quando RSI está entre 30 e 55
-                    pullback = (hoje['RSI'] < 55) and (hoje['RSI'] > 35)
-                    
-                    if tendencia and forca and pullback:
-                        preco_entrada = hoje['Close']
-                        
-                        # Stop Loss Otimizado: 2.5% fixo ou mínima recente (o que for menor)
-                        # Isso evita stops muito curtos que violam por ruído
-                        stop_loss = preco_entrada * 0.96 # 4% de stop (Dá espaço pro preço respirar)
-                        
-                        risk = preco_entrada - stop_loss
-                        take_profit = preco_entrada + (risk * 2.0) # Alvo 2x1 (diminuí um pouco para acertar mais)
-                        
-                        posicionado = True
-                        dias = 0
-                
-                else:
-                    dias += 1
-                    low = hoje['Low']
-                    high = hoje['High']
-                    
-                    sair = False
-                    res = 0
-                    
-                    if low <= stop_loss:
-                        res = -1
-                        sair = True
-                    elif high >= take_profit:
-                        res = 2
-                        sair = True
-                    elif dias > 15: # Time Stop mais curto
-                        sair = True
-                        risk = preco_entrada - stop_loss
-                        res = (hoje['Close'] - preco_entrada) / risk
-                    
-                    if sair:
-                        trades_log.append({"res": res})
-                        posicionado = False
+            # REGRAS: Tendência (Close > SMA200 e SMA50) + Força (ADX > 20) + Pullback (35 < RSI < 55)
+            # SAÍDA: Stop 4% | Alvo 2R | Time Stop 15 dias -> ver motor_backtest.py
+            with metricas.cronometro("simulacao", ticker):
+                _, _, resultados = simular_ativo(arrays)
+            trades_log.extend({"res": float(r)} for r in resultados)
 
-        except: continue
+        except:
+            metricas.contar("erros.ativo")
+            continue
             
     # RESULTADOS
     df_res = pd.DataFrame(trades_log)
+    resumo['trades'] = len(df_res)
     if df_res.empty: return
 
     wins = len(df_res[df_res['res'] > 0])
@@ -123,8 +82,16 @@ def executar_backtest_otimizado():
     print(f"Rentabilidade: {rent:.2f}%")
     print(f"Capital Final: R$ {saldo:.2f}")
     
-    if win_rate > 45:
+    # Uma ordem dos trades é só uma amostra: distribuição por bootstrap (robustez.py)
+    with metricas.cronometro("monte_carlo"):
+        resumo = resumo_monte_carlo(*monte_carlo(df_res['res'].to_numpy(), capital=CAPITAL_INICIAL,
+                                                 risco=RISCO_POR_TRADE))
+    imprimir_monte_carlo(resumo)
+
+    if win_rate > 45 and robusto(resumo):
         print("✅ SINAL VERDE: Acurácia aceitável. A IA agora fará o resto.")
+    elif win_rate > 45:
+        print("⚠️ ACURÁCIA OK, MAS FRÁGIL: Drawdown/prejuízo altos demais nas ordens reamostradas.")
     else:
         print("⚠️ AINDA ARRISCADO: Precisamos de stops mais longos.")
 
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import sqlite3
+from contextlib import contextmanager
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_BANCO = os.path.join(DIRETORIO_BASE, 'trades.sqlite')
+CAMINHO_TRADES_JSON = os.path.join(DIRETORIO_BASE, 'trades_simulados.json')
+
+# O trade completo fica em `registro` (mesmo formato do trades_simulados.json);
+# as colunas ao lado existem só para os índices.
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL,
+    dia TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    status TEXT NOT NULL,
+    registro TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_trades_ticker_dia ON trades (ticker, dia);
+CREATE INDEX IF NOT EXISTS idx_trades_status ON trades (status, id);
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS curva_capital (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    trade_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    acumulado REAL NOT NULL
+);
+"""
+
+
+@contextmanager
+def conectar(caminho=None):
+    """Conexão com transação: commit no sucesso, rollback em erro."""
+    caminho = caminho or CAMINHO_BANCO
+    conn = sqlite3.connect(caminho, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(ESQUEMA)
+        _importar_legado(conn)
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _para_linha(trade):
+    registro = {k: v for k, v in trade.items() if k != 'id'}
+    return (trade['data'], trade['data'][:10], trade['ticker'], trade['status'],
+            json.dumps(registro, ensure_ascii=False))
+
+
+def _para_trade(linha):
+    trade = json.loads(linha[1])
+    trade['id'] = linha[0]
+    return trade
+
+
+# --- META (checkpoints e flags) ---
+def ler_meta(conn, chave, padrao=None):
+    linha = conn.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+    return json.loads(linha[0]) if linha else padrao
+
+
+def gravar_meta(conn, chave, valor):
+    conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (chave, json.dumps(valor)))
+
+
+# --- IMPORTAÇÃO / EXPORTAÇÃO DO JSON ---
+def _importar_legado(conn):
+    """Na primeira abertura, migra o trades_simulados.json existente."""
+    if ler_meta(conn, 'json_importado'):
+        return
+    if os.path.exists(CAMINHO_TRADES_JSON):
+        importar_json(CAMINHO_TRADES_JSON, conn)
+    gravar_meta(conn, 'json_importado', True)
+    conn.commit()
+
+
+def importar_json(caminho, conn=None):
+    """Importa um histórico em JSON. Duplicatas (ticker, dia) são ignoradas."""
+    if conn is None:
+        with conectar() as conn:
+            return importar_json(caminho, conn)
+    with open(caminho, "r") as f:
+        historico = json.load(f)
+    antes = conn.total_changes
+    conn.executemany(
+        "INSERT OR IGNORE INTO trades (data, dia, ticker, status, registro) VALUES (?, ?, ?, ?, ?)",
+        [_para_linha(t) for t in historico])
+    return conn.total_changes - antes
+
+
+def exportar_json(caminho=CAMINHO_TRADES_JSON):
+    """Gera o arquivo no formato antigo (para quem ainda lê o JSON)."""
+    trades = listar_trades()
+    for t in trades:
+        t.pop('id', None)
+    with open(caminho, "w") as f:
+        json.dump(trades, f, indent=4)
+    return len(trades)
+
+
+# --- OPERAÇÕES ---
+def inserir_trade(trade):
+    """Insere o trade. Retorna False se já existe um do mesmo ticker no mesmo dia."""
+    with conectar() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO trades (data, dia, ticker, status, registro) VALUES (?, ?, ?, ?, ?)",
+            _para_linha(trade))
+        return cursor.rowcount == 1
+
+
+def listar_trades(status=None, conn=None):
+    """Trades em ordem de registro; com `status`, usa o índice e não lê os demais."""
+    if conn is None:
+        with conectar() as conn:
+            return listar_trades(status, conn)
+    if status is None:
+        linhas = conn.execute("SELECT id, registro FROM trades ORDER BY id").fetchall()
+    else:
+        linhas = conn.execute("SELECT id, registro FROM trades WHERE status = ? ORDER BY id",
+                              (status,)).fetchall()
+    return [_para_trade(l) for l in linhas]
+
+
+def trades_por_id(ids, conn=None):
+    """Trades com os ids informados, em ordem de registro."""
+    if conn is None:
+        with conectar() as conn:
+            return trades_por_id(ids, conn)
+    ids = list(ids)
+    linhas = []
+    for i in range(0, len(ids), 500):   # Limite de parâmetros do SQLite
+        bloco = ids[i:i + 500]
+        linhas += conn.execute(f"SELECT id, registro FROM trades WHERE id IN ({', '.join('?' * len(bloco))})",
+                               bloco).fetchall()
+    return [_para_trade(l) for l in sorted(linhas)]
+
+
+def ultimos_trades(limite, conn=None):
+    """Os `limite` trades mais recentes, em ordem de registro (limite <= 0 = todos)."""
+    if limite <= 0:
+        return listar_trades(conn=conn)
+    if conn is None:
+        with conectar() as conn:
+            return ultimos_trades(limite, conn)
+    linhas = conn.execute("SELECT id, registro FROM trades ORDER BY id DESC LIMIT ?", (limite,)).fetchall()
+    return [_para_trade(l) for l in reversed(linhas)]
+
+
+def contar_trades(conn=None):
+    if conn is None:
+        with conectar() as conn:
+            return contar_trades(conn)
+    return conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+
+def primeiro_dia(conn=None):
+    """Dia do primeiro trade registrado (None com o banco vazio)."""
+    if conn is None:
+        with conectar() as conn:
+            return primeiro_dia(conn)
+    linha = conn.execute("SELECT dia FROM trades ORDER BY id LIMIT 1").fetchone()
+    return linha[0] if linha else None
+
+
+def trades_abertos(conn=None):
+    return listar_trades("ABERTO", conn)
+
+
+def atualizar_trades(trades, conn=None):
+    """Regrava status/registro dos trades informados (precisam ter 'id'), numa transação."""
+    if conn is None:
+        with conectar() as conn:
+            return atualizar_trades(trades, conn)
+    conn.executemany(
+        "UPDATE trades SET status = ?, registro = ? WHERE id = ?",
+        [(t['status'], _para_linha(t)[4], t['id']) for t in trades])
+
+
+def fechar_trade(conn, trade):
+    """Grava o fechamento só se o trade ainda estava ABERTO (evita contar duas vezes)."""
+    cursor = conn.execute(
+        "UPDATE trades SET status = ?, registro = ? WHERE id = ? AND status = 'ABERTO'",
+        (trade['status'], _para_linha(trade)[4], trade['id']))
+    return cursor.rowcount == 1
+
+
+# --- CURVA DE CAPITAL (append-only, um ponto por fechamento) ---
+def registrar_ponto_curva(conn, trade_id, data, acumulado):
+    conn.execute("INSERT INTO curva_capital (trade_id, data, acumulado) VALUES (?, ?, ?)",
+                 (trade_id, data, acumulado))
+
+
+def ler_curva(conn=None):
+    if conn is None:
+        with conectar() as conn:
+            return ler_curva(conn)
+    return conn.execute("SELECT data, acumulado FROM curva_capital ORDER BY seq").fetchall()
+
+
+def limpar_curva(conn):
+    conn.execute("DELETE FROM curva_capital")
+
+
+if __name__ == "__main__":
+    # python banco_trades.py importar [arquivo.json] | exportar [arquivo.json]
+    comando = sys.argv[1] if len(sys.argv) > 1 else ""
+    arquivo = sys.argv[2] if len(sys.argv) > 2 else CAMINHO_TRADES_JSON
+    if comando == "importar":
+        print(f"📥 {importar_json(arquivo)} trade(s) importado(s) de {arquivo}")
+    elif comando == "exportar":
+        print(f"📤 {exportar_json(arquivo)} trade(s) exportado(s) para {arquivo}")
+    else:
+        print("Uso: python banco_trades.py importar|exportar [arquivo.json]")
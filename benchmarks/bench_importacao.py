@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import importlib.util
+
+DIRETORIO_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# O que o main_production carregava no import antes do modo lazy
+BIBLIOTECAS_PESADAS = ["crewai", "crewai.tools", "telebot", "yfinance", "ta", "duckduckgo_search", "ddgs"]
+
+
+def _disponivel(modulo):
+    try:
+        return importlib.util.find_spec(modulo) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def medir(codigo, repeticoes):
+    """Tempo de parede (s) de um processo Python novo executando `codigo`."""
+    env = dict(os.environ, TELEGRAM_TOKEN=os.getenv("TELEGRAM_TOKEN", "123:abc"))
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-c", codigo], cwd=DIRETORIO_REPO, env=env, check=True)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos), min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start do main_production: lazy x carga antecipada")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    pesadas = [m for m in BIBLIOTECAS_PESADAS if _disponivel(m)]
+    ausentes = [m for m in BIBLIOTECAS_PESADAS if m not in pesadas]
+    antecipado = "import main_production\n" + "".join(f"import {m}\n" for m in pesadas)
+    if "telebot" in pesadas:
+        antecipado += "main_production.obter_bot()\n"
+
+    cenarios = [
+        ("python -c pass (base)", "pass"),
+        ("import main_production (lazy)", "import main_production"),
+        ("import + libs de IA (antigo)", antecipado),
+    ]
+
+    print(f"Libs pesadas medidas: {', '.join(pesadas) or '-'}")
+    if ausentes:
+        print(f"⚠️ Não instaladas (fora da conta): {', '.join(ausentes)}")
+    resultados = {}
+    for nome, codigo in cenarios:
+        mediana, minimo = medir(codigo, args.repeticoes)
+        resultados[nome] = mediana
+        print(f"{nome:<34} mediana {mediana * 1000:7.0f} ms | mín {minimo * 1000:7.0f} ms")
+
+    lazy, antigo = resultados[cenarios[1][0]], resultados[cenarios[2][0]]
+    print(f"⏱️ Cold start: {antigo * 1000:.0f} ms -> {lazy * 1000:.0f} ms "
+          f"({(1 - lazy / antigo) * 100:.0f}% menor, {antigo / lazy:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor_backtest import preparar_arrays, simular_ativo
+from sintetico import gerar_painel
+
+
+def backtest_legado(df, a):
+    """Cópia fiel do loop df.iloc[i] original do backtester (referência de paridade)."""
+    df = df.copy()
+    df['SMA200'], df['SMA50'], df['RSI'], df['ADX'] = a['sma200'], a['sma50'], a['rsi'], a['adx']
+
+    trades_log = []
+    posicionado = False
+    preco_entrada = stop_loss = take_profit = 0.0
+    dias = 0
+    for i in range(200, len(df)):
+        hoje = df.iloc[i]
+        if not posicionado:
+            tendencia = (hoje['Close'] > hoje['SMA200']) and (hoje['Close'] > hoje['SMA50'])
+            forca = hoje['ADX'] > 20
+            pullback = (hoje['RSI'] < 55) and (hoje['RSI'] > 35)
+            if tendencia and forca and pullback:
+                preco_entrada = hoje['Close']
+                stop_loss = preco_entrada * 0.96
+                risk = preco_entrada - stop_loss
+                take_profit = preco_entrada + (risk * 2.0)
+                posicionado = True
+                dias = 0
+        else:
+            dias += 1
+            sair = False
+            res = 0
+            if hoje['Low'] <= stop_loss:
+                res = -1
+                sair = True
+            elif hoje['High'] >= take_profit:
+                res = 2
+                sair = True
+            elif dias > 15:
+                sair = True
+                risk = preco_entrada - stop_loss
+                res = (hoje['Close'] - preco_entrada) / risk
+            if sair:
+                trades_log.append({"res": res})
+                posicionado = False
+    return trades_log
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loop legado x kernel NumPy do backtest")
+    parser.add_argument("--tickers", type=int, default=400)
+    parser.add_argument("--anos", type=float, default=10)
+    parser.add_argument("--amostra-legado", type=int, default=20,
+                        help="ativos rodados no loop legado (o tempo total é extrapolado)")
+    args = parser.parse_args()
+
+    print(f"--- BENCHMARK MOTOR DE BACKTEST ({args.tickers} ativos x {args.anos:g} anos) ---")
+    painel = gerar_painel(args.tickers, args.anos)
+    tickers = list(painel)
+
+    t0 = time.perf_counter()
+    arrays = {t: preparar_arrays(painel[t]) for t in tickers}
+    t_indicadores = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    resultados = {t: simular_ativo(arrays[t])[2] for t in tickers}
+    t_kernel = time.perf_counter() - t0
+
+    amostra = tickers[:args.amostra_legado]
+    t0 = time.perf_counter()
+    legado = {t: backtest_legado(painel[t], arrays[t]) for t in amostra}
+    t_legado = time.perf_counter() - t0
+    t_legado_total = t_legado / max(len(amostra), 1) * len(tickers)
+
+    for t in amostra:
+        esperado = np.array([tr['res'] for tr in legado[t]], dtype='f8')
+        if not np.array_equal(esperado, resultados[t]):
+            raise SystemExit(f"❌ Divergência no trades_log de {t}")
+
+    total_trades = sum(len(r) for r in resultados.values())
+    print(f"✅ Paridade OK em {len(amostra)} ativos | {total_trades} trades no painel")
+    print(f"Indicadores (ta):       {t_indicadores:8.2f}s")
+    print(f"Kernel NumPy:           {t_kernel:8.2f}s")
+    print(f"Loop legado (estimado): {t_legado_total:8.2f}s  ({len(amostra)} ativos medidos)")
+    print(f"Speedup do loop:        {t_legado_total / t_kernel:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
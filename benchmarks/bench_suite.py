@@ -0,0 +1,281 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DIRETORIO_BENCH = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_REPO = os.path.dirname(DIRETORIO_BENCH)
+DIRETORIO_RESULTADOS = os.path.join(DIRETORIO_BENCH, 'resultados')
+sys.path.insert(0, DIRETORIO_REPO)
+
+# Nada sai para a rede: cassete desligado, token falso só para o import do telebot
+os.environ["CASSETE_MODO"] = ""
+os.environ.setdefault("TELEGRAM_TOKEN", "123:abc")
+
+import auditor
+import backtester
+import banco_trades
+import indicadores_incrementais
+import main_production
+import metricas
+from painel import Painel
+from referencias import SerieReferencia
+from screener import avaliar_setup
+from sintetico import gerar_painel, gerar_trades, gerar_referencias
+
+# --- CONFIGURAÇÃO ---
+TICKERS_PADRAO = "10,100,1000"
+ANOS_PADRAO = "1,5,20"
+LEDGERS_PADRAO = "1000,10000,100000"
+TRADES_AUDITORIA = 10000
+ABERTOS_AUDITORIA = 200
+NOVOS_TRADES = 200           # registrar_trade por tamanho de ledger
+TOLERANCIA_REGRESSAO = 0.15  # --comparar: mais de 15% acima do anterior = regressão
+
+
+# --- ISOLAMENTO (tudo num diretório temporário, sem rede nem Telegram) ---
+class CotacoesFalsas:
+    """Substitui o servico_cotacoes: barra do dia perto da entrada (o trade continua ABERTO)."""
+
+    def __init__(self, trades):
+        self.barras = {t['ticker']: {"Open": t['entrada'], "High": t['entrada'] * 1.01,
+                                     "Low": t['entrada'] * 0.99, "Close": t['entrada']} for t in trades}
+
+    def obter(self, tickers):
+        return {t: self.barras[t] for t in tickers if t in self.barras}
+
+
+def isolar(pasta):
+    banco_trades.CAMINHO_BANCO = os.path.join(pasta, 'trades.sqlite')
+    banco_trades.CAMINHO_TRADES_JSON = os.path.join(pasta, 'sem_legado.json')
+    indicadores_incrementais.DIRETORIO_ESTADO = os.path.join(pasta, 'estado_indicadores')
+    indicadores_incrementais._memoria.clear()
+    auditor.CAMINHO_HTML = os.path.join(pasta, 'dashboard.html')
+    metricas.CAMINHO_METRICAS = os.path.join(pasta, 'metricas.jsonl')
+    referencias = {nome: SerieReferencia(nome, *serie) for nome, serie in gerar_referencias().items()}
+    auditor.carregar_referencias = lambda: referencias
+    main_production.enviar_alerta = lambda sinal: None
+
+
+def cronometrar(funcao, repeticoes, preparar=None):
+    """Mediana do tempo de parede (s). `preparar` roda fora do cronômetro antes de cada repetição."""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+
+def _resetar_estado(origem=None):
+    destino = indicadores_incrementais.DIRETORIO_ESTADO
+    shutil.rmtree(destino, ignore_errors=True)
+    if origem:
+        shutil.copytree(origem, destino)
+    indicadores_incrementais._memoria.clear()
+
+
+def _remover_banco(caminho):
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+
+def _banco_com(trades, caminho):
+    """Ledger sintético gravado pelo mesmo caminho de importação do banco_trades."""
+    arquivo_json = caminho + ".json"
+    with open(arquivo_json, "w") as f:
+        json.dump(trades, f)
+    with banco_trades.conectar(caminho) as conn:
+        banco_trades.importar_json(arquivo_json, conn)
+    os.remove(arquivo_json)
+
+
+# --- CASOS ---
+def bench_mercado(pasta, n_tickers, anos, repeticoes, casos):
+    """Screener (histórico completo e barra nova) e loop do backtester no mesmo painel sintético."""
+    rotulo = f"{n_tickers}x{anos:g}a"
+    hoje = pd.Timestamp.today().normalize()
+    dfs = gerar_painel(n_tickers, anos, fim=hoje)
+    n_barras = sum(len(df) for df in dfs.values())
+
+    # avaliar_setup sem estado salvo: indicadores de todo o histórico
+    def screen(ate):
+        for ticker, df in dfs.items():
+            avaliar_setup(ticker, df.iloc[:ate] if ate else df)
+
+    t = cronometrar(lambda: screen(-1), repeticoes, preparar=_resetar_estado)
+    casos[f"screener_historico/{rotulo}"] = {"segundos": t, "tickers": n_tickers, "anos": anos,
+                                              "barras": n_barras, "us_por_barra": t / n_barras * 1e6}
+
+    # Execução seguinte: uma barra nova por ativo sobre o estado gravado
+    snapshot = os.path.join(pasta, 'estado_snapshot')
+    shutil.rmtree(snapshot, ignore_errors=True)
+    shutil.copytree(indicadores_incrementais.DIRETORIO_ESTADO, snapshot)
+    t = cronometrar(lambda: screen(None), repeticoes, preparar=lambda: _resetar_estado(snapshot))
+    casos[f"screener_barra_nova/{rotulo}"] = {"segundos": t, "tickers": n_tickers, "anos": anos,
+                                               "ms_por_ativo": t / n_tickers * 1000}
+
+    # executar_backtest_otimizado com o painel já montado (sem cache/yfinance)
+    with open(os.path.join(pasta, 'carteira_alvo.json'), "w") as f:
+        json.dump(list(dfs), f)
+    painel = Painel.de_dataframes(dfs, destino=os.path.join(pasta, 'painel.npy'))
+    del dfs
+    original = backtester.montar_do_cache
+    backtester.montar_do_cache = lambda ativos, destino=None, inicio=None, **kw: painel
+    diretorio = os.getcwd()
+    os.chdir(pasta)
+    try:
+        t = cronometrar(backtester.executar_backtest_otimizado, repeticoes)
+    finally:
+        os.chdir(diretorio)
+        backtester.montar_do_cache = original
+        painel.fechar()
+    casos[f"backtest_loop/{rotulo}"] = {"segundos": t, "tickers": n_tickers, "anos": anos,
+                                         "barras": n_barras, "us_por_barra": t / n_barras * 1e6}
+
+
+def bench_registrar(pasta, tamanho, repeticoes, casos):
+    """registrar_trade com `tamanho` trades já no banco (cada repetição parte do mesmo ledger)."""
+    modelo = os.path.join(pasta, f'ledger_{tamanho}.sqlite')
+    _banco_com(gerar_trades(tamanho, seed=tamanho), modelo)
+    sinais = [{"ticker": f"NOVO{i:04d}.SA", "entrada": 10.0 + i, "stop": 9.6 + i, "alvo": 10.8 + i,
+               "confianca": "ALTA", "motivo": "bench", "features_ml": {"rsi": 50.0}}
+              for i in range(NOVOS_TRADES)]
+
+    def preparar():
+        _remover_banco(banco_trades.CAMINHO_BANCO)
+        shutil.copyfile(modelo, banco_trades.CAMINHO_BANCO)
+
+    def registrar():
+        for sinal in sinais:
+            main_production.registrar_trade(sinal)
+
+    t = cronometrar(registrar, repeticoes, preparar)
+    casos[f"registrar_trade/{tamanho}"] = {"segundos": t, "ledger": tamanho,
+                                            "ms_por_trade": t / NOVOS_TRADES * 1000}
+
+
+def bench_auditoria(pasta, n_trades, repeticoes, casos):
+    """auditar (reconstrução e incremental) e gerar_html sobre `n_trades` trades."""
+    trades = gerar_trades(n_trades, abertos=ABERTOS_AUDITORIA, seed=7)
+    _remover_banco(banco_trades.CAMINHO_BANCO)
+    _banco_com(trades, banco_trades.CAMINHO_BANCO)
+    auditor.servico_cotacoes = CotacoesFalsas([t for t in trades if t['status'] == "ABERTO"])
+
+    t = cronometrar(lambda: auditor.auditar(reconstruir=True, enviar=False), repeticoes)
+    casos[f"auditar_reconstrucao/{n_trades}"] = {"segundos": t, "trades": n_trades}
+    t = cronometrar(lambda: auditor.auditar(enviar=False), repeticoes)
+    casos[f"auditar_incremental/{n_trades}"] = {"segundos": t, "trades": n_trades, "abertos": ABERTOS_AUDITORIA}
+
+    todos = banco_trades.listar_trades()
+    curva = banco_trades.ler_curva()
+    stats = {"lucro_liquido": curva[-1][1] if curva else 0.0, "win_rate": 45.0,
+             "rentabilidade_pct": 10.0, "patrimonio_final": auditor.CAPITAL_INICIAL}
+    t = cronometrar(lambda: auditor.gerar_html(stats, todos, {"cdi": 10.0, "ibov": 5.0}, curva), repeticoes)
+    casos[f"gerar_html/{n_trades}"] = {"segundos": t, "trades": n_trades,
+                                        "bytes_html": os.path.getsize(auditor.CAMINHO_HTML)}
+
+
+# --- RESULTADOS ---
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO_REPO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(casos, anterior):
+    """Imprime a variação por caso e devolve os que pioraram além da tolerância."""
+    regressoes = []
+    print(f"\n--- COMPARAÇÃO COM {anterior['commit'] or '?'} ({anterior['gerado_em']}) ---")
+    for nome, caso in casos.items():
+        antes = anterior['casos'].get(nome)
+        if antes is None:
+            continue
+        razao = caso['segundos'] / antes['segundos'] if antes['segundos'] > 0 else float('inf')
+        marca = "⚠️" if razao > 1 + TOLERANCIA_REGRESSAO else ("🚀" if razao < 1 - TOLERANCIA_REGRESSAO else "  ")
+        print(f"{marca} {nome:<34} {antes['segundos']:9.3f}s -> {caso['segundos']:9.3f}s ({razao:5.2f}x)")
+        if razao > 1 + TOLERANCIA_REGRESSAO:
+            regressoes.append(nome)
+    return regressoes
+
+
+def _lista(texto, tipo=int):
+    return [tipo(v) for v in texto.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de benchmarks offline dos caminhos quentes (dados sintéticos)")
+    parser.add_argument("--tickers", default=TICKERS_PADRAO, help="ex: 10,100,1000")
+    parser.add_argument("--anos", default=ANOS_PADRAO, help="ex: 1,5,20")
+    parser.add_argument("--ledgers", default=LEDGERS_PADRAO, help="tamanhos do banco para o registrar_trade")
+    parser.add_argument("--trades", type=int, default=TRADES_AUDITORIA, help="trades na auditoria/dashboard")
+    parser.add_argument("--repeticoes", type=int, default=1, help="mediana de N execuções por caso")
+    parser.add_argument("--rapido", action="store_true", help="grade reduzida (10,100 ativos x 1,5 anos)")
+    parser.add_argument("--saida", default=None, help="JSON de resultados (padrão: benchmarks/resultados/)")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior")
+    args = parser.parse_args()
+    if args.rapido:
+        args.tickers, args.anos, args.ledgers, args.trades = "10,100", "1,5", "1000,10000", 2000
+
+    casos = {}
+    inicio = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="bench_b3_") as pasta:
+        isolar(pasta)
+        for n_tickers in _lista(args.tickers):
+            for anos in _lista(args.anos, float):
+                print(f"📈 Screener + backtest: {n_tickers} ativos x {anos:g} anos...")
+                bench_mercado(pasta, n_tickers, anos, args.repeticoes, casos)
+        for tamanho in _lista(args.ledgers):
+            print(f"📝 registrar_trade com {tamanho} trades no banco...")
+            bench_registrar(pasta, tamanho, args.repeticoes, casos)
+        print(f"🧾 Auditoria e dashboard com {args.trades} trades...")
+        bench_auditoria(pasta, args.trades, args.repeticoes, casos)
+
+    print(f"\n{'Caso':<36}{'Tempo':>11}  Detalhe")
+    for nome, caso in casos.items():
+        detalhe = " | ".join(f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}"
+                             for k, v in caso.items() if k not in ("segundos", "tickers", "anos"))
+        print(f"{nome:<36}{caso['segundos']:10.3f}s  {detalhe}")
+
+    resultado = {
+        "gerado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _commit(),
+        "ambiente": {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+                     "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "parametros": vars(args),
+        "casos": casos,
+    }
+    saida = args.saida or os.path.join(DIRETORIO_RESULTADOS,
+                                       f"bench_{datetime.now():%Y%m%d_%H%M%S}_{resultado['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w") as f:
+        json.dump(resultado, f, indent=2)
+    print(f"\n💾 Resultados em {saida} ({time.perf_counter() - inicio:.0f}s no total)")
+
+    if args.comparar:
+        with open(args.comparar, "r") as f:
+            regressoes = comparar(casos, json.load(f))
+        if regressoes:
+            raise SystemExit(f"❌ {len(regressoes)} caso(s) mais lento(s) que a execução anterior")
+
+
+if __name__ == "__main__":
+    main()
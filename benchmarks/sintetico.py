@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# --- GERADOR DE MERCADO SINTÉTICO (reprodutível pela seed) ---
+PREGOES_POR_ANO = 252
+
+
+def gerar_ohlcv(n_barras, seed=0, preco_inicial=30.0, fim="2026-01-02"):
+    """Passeio aleatório log-normal com regimes de tendência, no formato do yfinance."""
+    rng = np.random.default_rng(seed)
+    # Deriva muda de regime a cada ~60 pregões para gerar tendências e pullbacks
+    regimes = np.repeat(rng.normal(0.0006, 0.0015, n_barras // 60 + 1), 60)[:n_barras]
+    retornos = rng.normal(regimes, 0.018)
+    close = preco_inicial * np.exp(np.cumsum(retornos))
+    abertura = close * np.exp(rng.normal(0, 0.004, n_barras))
+    amplitude = np.abs(rng.normal(0, 0.012, (2, n_barras)))
+    high = np.maximum(close, abertura) * (1 + amplitude[0])
+    low = np.minimum(close, abertura) * (1 - amplitude[1])
+    volume = rng.lognormal(14, 0.5, n_barras).round()
+
+    indice = pd.bdate_range(end=fim, periods=n_barras, name="Date")
+    return pd.DataFrame({"Open": abertura, "High": high, "Low": low,
+                         "Close": close, "Volume": volume}, index=indice)
+
+
+def gerar_painel(n_tickers, anos, seed=42, fim="2026-01-02"):
+    """{ticker: DataFrame} com n_tickers ativos de `anos` anos de pregões."""
+    n_barras = int(anos * PREGOES_POR_ANO)
+    return {f"SINT{i:04d}.SA": gerar_ohlcv(n_barras, seed=seed + i, preco_inicial=10 + (i % 90), fim=fim)
+            for i in range(n_tickers)}
+
+
+def gerar_trades(n_trades, abertos=0, seed=0, inicio="2016-01-04", por_dia=4):
+    """Histórico no formato do banco_trades: os `abertos` últimos ainda ABERTO, o resto GAIN/LOSS."""
+    rng = np.random.default_rng(seed)
+    datas = pd.bdate_range(start=inicio, periods=n_trades // por_dia + 1)
+    trades = []
+    for i in range(n_trades):
+        data = datas[i // por_dia]
+        entrada = round(float(rng.uniform(5, 100)), 2)
+        fechado = i < n_trades - abertos
+        status = ("GAIN" if rng.random() < 0.45 else "LOSS") if fechado else "ABERTO"
+        res_pct = (8.0 if status == "GAIN" else -4.0) if fechado else 0.0
+        trade = {
+            "data": f"{data:%Y-%m-%d} 17:30:00",
+            "ticker": f"SINT{i % 1000:04d}.SA",
+            "entrada": entrada, "stop": round(entrada * 0.96, 2), "alvo": round(entrada * 1.08, 2),
+            "status": status, "resultado_financeiro": 0.0, "resultado_pct": res_pct,
+            "confianca": "ALTA", "motivo_ia": "Sintético",
+            "features_tecnicas": {"rsi": float(rng.uniform(35, 65)), "adx": float(rng.uniform(20, 50)),
+                                  "volume_ratio": float(rng.uniform(0.5, 3)),
+                                  "distancia_sma200_pct": float(rng.uniform(0, 30))},
+        }
+        if fechado:
+            trade["data_saida"] = f"{data + pd.Timedelta(days=10):%Y-%m-%d}"
+            trade["preco_atual"] = trade["alvo"] if status == "GAIN" else trade["stop"]
+        trades.append(trade)
+    return trades
+
+
+def gerar_referencias(inicio="2015-01-02", fim="2026-01-02", seed=7):
+    """{'cdi', 'ibov'}: (datas ns, níveis) diários no formato das SerieReferencia do referencias.py."""
+    rng = np.random.default_rng(seed)
+    datas = pd.bdate_range(start=inicio, end=fim).as_unit('ns')
+    cdi = np.cumprod(np.full(len(datas), 1 + 0.045 / 100))   # ~12% ao ano
+    ibov = 100_000 * np.exp(np.cumsum(rng.normal(0.0003, 0.013, len(datas))))
+    return {"cdi": (datas.asi8, cdi), "ibov": (datas.asi8, ibov)}
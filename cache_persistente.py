@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_CACHE = os.path.join(DIRETORIO_BASE, 'cache_llm.sqlite')
+
+
+class CachePersistente:
+    """
+    Memoização em disco (SQLite) com validade (TTL), limite de itens
+    (despeja os menos acessados) e contadores de acerto/erro.
+    Vários caches nomeados dividem o mesmo arquivo.
+    """
+
+    def __init__(self, nome, ttl_segundos, max_itens=5000, caminho=CAMINHO_CACHE):
+        self.nome = nome
+        self.ttl = ttl_segundos
+        self.max_itens = max_itens
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                nome TEXT NOT NULL,
+                chave TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL,
+                PRIMARY KEY (nome, chave)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_acesso ON cache (nome, acessado_em)")
+        self._conn.commit()
+
+    @staticmethod
+    def _chave(partes):
+        texto = json.dumps(partes, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+    def obter(self, partes):
+        """Retorna (achou, valor)."""
+        chave = self._chave(partes)
+        agora = time.time()
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT valor, criado_em FROM cache WHERE nome = ? AND chave = ?",
+                (self.nome, chave)).fetchone()
+            if linha is None or agora - linha[1] > self.ttl:
+                if linha is not None:
+                    self._conn.execute("DELETE FROM cache WHERE nome = ? AND chave = ?", (self.nome, chave))
+                    self._conn.commit()
+                self.misses += 1
+                return False, None
+            self._conn.execute("UPDATE cache SET acessado_em = ? WHERE nome = ? AND chave = ?",
+                               (agora, self.nome, chave))
+            self._conn.commit()
+            self.hits += 1
+            return True, json.loads(linha[0])
+
+    def gravar(self, partes, valor):
+        chave = self._chave(partes)
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (nome, chave, valor, criado_em, acessado_em) VALUES (?, ?, ?, ?, ?)",
+                (self.nome, chave, json.dumps(valor, ensure_ascii=False), agora, agora))
+            self._despejar(agora)
+            self._conn.commit()
+
+    def _despejar(self, agora):
+        self._conn.execute("DELETE FROM cache WHERE nome = ? AND criado_em < ?", (self.nome, agora - self.ttl))
+        total = self._conn.execute("SELECT COUNT(*) FROM cache WHERE nome = ?", (self.nome,)).fetchone()[0]
+        excesso = total - self.max_itens
+        if excesso > 0:
+            self._conn.execute("""
+                DELETE FROM cache WHERE nome = ? AND chave IN (
+                    SELECT chave FROM cache WHERE nome = ? ORDER BY acessado_em ASC LIMIT ?)""",
+                (self.nome, self.nome, excesso))
+
+    def memoizar(self, partes, funcao, cachear=lambda valor: True):
+        """Devolve o valor em cache ou chama `funcao()` e guarda o resultado."""
+        achou, valor = self.obter(partes)
+        if achou:
+            return valor
+        valor = funcao()
+        if cachear(valor):
+            self.gravar(partes, valor)
+        return valor
+
+    def resumo(self):
+        total = self.hits + self.misses
+        taxa = (self.hits / total * 100) if total else 0.0
+        return f"{self.nome}: {self.hits} hits / {self.misses} misses ({taxa:.0f}%)"
@@ -0,0 +1,99 @@
+import os
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# --- CALENDÁRIO E HORÁRIO DA B3 ---
+FUSO = ZoneInfo("America/Sao_Paulo")
+# Horário do pregão regular (muda com o horário de verão americano: ajuste no .env)
+ABERTURA = time.fromisoformat(os.getenv("PREGAO_ABERTURA", "10:00"))
+FECHAMENTO = time.fromisoformat(os.getenv("PREGAO_FECHAMENTO", "17:00"))
+ABERTURA_CINZAS = time(13, 0)  # Quarta-feira de Cinzas abre à tarde
+
+
+def _pascoa(ano):
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher)."""
+    a, b, c = ano % 19, ano // 100, ano % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    mes = (h + l - 7 * m + 90) // 25
+    dia = (h + l - 7 * m + 33 * mes + 19) % 32
+    return date(ano, mes, dia)
+
+
+@lru_cache(maxsize=None)
+def feriados(ano):
+    """Dias sem pregão na B3 além dos fins de semana."""
+    pascoa = _pascoa(ano)
+    dias = {
+        date(ano, 1, 1),                 # Confraternização Universal
+        pascoa - timedelta(days=48),     # Carnaval (segunda)
+        pascoa - timedelta(days=47),     # Carnaval (terça)
+        pascoa - timedelta(days=2),      # Sexta-feira Santa
+        date(ano, 4, 21),                # Tiradentes
+        date(ano, 5, 1),                 # Dia do Trabalho
+        pascoa + timedelta(days=60),     # Corpus Christi
+        date(ano, 9, 7),                 # Independência
+        date(ano, 10, 12),               # Nossa Senhora Aparecida
+        date(ano, 11, 2),                # Finados
+        date(ano, 11, 15),               # Proclamação da República
+        date(ano, 12, 24),               # Véspera de Natal
+        date(ano, 12, 25),               # Natal
+        date(ano, 12, 31),               # Último dia do ano
+    }
+    if ano <= 2021:
+        # Feriados municipais de São Paulo (a B3 passou a abrir neles em 2022)
+        dias |= {date(ano, 1, 25), date(ano, 7, 9), date(ano, 11, 20)}
+    if ano >= 2024:
+        dias.add(date(ano, 11, 20))      # Consciência Negra (nacional)
+    return frozenset(dias)
+
+
+def eh_pregao(dia):
+    return dia.weekday() < 5 and dia not in feriados(dia.year)
+
+
+def proximo_pregao(dia, incluir=False):
+    """Primeiro pregão depois de `dia` (ou o próprio, com `incluir`)."""
+    if not incluir:
+        dia += timedelta(days=1)
+    while not eh_pregao(dia):
+        dia += timedelta(days=1)
+    return dia
+
+
+def pregao_anterior(dia):
+    dia -= timedelta(days=1)
+    while not eh_pregao(dia):
+        dia -= timedelta(days=1)
+    return dia
+
+
+def agora():
+    return datetime.now(FUSO)
+
+
+def horario_pregao(dia):
+    """(abertura, fechamento) do pregão de `dia` no fuso de São Paulo."""
+    abertura = ABERTURA_CINZAS if dia == _pascoa(dia.year) - timedelta(days=46) else ABERTURA
+    return datetime.combine(dia, abertura, FUSO), datetime.combine(dia, FECHAMENTO, FUSO)
+
+
+def mercado_aberto(momento=None):
+    momento = momento or agora()
+    if not eh_pregao(momento.date()):
+        return False
+    abertura, fechamento = horario_pregao(momento.date())
+    return abertura <= momento < fechamento
+
+
+def proxima_abertura(momento=None):
+    momento = momento or agora()
+    dia = momento.date()
+    if eh_pregao(dia) and momento < horario_pregao(dia)[0]:
+        return horario_pregao(dia)[0]
+    return horario_pregao(proximo_pregao(dia))[0]
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import zlib
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_CASSETES = os.path.join(DIRETORIO_BASE, 'cassetes')
+
+# --- GRAVA / REPRODUZ CHAMADAS EXTERNAS ---
+# CASSETE_MODO=gravar     -> chama o serviço de verdade e guarda a resposta
+# CASSETE_MODO=reproduzir -> devolve a resposta guardada, sem rede
+# (vazio)                 -> produção normal, o módulo não faz nada
+# Cada ponto de saída (yfinance, DDGS, LLM, Telegram, BCB) passa por chamar().
+# A chave usa só o que identifica a chamada (ticker, consulta...), nunca datas:
+# um dia gravado pode ser reproduzido em qualquer outro. Chamadas repetidas com
+# a mesma chave são servidas na ordem em que foram gravadas.
+MODO = os.getenv("CASSETE_MODO", "").strip().lower()
+CAMINHO_CASSETE = os.getenv("CASSETE_ARQUIVO", os.path.join(DIRETORIO_CASSETES, 'cassete.sqlite'))
+MODOS = ("", "gravar", "reproduzir")
+
+
+class ChamadaNaoGravada(Exception):
+    pass
+
+
+class Cassete:
+    def __init__(self, caminho=CAMINHO_CASSETE, modo=MODO):
+        if modo not in MODOS:
+            raise ValueError(f"CASSETE_MODO inválido: {modo!r} (use gravar ou reproduzir)")
+        self.caminho = caminho
+        self.modo = modo
+        self.contadores = defaultdict(lambda: {"chamadas": 0, "segundos": 0.0})
+        self._ordem = defaultdict(int)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def ativo(self):
+        return self.modo != ""
+
+    def _conexao(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+            self._conn = sqlite3.connect(self.caminho, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chamadas (
+                    servico TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    ordem INTEGER NOT NULL,
+                    resposta BLOB NOT NULL,
+                    duracao REAL NOT NULL,
+                    gravado_em REAL NOT NULL,
+                    PRIMARY KEY (servico, chave, ordem)
+                )""")
+            if self.modo == "gravar":
+                # Regravar o mesmo dia continua a sequência de cada chave
+                for servico, chave, ordem in self._conn.execute(
+                        "SELECT servico, chave, MAX(ordem) FROM chamadas GROUP BY servico, chave"):
+                    self._ordem[(servico, chave)] = ordem + 1
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _chave(partes):
+        texto = json.dumps(partes, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+    def _proxima_ordem(self, servico, chave):
+        with self._lock:
+            conn = self._conexao()
+            ordem = self._ordem[(servico, chave)]
+            self._ordem[(servico, chave)] += 1
+        return conn, ordem
+
+    def _ler(self, servico, partes):
+        chave = self._chave(partes)
+        conn, ordem = self._proxima_ordem(servico, chave)
+        with self._lock:
+            # Além do que foi gravado, repete a última resposta da chave
+            linha = conn.execute(
+                "SELECT resposta, duracao FROM chamadas WHERE servico = ? AND chave = ? AND ordem <= ? "
+                "ORDER BY ordem DESC LIMIT 1", (servico, chave, ordem)).fetchone()
+            if linha is not None:
+                self.contadores[servico]["chamadas"] += 1
+                self.contadores[servico]["segundos"] += linha[1]  # Tempo que a chamada real levou
+        if linha is None:
+            raise ChamadaNaoGravada(f"{servico} {partes} não está no cassete {self.caminho}")
+        tipo, valor = pickle.loads(zlib.decompress(linha[0]))
+        if tipo == "erro":
+            raise RuntimeError(valor)
+        return valor
+
+    def _gravar(self, servico, partes, resposta, duracao):
+        chave = self._chave(partes)
+        conn, ordem = self._proxima_ordem(servico, chave)
+        try:
+            blob = zlib.compress(pickle.dumps(resposta, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        except Exception:
+            blob = zlib.compress(pickle.dumps(("ok", None)))  # Resposta sem serialização (ex.: objeto do Telegram)
+        with self._lock:
+            conn.execute("INSERT OR REPLACE INTO chamadas VALUES (?, ?, ?, ?, ?, ?)",
+                         (servico, chave, ordem, blob, duracao, time.time()))
+            conn.commit()
+            self.contadores[servico]["chamadas"] += 1
+            self.contadores[servico]["segundos"] += duracao
+
+    def chamar(self, servico, partes, funcao):
+        """Executa `funcao()` (ou reproduz a resposta gravada) para a chamada `servico` + `partes`."""
+        if not self.ativo:
+            return funcao()
+        if self.modo == "reproduzir":
+            return self._ler(servico, partes)
+
+        inicio = time.perf_counter()
+        try:
+            valor = funcao()
+        except Exception as e:
+            # A falha também é reproduzida
+            self._gravar(servico, partes, ("erro", f"{type(e).__name__}: {e}"), time.perf_counter() - inicio)
+            raise
+        self._gravar(servico, partes, ("ok", valor), time.perf_counter() - inicio)
+        return valor
+
+    def chamar_lote(self, servico, itens, funcao, partes=()):
+        """
+        Request em lote (`funcao()` devolve {item: resposta}) gravado item a item:
+        a composição dos lotes depende do tempo de cada execução, o item não.
+        Na reprodução, item não gravado fica de fora (como se a API não o devolvesse).
+        """
+        if not self.ativo:
+            return funcao()
+        if self.modo == "reproduzir":
+            resultado = {}
+            for item in itens:
+                try:
+                    resultado[item] = self._ler(servico, [item, *partes])
+                except ChamadaNaoGravada:
+                    pass
+            return resultado
+
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = (time.perf_counter() - inicio) / max(1, len(resultado))
+        for item, valor in resultado.items():
+            self._gravar(servico, [item, *partes], ("ok", valor), duracao)
+        return resultado
+
+    def resumo(self):
+        if not self.ativo:
+            return ""
+        partes = [f"{s}: {c['chamadas']} ({c['segundos']:.1f}s)" for s, c in sorted(self.contadores.items())]
+        rotulo = "gravadas" if self.modo == "gravar" else "reproduzidas (tempo real evitado)"
+        return f"Cassete {rotulo} -> " + (" | ".join(partes) or "nenhuma chamada")
+
+
+cassete = Cassete()
+
+
+def chamar(servico, partes, funcao):
+    return cassete.chamar(servico, partes, funcao)
+
+
+def chamar_lote(servico, itens, funcao, partes=()):
+    return cassete.chamar_lote(servico, itens, funcao, partes)
@@ -0,0 +1,10 @@
+# --- CONTABILIDADE DOS TRADES ---
+# Usada pelo auditor.py (ledger real) e pelo backtest_carteira.py: os dois
+# precisam do mesmo capital, aposta e custo para os resultados serem comparáveis.
+CAPITAL_INICIAL = 10000.00
+APOSTA_POR_TRADE = 2000.00
+
+# --- CHOQUE DE REALIDADE (TAXAS) ---
+# 0.03% B3 + 0.07% Slippage estimado = 0.1% por ponta (0.001)
+# Total Ida e Volta = 0.2% aprox.
+TAXA_OPERACIONAL = 0.001
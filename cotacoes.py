@@ -0,0 +1,82 @@
+import time
+import threading
+from datetime import datetime, timedelta
+
+from dados_mercado import baixar_lote
+
+# --- CONFIGURAÇÃO ---
+VALIDADE_COTACAO_SEG = 60   # Cotação reaproveitada dentro da mesma execução
+JANELA_DIAS = 7             # Garante a última barra mesmo após feriado/fim de semana
+
+
+class ServicoCotacoes:
+    """
+    Última barra (Open/High/Low/Close) de vários ativos em UM request ao Yahoo.
+    Guarda um cache curto em memória e, se duas threads pedem o mesmo ativo
+    ao mesmo tempo, só uma baixa e a outra espera o resultado.
+    """
+
+    def __init__(self, validade_seg=VALIDADE_COTACAO_SEG):
+        self.validade = validade_seg
+        self._cache = {}     # ticker -> (instante, cotacao)
+        self._em_voo = {}    # ticker -> threading.Event
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def obter(self, tickers):
+        """Retorna {ticker: {'data', 'Open', 'High', 'Low', 'Close'}} (ativos sem dado ficam de fora)."""
+        tickers = list(dict.fromkeys(tickers))
+        agora = time.monotonic()
+        baixar, esperar = [], []
+
+        with self._lock:
+            for ticker in tickers:
+                item = self._cache.get(ticker)
+                if item and agora - item[0] <= self.validade:
+                    continue
+                if ticker in self._em_voo:
+                    esperar.append(self._em_voo[ticker])
+                else:
+                    self._em_voo[ticker] = threading.Event()
+                    baixar.append(ticker)
+            if baixar:
+                self.requests += 1   # Várias threads chamam obter(): conta junto da decisão de baixar
+
+        if baixar:
+            try:
+                self._baixar(baixar)
+            finally:
+                with self._lock:
+                    for ticker in baixar:
+                        self._em_voo.pop(ticker).set()
+
+        for evento in esperar:
+            evento.wait()
+
+        with self._lock:
+            return {t: self._cache[t][1] for t in tickers if t in self._cache}
+
+    def _baixar(self, tickers):
+        inicio = datetime.now() - timedelta(days=JANELA_DIAS)
+        dados = baixar_lote(tickers, inicio, "1d")
+        instante = time.monotonic()
+        with self._lock:
+            for ticker, df in dados.items():
+                if df is None or df.empty:
+                    continue
+                ultimo = df.iloc[-1]
+                self._cache[ticker] = (instante, {
+                    "data": df.index[-1].strftime("%Y-%m-%d"),
+                    "Open": float(ultimo['Open']),
+                    "High": float(ultimo['High']),
+                    "Low": float(ultimo['Low']),
+                    "Close": float(ultimo['Close']),
+                })
+
+    def preco(self, ticker):
+        cotacao = self.obter([ticker]).get(ticker)
+        return cotacao['Close'] if cotacao else None
+
+
+# Instância compartilhada pelo processo
+servico_cotacoes = ServicoCotacoes()
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import cassete
+from metricas import metricas
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_CACHE = os.path.join(DIRETORIO_BASE, 'cache_ohlcv')
+
+# --- CONFIGURAÇÃO ---
+COLUNAS = ["Open", "High", "Low", "Close", "Volume"]
+DTYPE_BARRA = np.dtype([('data', '<i8')] + [(c, '<f8') for c in COLUNAS])
+
+# Intervalo mínimo entre duas consultas ao Yahoo para o mesmo ativo
+VALIDADE_CACHE_MIN = float(os.getenv("OHLCV_VALIDADE_MIN", "15"))
+
+# Com auto_adjust o Yahoo reescreve o histórico a cada provento/desdobramento.
+# Se a barra de sobreposição mudar mais que isso, o cache do ativo é refeito.
+TOLERANCIA_AJUSTE = 1e-4
+
+
+# --- ARQUIVOS ---
+def _caminhos(ticker, intervalo):
+    pasta = os.path.join(DIRETORIO_CACHE, intervalo)
+    nome = ticker.replace('^', '_').replace('/', '_')
+    return os.path.join(pasta, f"{nome}.npy"), os.path.join(pasta, f"{nome}.json")
+
+
+def _ler_cache(ticker, intervalo):
+    """Retorna (barras, meta). Barras ficam memory-mapped (somente leitura)."""
+    caminho_barras, caminho_meta = _caminhos(ticker, intervalo)
+    if not (os.path.exists(caminho_barras) and os.path.exists(caminho_meta)):
+        return None, {}
+    try:
+        barras = np.load(caminho_barras, mmap_mode='r')
+        with open(caminho_meta, "r") as f:
+            meta = json.load(f)
+        return barras, meta
+    except Exception:
+        return None, {}
+
+
+def _gravar_cache(ticker, intervalo, barras, meta):
+    caminho_barras, caminho_meta = _caminhos(ticker, intervalo)
+    os.makedirs(os.path.dirname(caminho_barras), exist_ok=True)
+
+    # Escrita atômica: grava em temporário e troca (seguro com várias threads/processos)
+    sufixo = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(caminho_barras + sufixo, "wb") as f:
+        np.save(f, barras)
+    with open(caminho_meta + sufixo, "w") as f:
+        json.dump(meta, f)
+    os.replace(caminho_barras + sufixo, caminho_barras)
+    os.replace(caminho_meta + sufixo, caminho_meta)
+
+
+# --- CONVERSÕES ---
+def _df_para_barras(df):
+    df = df.dropna(subset=["Close"])
+    barras = np.zeros(len(df), dtype=DTYPE_BARRA)
+    indice = pd.DatetimeIndex(df.index)
+    if indice.tz is not None:
+        indice = indice.tz_localize(None)
+    barras['data'] = indice.as_unit('ns').asi8
+    for c in COLUNAS:
+        barras[c] = df[c].to_numpy(dtype='f8') if c in df else np.nan
+    return barras
+
+
+def _barras_para_df(barras):
+    df = pd.DataFrame({c: np.asarray(barras[c]) for c in COLUNAS},
+                      index=pd.DatetimeIndex(np.asarray(barras['data']).astype('datetime64[ns]'), name="Date"))
+    return df
+
+
+def _extrair_ticker(df, ticker, total_tickers):
+    """Normaliza o retorno do yf.download (MultiIndex ou não) para um DF simples."""
+    if df is None or df.empty:
+        return pd.DataFrame()
+    if isinstance(df.columns, pd.MultiIndex):
+        if ticker in df.columns.get_level_values(0):
+            df = df[ticker]
+        elif ticker in df.columns.get_level_values(1):
+            df = df.xs(ticker, axis=1, level=1)
+        elif total_tickers == 1:
+            df.columns = df.columns.get_level_values(0)
+        else:
+            return pd.DataFrame()
+    if "Close" not in df:
+        return pd.DataFrame()
+    return df.dropna(subset=["Close"])
+
+
+def _inicio_do_periodo(periodo, agora):
+    """Converte 'period' do yfinance ('60d', '2y', '6mo', '1wk') em (data inicial, barras)."""
+    if periodo in (None, "max"):
+        return None, None
+    numero = int(''.join(ch for ch in periodo if ch.isdigit()))
+    unidade = ''.join(ch for ch in periodo if ch.isalpha())
+    if unidade == "d":
+        # No Yahoo 'Nd' são N pregões: busca com folga de calendário e corta depois
+        return agora - timedelta(days=int(numero * 1.6) + 7), numero
+    if unidade == "wk":
+        return agora - timedelta(weeks=numero), None
+    if unidade == "mo":
+        return agora - timedelta(days=31 * numero), None
+    if unidade == "y":
+        return agora - timedelta(days=366 * numero), None
+    raise ValueError(f"Período não suportado: {periodo}")
+
+
+# --- DOWNLOAD INCREMENTAL ---
+def baixar_lote(tickers, inicio, intervalo):
+    """Um único request ao Yahoo para vários ativos a partir da mesma data."""
+    kwargs = dict(interval=intervalo, progress=False, group_by='ticker', threads=True)
+    if inicio is None:
+        kwargs['period'] = "max"
+    else:
+        kwargs['start'] = inicio.strftime("%Y-%m-%d")
+
+    def _baixar():
+        import yfinance as yf  # Só quando o cache não basta (poupa ~1s no start)
+        df = yf.download(list(tickers), **kwargs)
+        return {t: _extrair_ticker(df, t, len(tickers)) for t in tickers}
+
+    metricas.contar("requests.yfinance")
+    try:
+        return cassete.chamar_lote("yfinance", list(tickers), _baixar, [intervalo])
+    except Exception as e:
+        metricas.contar("erros.yfinance")
+        print(f"Erro download ({', '.join(tickers)}): {e}")
+        return {}
+
+
+def _mesclar(barras_antigas, novas):
+    """Anexa as barras novas; a última barra do cache é sobrescrita (pode estar incompleta)."""
+    if barras_antigas is None or len(barras_antigas) == 0:
+        return novas
+    if len(novas) == 0:
+        return np.array(barras_antigas)
+    corte = np.searchsorted(barras_antigas['data'], novas['data'][0], side='left')
+    return np.concatenate([barras_antigas[:corte], novas])
+
+
+def _houve_reajuste(barras_antigas, novas):
+    """Detecta reescrita retroativa do histórico comparando a barra de sobreposição."""
+    if barras_antigas is None or len(barras_antigas) == 0 or len(novas) == 0:
+        return False
+    pos = np.searchsorted(barras_antigas['data'], novas['data'][0])
+    # A última barra do cache pode ser parcial, então só a penúltima serve de referência
+    if pos >= len(barras_antigas) - 1 or barras_antigas['data'][pos] != novas['data'][0]:
+        return False
+    antigo = barras_antigas['Close'][pos]
+    return abs(novas['Close'][0] - antigo) > TOLERANCIA_AJUSTE * max(abs(antigo), 1e-9)
+
+
+def carregar_varios(tickers, inicio=None, periodo=None, intervalo="1d", forcar=False):
+    """
+    Retorna {ticker: DataFrame OHLCV} lendo do cache local.
+    Só busca no Yahoo as barras posteriores à última data em cache, agrupando
+    os ativos que precisam da mesma janela em um único request multi-ticker.
+    """
+    agora = datetime.now()
+    barras_limite = None
+    if inicio is not None:
+        inicio = pd.Timestamp(inicio).to_pydatetime()
+    elif periodo is not None:
+        inicio, barras_limite = _inicio_do_periodo(periodo, agora)
+    cobertura_pedida = "max" if inicio is None else inicio.strftime("%Y-%m-%d")
+
+    tickers = list(dict.fromkeys(tickers))
+    caches = {}
+    grupos = {}        # data inicial do download -> [tickers]
+    completos = set()  # ativos sem cache útil: baixa a janela inteira
+
+    for ticker in tickers:
+        barras, meta = _ler_cache(ticker, intervalo)
+        caches[ticker] = (barras, meta)
+
+        cobertura = meta.get('inicio_coberto')
+        cobre_inicio = barras is not None and len(barras) > 0 and cobertura is not None and (
+            cobertura == "max" or (cobertura_pedida != "max" and cobertura <= cobertura_pedida))
+
+        if not cobre_inicio:
+            completos.add(ticker)
+            grupos.setdefault(cobertura_pedida, []).append(ticker)
+            continue
+
+        idade_min = (time.time() - meta.get('atualizado_em', 0)) / 60
+        if forcar or idade_min > VALIDADE_CACHE_MIN:
+            ultima = pd.Timestamp(int(barras['data'][-2 if len(barras) > 1 else -1]))
+            grupos.setdefault(ultima.strftime("%Y-%m-%d"), []).append(ticker)
+
+    baixar = sum(len(g) for g in grupos.values())
+    metricas.cache("ohlcv", acertos=len(tickers) - baixar, erros=baixar)
+
+    refazer = []
+    for chave, grupo in grupos.items():
+        data_ini = None if chave == "max" else datetime.strptime(chave, "%Y-%m-%d")
+        baixados = baixar_lote(grupo, data_ini, intervalo)
+
+        for ticker in grupo:
+            df_novo = baixados.get(ticker)
+            if df_novo is None or df_novo.empty:
+                continue  # Mantém o cache (mesmo velho) se o Yahoo falhar
+            barras_antigas, meta = caches[ticker]
+            novas = _df_para_barras(df_novo)
+
+            if ticker in completos:
+                barras, cobertura = novas, cobertura_pedida
+            elif _houve_reajuste(barras_antigas, novas):
+                refazer.append(ticker)
+                continue
+            else:
+                barras, cobertura = _mesclar(barras_antigas, novas), meta['inicio_coberto']
+
+            _gravar_cache(ticker, intervalo, barras,
+                          {"inicio_coberto": cobertura, "atualizado_em": time.time()})
+            caches[ticker] = _ler_cache(ticker, intervalo)
+
+    if refazer:
+        # Histórico reajustado por provento: baixa de novo toda a janela coberta
+        print(f"♻️ Histórico reajustado, recarregando: {', '.join(refazer)}")
+        for ticker in refazer:
+            cobertura = caches[ticker][1]['inicio_coberto']
+            data_ref = None if cobertura == "max" else datetime.strptime(cobertura, "%Y-%m-%d")
+            df_novo = baixar_lote([ticker], data_ref, intervalo).get(ticker)
+            if df_novo is None or df_novo.empty:
+                continue
+            _gravar_cache(ticker, intervalo, _df_para_barras(df_novo),
+                          {"inicio_coberto": cobertura, "atualizado_em": time.time()})
+            caches[ticker] = _ler_cache(ticker, intervalo)
+
+    resultado = {}
+    for ticker in tickers:
+        barras, _ = caches[ticker]
+        if barras is None or len(barras) == 0:
+            resultado[ticker] = pd.DataFrame(columns=COLUNAS)
+            continue
+        if inicio is not None:
+            barras = barras[np.searchsorted(barras['data'], pd.Timestamp(inicio).value):]
+        if barras_limite is not None:
+            barras = barras[-barras_limite:]
+        resultado[ticker] = _barras_para_df(barras)
+    return resultado
+
+
+def carregar_ohlcv(ticker, inicio=None, periodo=None, intervalo="1d", forcar=False):
+    """Atalho de carregar_varios para um único ativo."""
+    return carregar_varios([ticker], inicio=inicio, periodo=periodo,
+                           intervalo=intervalo, forcar=forcar)[ticker]
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from ta.volatility import AverageTrueRange
+
+from painel import montar_do_cache
+from motor_backtest import BARRA_INICIAL, STOP_PCT, ALVO_R, DIAS_MAX, preparar_arrays, saidas_por_barra
+from screener import RSI_MIN, RSI_MAX, ADX_MIN
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_DATASET = os.path.join(DIRETORIO_BASE, 'dataset_features')
+
+# --- DATASET DE TREINO ---
+# As mesmas features que o screener grava em features_tecnicas, para TODAS as
+# barras de todos os ativos, com o rótulo do backtester (stop 4% / alvo 2R /
+# time stop 15). Uma coluna por arquivo .npy: carregar = mmap, sem parse.
+FEATURES = ("rsi", "adx", "atr_percentual", "distancia_sma200_pct", "distancia_sma50_pct",
+            "volume_ratio", "dia_semana", "mes")
+COLUNAS = {
+    "ticker": "i4",         # Índice em meta['tickers']
+    "data": "i8",           # ns
+    **{f: "f4" for f in FEATURES},
+    "preco_entrada": "f4",
+    "atr_absoluto": "f4",
+    "aprovado": "?",        # Passaria no hard screen (mesmas regras do screener)
+    "res": "f4",            # Resultado em R da entrada no fechamento da barra
+    "ganho": "?",           # res > 0
+    "dias": "i2",           # Barras até a saída
+    "encerrado": "?",       # False = saída depois do fim dos dados (rótulo incompleto)
+}
+JANELA_ATR = 14
+JANELA_VOLUME = 20
+
+
+def features_vetorizadas(df):
+    """
+    Features de cada barra do DF OHLCV (float64), com as fórmulas do
+    screener/indicadores_incrementais: SMAs, RSI e ADX da lib `ta`, ATR com
+    zeros no aquecimento e volume médio de 20 barras (NaN de volume = 0).
+    """
+    a = preparar_arrays(df)
+    atr = AverageTrueRange(df['High'], df['Low'], df['Close'], window=JANELA_ATR).average_true_range().to_numpy(dtype='f8')
+    volume = df['Volume'].fillna(0.0).to_numpy(dtype='f8')
+    vol_media = pd.Series(volume).rolling(JANELA_VOLUME).mean().to_numpy()
+    close = a['close']
+    datas = pd.DatetimeIndex(a['datas'].astype('datetime64[ns]'))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f = {
+            "preco_entrada": close,
+            "rsi": a['rsi'],
+            "adx": a['adx'],
+            "atr_absoluto": atr,
+            "atr_percentual": atr / close * 100,
+            "distancia_sma200_pct": (close - a['sma200']) / a['sma200'] * 100,
+            "distancia_sma50_pct": (close - a['sma50']) / a['sma50'] * 100,
+            "volume_ratio": np.where(vol_media > 0, volume / vol_media, 0.0),
+            "dia_semana": datas.weekday.to_numpy(dtype='f8'),
+            "mes": datas.month.to_numpy(dtype='f8'),
+        }
+        f["aprovado"] = ((close > a['sma200']) & (close > a['sma50']) & (a['adx'] > ADX_MIN) &
+                         (a['rsi'] < RSI_MAX) & (a['rsi'] > RSI_MIN))
+    return a, f
+
+
+def construir_dataset(painel, destino=DIRETORIO_DATASET, barra_inicial=BARRA_INICIAL,
+                      stop_pct=STOP_PCT, alvo_r=ALVO_R, dias_max=DIAS_MAX):
+    """Grava o dataset colunar em `destino` a partir de um Painel OHLCV. Retorna o nº de linhas."""
+    os.makedirs(destino, exist_ok=True)
+    barras = {t: int((~np.isnan(painel.arrays(t)['Close'])).sum()) for t in painel.tickers}
+    tickers = [t for t, n in barras.items() if n > barra_inicial]
+    total = sum(barras[t] - barra_inicial for t in tickers)
+
+    # Arquivos pré-alocados no tamanho final: cada ativo escreve a sua fatia
+    colunas = {c: np.lib.format.open_memmap(os.path.join(destino, f"{c}.npy"), mode='w+',
+                                            dtype=np.dtype(d), shape=(total,))
+               for c, d in COLUNAS.items()}
+    pos = 0
+    for i, ticker in enumerate(tickers):
+        a, f = features_vetorizadas(painel.para_df(ticker))
+        saida, res = saidas_por_barra(a['close'], a['high'], a['low'], stop_pct, alvo_r, dias_max)
+        n = len(a['close'])
+        fatia = slice(pos, pos + n - barra_inicial)
+        corte = slice(barra_inicial, n)
+
+        colunas["ticker"][fatia] = i
+        colunas["data"][fatia] = a['datas'][corte]
+        for nome in FEATURES + ("preco_entrada", "atr_absoluto", "aprovado"):
+            colunas[nome][fatia] = f[nome][corte]
+        encerrado = saida[corte] < n
+        colunas["res"][fatia] = np.where(encerrado, res[corte], np.nan)
+        colunas["ganho"][fatia] = encerrado & (res[corte] > 0)
+        colunas["dias"][fatia] = saida[corte] - np.arange(barra_inicial, n)
+        colunas["encerrado"][fatia] = encerrado
+        pos += n - barra_inicial
+
+    for coluna in colunas.values():
+        coluna.flush()
+    meta = {
+        "tickers": tickers, "colunas": COLUNAS, "features": list(FEATURES), "linhas": total,
+        "rotulo": {"stop_pct": stop_pct, "alvo_r": alvo_r, "dias_max": dias_max},
+        "gerado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(destino, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return total
+
+
+def carregar_dataset(origem=DIRETORIO_DATASET):
+    """Retorna (colunas memory-mapped, meta)."""
+    with open(os.path.join(origem, "meta.json"), "r") as f:
+        meta = json.load(f)
+    colunas = {c: np.load(os.path.join(origem, f"{c}.npy"), mmap_mode='r') for c in meta["colunas"]}
+    return colunas, meta
+
+
+def matriz_features(colunas, filtro=None):
+    """Matriz float32 [linhas, FEATURES] (cópia só das linhas do filtro)."""
+    filtro = slice(None) if filtro is None else filtro
+    return np.column_stack([colunas[f][filtro] for f in FEATURES])
+
+
+if __name__ == "__main__":
+    from gerador_universo import carregar_universo
+
+    parser = argparse.ArgumentParser(description="Dataset de features + rótulos do backtester (colunar, mmap)")
+    parser.add_argument("--anos", type=int, default=10)
+    parser.add_argument("--carteira", action="store_true", help="Só a carteira_alvo.json (padrão: universo B3)")
+    parser.add_argument("--destino", default=DIRETORIO_DATASET)
+    args = parser.parse_args()
+
+    if args.carteira:
+        with open(os.path.join(DIRETORIO_BASE, 'carteira_alvo.json'), "r") as f:
+            ativos = json.load(f)
+    else:
+        ativos = carregar_universo()
+
+    print(f"--- DATASET DE FEATURES ({len(ativos)} ativos, {args.anos} anos) ---")
+    inicio = time.perf_counter()
+    painel = montar_do_cache(ativos, os.path.join(DIRETORIO_BASE, 'painel', 'dataset.npy'), periodo=f"{args.anos}y")
+    t_dados = time.perf_counter() - inicio
+    linhas = construir_dataset(painel, args.destino)
+    colunas, _ = carregar_dataset(args.destino)
+    aprovadas = int(np.asarray(colunas['aprovado']).sum())
+    print(f"📦 {linhas} barras ({aprovadas} aprovadas no screen) em {args.destino}")
+    print(f"⏱️ {time.perf_counter() - inicio:.1f}s (dados {t_dados:.1f}s)")
@@ -0,0 +1,230 @@
+import re
+import ast
+import json
+import unicodedata
+
+# --- CONTRATO DA DECISÃO DO MANAGER ---
+# A resposta do t_manager é texto livre do LLM. Antes de descartar a análise
+# inteira (e a espera do limitador), a resposta passa por um reparo local:
+# extrai o JSON do meio do texto, corrige a sintaxe mais comum (aspas simples,
+# vírgula sobrando, True/None do Python), normaliza nomes de campos e converte
+# os tipos (números em string, "R$ 34,50", decisão/confiança em minúsculas ou
+# com acento). Só o que continua fora do contrato vira DecisaoInvalida.
+# Parte das correções é só cosmética; as "fatais antes" são as que derrubavam o
+# json.loads antigo (texto fora das cercas, sintaxe, campo obrigatório ausente,
+# preço que não é número) e viravam "Erro Crítico" com a Crew inteira refeita.
+DECISOES = ("COMPRA", "CANCELAR")
+CONFIANCAS = ("ALTA", "MEDIA")
+CAMPOS_PRECO = ("entrada", "stop", "alvo")
+CAMPOS = ("ticker", "decisao") + CAMPOS_PRECO + ("confianca", "motivo")
+
+# Contrato exibido ao LLM (prompt do t_manager e da nova tentativa)
+ESQUEMA = '''{{
+            "ticker": "{ticket}",
+            "decisao": "COMPRA" ou "CANCELAR",
+            "entrada": float,
+            "stop": float,
+            "alvo": float,
+            "confianca": "ALTA" ou "MEDIA",
+            "motivo": "string curta"
+        }}'''
+
+SINONIMOS_CAMPOS = {
+    "ativo": "ticker", "acao": "ticker", "symbol": "ticker",
+    "decision": "decisao", "acao_recomendada": "decisao", "veredito": "decisao",
+    "preco_entrada": "entrada", "entry": "entrada", "preco": "entrada", "price": "entrada",
+    "stop_loss": "stop", "stoploss": "stop", "stop_gain": "alvo",
+    "target": "alvo", "take_profit": "alvo", "preco_alvo": "alvo", "objetivo": "alvo",
+    "confidence": "confianca", "confiabilidade": "confianca",
+    "reason": "motivo", "justificativa": "motivo", "motivacao": "motivo", "razao": "motivo",
+}
+SINONIMOS_DECISAO = {
+    "COMPRA": "COMPRA", "COMPRAR": "COMPRA", "BUY": "COMPRA", "APROVADO": "COMPRA", "APROVAR": "COMPRA",
+    "CANCELAR": "CANCELAR", "CANCELA": "CANCELAR", "CANCELADO": "CANCELAR", "VETO": "CANCELAR",
+    "VETAR": "CANCELAR", "VETADO": "CANCELAR", "NAO COMPRAR": "CANCELAR", "AGUARDAR": "CANCELAR",
+    "HOLD": "CANCELAR", "SKIP": "CANCELAR",
+}
+SINONIMOS_CONFIANCA = {"ALTA": "ALTA", "HIGH": "ALTA", "MEDIA": "MEDIA", "MEDIUM": "MEDIA", "MODERADA": "MEDIA"}
+
+
+class DecisaoInvalida(ValueError):
+    """Resposta que nem o reparo local coloca dentro do contrato."""
+
+    def __init__(self, problemas, texto=""):
+        self.problemas = list(problemas)
+        self.texto = texto
+        super().__init__("; ".join(self.problemas))
+
+
+def _sem_acento(texto):
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+
+
+def _chave(nome):
+    return re.sub(r"[^a-z0-9]+", "_", _sem_acento(str(nome)).lower()).strip("_")
+
+
+def _virgula_decimal(valor):
+    """Texto no estilo pt-BR ("34,50", "1.234,56"): a vírgula é a casa decimal."""
+    if not isinstance(valor, str):
+        return False
+    texto = re.sub(r"[^0-9,.\-]", "", valor)
+    return "," in texto and texto.rfind(",") > texto.rfind(".")
+
+
+def _para_float(valor, virgula_decimal=False):
+    """
+    34.5, "34.5", "R$ 34,50", "1.234,56" -> float (None se não der).
+    `virgula_decimal`: os outros preços da resposta vieram no estilo pt-BR, então
+    "1.300" (ponto seguido de três dígitos, sem vírgula) é milhar, não 1.3.
+    """
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if not isinstance(valor, str):
+        return None
+    texto = re.sub(r"[^0-9,.\-]", "", valor)
+    if virgula_decimal and re.fullmatch(r"-?\d{1,3}(\.\d{3})+", texto):
+        texto = texto.replace(".", "")
+    if "," in texto and "." in texto:
+        texto = texto.replace(".", "").replace(",", ".") if texto.rfind(",") > texto.rfind(".") else texto.replace(",", "")
+    elif "," in texto:
+        texto = texto.replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+def extrair_json(texto):
+    """
+    Objeto JSON de dentro da resposta (cercas ```json, texto antes/depois).
+    Retorna (dict, correções); toda correção daqui era fatal antes.
+    """
+    correcoes = []
+    limpo = texto.replace("```json", "").replace("```", "").strip()   # Cercas já eram esperadas
+    inicio, fim = limpo.find("{"), limpo.rfind("}")
+    if inicio < 0 or fim < inicio:
+        raise DecisaoInvalida(["resposta sem objeto JSON"], texto)
+    if limpo[:inicio].strip() or limpo[fim + 1:].strip():
+        correcoes.append("texto fora do JSON")
+    bloco = limpo[inicio:fim + 1]
+
+    try:
+        return json.loads(bloco), correcoes
+    except json.JSONDecodeError:
+        pass
+
+    # Defeitos de sintaxe comuns em LLM
+    reparado = (bloco.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'"))
+    reparado = re.sub(r",\s*([}\]])", r"\1", reparado)                       # Vírgula sobrando
+    reparado = re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", re.sub(r"\bNone\b", "null", reparado)))
+    reparado = re.sub(r"//[^\n]*", "", reparado)                              # Comentários
+    try:
+        return json.loads(reparado), correcoes + ["sintaxe JSON"]
+    except json.JSONDecodeError:
+        pass
+    try:
+        dados = ast.literal_eval(bloco)   # Dict do Python (aspas simples)
+        if isinstance(dados, dict):
+            return dados, correcoes + ["aspas simples"]
+    except (ValueError, SyntaxError):
+        pass
+    raise DecisaoInvalida(["JSON malformado"], texto)
+
+
+def _numero_python(valor):
+    """O json.loads antigo só aceitava o que float() já converte."""
+    try:
+        float(valor)
+        return not isinstance(valor, bool)
+    except (TypeError, ValueError):
+        return False
+
+
+def validar_decisao(dados, ticker, preco=None):
+    """
+    Normaliza o dict para o contrato do t_manager. Retorna (sinal, correções,
+    fatais antes); levanta DecisaoInvalida com os problemas que não dá para reparar.
+    """
+    correcoes, problemas = [], []
+    if not isinstance(dados, dict):
+        raise DecisaoInvalida(["JSON não é um objeto"])
+
+    sinal, renomeados = {}, {}
+    for nome, valor in dados.items():
+        chave = _chave(nome)
+        chave = SINONIMOS_CAMPOS.get(chave, chave)
+        if chave != nome:
+            correcoes.append(f"campo {nome}->{chave}")
+            renomeados[chave] = correcoes[-1]
+        sinal.setdefault(chave, valor)
+    originais = dict(sinal)
+
+    # Ticker: é sempre o ativo que foi analisado
+    if str(sinal.get("ticker", "")).strip().upper() != ticker:
+        correcoes.append("ticker")
+        sinal["ticker"] = ticker
+
+    decisao = SINONIMOS_DECISAO.get(_sem_acento(str(sinal.get("decisao", ""))).strip().upper().replace("_", " "))
+    if decisao is None:
+        problemas.append(f"decisao inválida: {sinal.get('decisao')!r}")
+    elif decisao != sinal.get("decisao"):
+        correcoes.append("decisao")
+    sinal["decisao"] = decisao
+
+    confianca = SINONIMOS_CONFIANCA.get(_sem_acento(str(sinal.get("confianca", ""))).strip().upper())
+    if confianca is None or confianca != sinal.get("confianca"):
+        correcoes.append("confianca")
+    # Confiança só pinta o alerta: ausente/desconhecida vira a menor do contrato
+    sinal["confianca"] = confianca or "MEDIA"
+
+    virgula_decimal = any(_virgula_decimal(sinal.get(campo)) for campo in CAMPOS_PRECO)
+    for campo in CAMPOS_PRECO:
+        valor = _para_float(sinal.get(campo), virgula_decimal)
+        if valor is not None and valor != sinal.get(campo):
+            correcoes.append(campo)
+        sinal[campo] = valor
+
+    if decisao == "COMPRA" and sinal["entrada"] is None and preco is not None:
+        sinal["entrada"] = float(preco)
+        correcoes.append("entrada do setup técnico")
+
+    # Campo obrigatório ausente com o nome do contrato ou preço não numérico: o caminho antigo quebrava
+    fatais = []
+    for campo in ("decisao",) + (CAMPOS_PRECO if decisao == "COMPRA" else ()):
+        if campo not in dados:
+            fatais += [c for c in (renomeados.get(campo), "entrada do setup técnico" if campo == "entrada" else None)
+                       if c in correcoes]
+        elif campo in CAMPOS_PRECO and campo in correcoes and not _numero_python(originais[campo]):
+            fatais.append(campo)
+
+    if decisao == "COMPRA":
+        faltando = [c for c in CAMPOS_PRECO if sinal[c] is None or sinal[c] <= 0]
+        if faltando:
+            problemas.append(f"preços ausentes/inválidos: {', '.join(faltando)}")
+        elif sinal["stop"] >= sinal["alvo"]:
+            # Erro de conteúdo, não de formato: não dá para adivinhar qual número o modelo quis dizer
+            problemas.append(f"stop/alvo invertidos (stop {sinal['stop']} >= alvo {sinal['alvo']})")
+        elif not sinal["stop"] < sinal["entrada"] < sinal["alvo"]:
+            problemas.append(f"esperado stop < entrada < alvo ({sinal['stop']} / {sinal['entrada']} / {sinal['alvo']})")
+
+    motivo = sinal.get("motivo")
+    sinal["motivo"] = str(motivo).strip() if motivo not in (None, "") else "N/A"
+
+    if problemas:
+        raise DecisaoInvalida(problemas)
+    # Ordem do contrato; campos extras do LLM vão no fim
+    return {**{c: sinal[c] for c in CAMPOS}, **sinal}, correcoes, fatais
+
+
+def interpretar_decisao(texto, ticker, preco=None):
+    """Texto bruto do Manager -> (sinal no contrato, correções aplicadas, correções que eram fatais antes)."""
+    dados, correcoes = extrair_json(str(texto))
+    try:
+        sinal, mais, fatais = validar_decisao(dados, ticker, preco)
+    except DecisaoInvalida as e:
+        e.texto = texto
+        raise
+    return sinal, correcoes + mais, correcoes + fatais
@@ -1,49 +1,85 @@
-import yfinance as yf
+import os
 import pandas as pd
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dados_mercado import carregar_varios
+from metricas import metricas
 
 # CONFIGURAÇÃO
 MINIMO_VOLUME = 20_000_000 # R$ 20 Milhões/dia
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_UNIVERSO = os.path.join(DIRETORIO_BASE, 'universo_b3.txt')
+TAMANHO_LOTE = 50   # Ativos por request multi-ticker
+MAX_WORKERS = 4     # Lotes baixando ao mesmo tempo
 
+# Reserva caso o arquivo do universo não exista
 CANDIDATOS = [
-    "VALE3.SA", "PETR4.SA", "PRIO3.SA", "WEGE3.SA", "ITUB4.SA", "BBDC4.SA", 
-    "BBAS3.SA", "RENT3.SA", "LREN3.SA", "BPAC11.SA", "GGBR4.SA", 
+    "VALE3.SA", "PETR4.SA", "PRIO3.SA", "WEGE3.SA", "ITUB4.SA", "BBDC4.SA",
+    "BBAS3.SA", "RENT3.SA", "LREN3.SA", "BPAC11.SA", "GGBR4.SA",
     "CSNA3.SA", "JBSS3.SA", "SUZB3.SA", "RAIL3.SA", "RADL3.SA", "EQTL3.SA",
     "VBBR3.SA", "UGPA3.SA", "CMIG4.SA", "CPLE6.SA", "CSAN3.SA", "TOTS3.SA"
 ]
 
+def carregar_universo(caminho=CAMINHO_UNIVERSO):
+    """Lê o universo (tickers separados por espaço/linha, '#' comenta) e garante o sufixo .SA."""
+    if not os.path.exists(caminho):
+        return list(CANDIDATOS)
+    tickers = []
+    with open(caminho, "r") as f:
+        for linha in f:
+            linha = linha.split('#')[0]
+            for ticker in linha.split():
+                ticker = ticker.strip().upper()
+                tickers.append(ticker if ticker.endswith(".SA") else f"{ticker}.SA")
+    return list(dict.fromkeys(tickers))
+
+def baixar_em_lotes(tickers, periodo="60d"):
+    """Divide o universo em lotes multi-ticker e baixa os lotes num pool limitado."""
+    lotes = [tickers[i:i + TAMANHO_LOTE] for i in range(0, len(tickers), TAMANHO_LOTE)]
+    dados = {}
+
+    def _baixar(lote):
+        with metricas.cronometro("download"):
+            return carregar_varios(lote, periodo=periodo)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for parcial in pool.map(_baixar, lotes):
+            dados.update(parcial)
+    return dados
+
 def gerar():
     print("--- FILTRANDO LIQUIDEZ ---")
+    inicio = time.perf_counter()
+    metricas.iniciar("universo")
+    universo = carregar_universo()
+    print(f"🌎 Universo: {len(universo)} ativos")
+
+    dados = baixar_em_lotes(universo)
+    t_download = time.perf_counter() - inicio
+
+    # Painel data x ticker: volume financeiro médio de todos os ativos numa única conta
+    with metricas.cronometro("liquidez"):
+        close = pd.DataFrame({t: df['Close'] for t, df in dados.items() if not df.empty})
+        volume = pd.DataFrame({t: df['Volume'] for t, df in dados.items() if not df.empty})
+        media_fin = (volume * close).mean()
+
     aprovados = []
-    
-    for ticker in CANDIDATOS:
-        try:
-            df = yf.download(ticker, period="60d", progress=False)
-            if df.empty: continue
-            
-            # Tratamento seguro para fechar e volume
-            try:
-                vol = df['Volume'].iloc[:, 0] if isinstance(df['Volume'], pd.DataFrame) else df['Volume']
-                close = df['Close'].iloc[:, 0] if isinstance(df['Close'], pd.DataFrame) else df['Close']
-            except:
-                vol = df['Volume']
-                close = df['Close']
-
-            media_fin = (vol * close).mean()
-            
-            if media_fin > MINIMO_VOLUME:
-                print(f"✅ {ticker}: Aprovado (R$ {media_fin/1_000_000:.1f}M)")
-                aprovados.append(ticker)
-            else:
-                print(f"❌ {ticker}: Reprovado")
-                
-        except Exception as e:
-            print(f"Erro {ticker}: {e}")
-    
+    for ticker in universo:
+        if ticker not in media_fin.index or pd.isna(media_fin[ticker]):
+            print(f"⚠️ {ticker}: Sem dados")
+        elif media_fin[ticker] > MINIMO_VOLUME:
+            print(f"✅ {ticker}: Aprovado (R$ {media_fin[ticker]/1_000_000:.1f}M)")
+            aprovados.append(ticker)
+        else:
+            print(f"❌ {ticker}: Reprovado")
+
     with open("carteira_alvo.json", "w") as f:
         json.dump(aprovados, f)
     print("Arquivo 'carteira_alvo.json' gerado!")
+    print(f"⏱️ {len(universo)} ativos em {time.perf_counter() - inicio:.1f}s "
+          f"(download/cache {t_download:.1f}s) | {len(aprovados)} aprovados")
+    metricas.finalizar(ativos=len(universo), aprovados=len(aprovados))
 
 if __name__ == "__main__":
-    gerar()
\ No newline at end of file
+    gerar()
@@ -0,0 +1,247 @@
+import os
+import json
+import math
+import copy
+import threading
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_ESTADO = os.path.join(DIRETORIO_BASE, 'estado_indicadores')
+
+# --- CONFIGURAÇÃO (mesmas janelas do validar_setup_v2) ---
+JANELA_SMA_LONGA = 200
+JANELA_SMA_CURTA = 50
+JANELA_WILDER = 14     # RSI, ADX e ATR
+JANELA_VOLUME = 20
+RESSOMA_A_CADA = 1000  # Refaz as somas móveis do zero de tempos em tempos (erro de ponto flutuante)
+TOLERANCIA_HISTORICO = 1e-6
+
+
+class EstadoIndicadores:
+    """
+    Acumuladores de um ativo: somas móveis (SMA) e suavizações de Wilder
+    (RSI/ATR/ADX). Cada barra nova custa O(1) por indicador e reproduz as
+    fórmulas da biblioteca `ta` (inclusive os zeros de aquecimento do ATR/ADX).
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.ultima_data = None
+        self.prev_close = None
+        self.prev_high = None
+        self.prev_low = None
+
+        self.closes = deque(maxlen=JANELA_SMA_LONGA)
+        self.soma_longa = 0.0
+        self.soma_curta = 0.0
+        self.volumes = deque(maxlen=JANELA_VOLUME)
+        self.soma_volume = 0.0
+
+        self.ema_alta = None
+        self.ema_baixa = None
+        self.atr = 0.0
+        self.trs = 0.0
+        self.dmp = 0.0
+        self.dmn = 0.0
+        self.soma_dx = 0.0
+        self.adx = 0.0
+
+    # --- ATUALIZAÇÃO ---
+    def atualizar(self, data, high, low, close, volume):
+        """Consome uma barra fechada e devolve os indicadores dela."""
+        w = JANELA_WILDER
+        t = self.n
+        volume = 0.0 if volume is None or math.isnan(volume) else float(volume)
+
+        # SMA 200 / 50: soma móvel
+        if len(self.closes) >= JANELA_SMA_CURTA:
+            self.soma_curta -= self.closes[-JANELA_SMA_CURTA]
+        if len(self.closes) == JANELA_SMA_LONGA:
+            self.soma_longa -= self.closes[0]
+        self.closes.append(close)
+        self.soma_longa += close
+        self.soma_curta += close
+
+        if len(self.volumes) == JANELA_VOLUME:
+            self.soma_volume -= self.volumes[0]
+        self.volumes.append(volume)
+        self.soma_volume += volume
+
+        if t % RESSOMA_A_CADA == 0:
+            self.soma_longa = math.fsum(self.closes)
+            self.soma_curta = math.fsum(list(self.closes)[-JANELA_SMA_CURTA:])
+            self.soma_volume = math.fsum(self.volumes)
+
+        # RSI: ewm(alpha=1/w, adjust=False) da alta e da baixa, igual ao pandas
+        alpha = 1.0 / w
+        if t == 0:
+            alta = baixa = 0.0
+            self.ema_alta, self.ema_baixa = alta, baixa
+        else:
+            diff = close - self.prev_close
+            alta = diff if diff > 0 else 0.0
+            baixa = -diff if diff < 0 else 0.0
+            peso_antigo = 1.0 - alpha
+            self.ema_alta = (peso_antigo * self.ema_alta + alpha * alta) / (peso_antigo + alpha)
+            self.ema_baixa = (peso_antigo * self.ema_baixa + alpha * baixa) / (peso_antigo + alpha)
+
+        # ATR: média simples das w primeiras TRs e depois Wilder
+        if t == 0:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        if t < w - 1:
+            self.atr += tr
+        elif t == w - 1:
+            self.atr = (self.atr + tr) / w
+        else:
+            self.atr = (self.atr * (w - 1) + tr) / w
+
+        # ADX: somas de Wilder de TR, +DM e -DM a partir da barra 1
+        if t >= 1:
+            movimento = max(high, self.prev_close) - min(low, self.prev_close)
+            sobe = high - self.prev_high
+            desce = self.prev_low - low
+            dm_pos = abs(sobe) if (sobe > desce and sobe > 0) else 0.0
+            dm_neg = abs(desce) if (desce > sobe and desce > 0) else 0.0
+            if t <= w:
+                self.trs += movimento
+                self.dmp += dm_pos
+                self.dmn += dm_neg
+            else:
+                self.trs = self.trs - (self.trs / float(w)) + movimento
+                self.dmp = self.dmp - (self.dmp / float(w)) + dm_pos
+                self.dmn = self.dmn - (self.dmn / float(w)) + dm_neg
+
+            if t >= w:
+                di_pos = 100 * (self.dmp / self.trs) if self.trs != 0 else 0.0
+                di_neg = 100 * (self.dmn / self.trs) if self.trs != 0 else 0.0
+                dx = 100 * abs((di_pos - di_neg) / (di_pos + di_neg)) if di_pos + di_neg != 0 else 0.0
+                if t < 2 * w - 1:
+                    self.soma_dx += dx
+                elif t == 2 * w - 1:
+                    self.adx = (self.soma_dx + dx) / w
+                else:
+                    self.adx = ((self.adx * (w - 1)) + dx) / float(w)
+
+        self.n += 1
+        self.ultima_data = pd.Timestamp(data).strftime("%Y-%m-%d")
+        self.prev_close, self.prev_high, self.prev_low = close, high, low
+        return self.valores()
+
+    def valores(self):
+        """Indicadores da última barra consumida (mesmas colunas do validar_setup_v2)."""
+        w = JANELA_WILDER
+        if self.n >= w and self.ema_baixa is not None:
+            rsi = 100.0 if self.ema_baixa == 0 else 100 - (100 / (1 + self.ema_alta / self.ema_baixa))
+        else:
+            rsi = float('nan')
+        return {
+            "Close": self.prev_close,
+            "Volume": self.volumes[-1] if self.volumes else float('nan'),
+            "SMA200": self.soma_longa / JANELA_SMA_LONGA if self.n >= JANELA_SMA_LONGA else float('nan'),
+            "SMA50": self.soma_curta / JANELA_SMA_CURTA if self.n >= JANELA_SMA_CURTA else float('nan'),
+            "RSI": rsi,
+            "ADX": self.adx if self.n >= 2 * w else 0.0,
+            "ATR": self.atr if self.n >= w else 0.0,
+            "Vol_SMA20": self.soma_volume / JANELA_VOLUME if self.n >= JANELA_VOLUME else float('nan'),
+        }
+
+    # --- PERSISTÊNCIA ---
+    def para_dict(self):
+        d = dict(self.__dict__)
+        d['closes'] = list(self.closes)
+        d['volumes'] = list(self.volumes)
+        return d
+
+    @classmethod
+    def de_dict(cls, d):
+        estado = cls()
+        estado.__dict__.update(d)
+        estado.closes = deque(d['closes'], maxlen=JANELA_SMA_LONGA)
+        estado.volumes = deque(d['volumes'], maxlen=JANELA_VOLUME)
+        return estado
+
+
+def _caminho(ticker):
+    return os.path.join(DIRETORIO_ESTADO, ticker.replace('^', '_') + ".json")
+
+
+# Estados já lidos neste processo: {ticker: (mtime do arquivo, estado)}.
+# Num processo residente evita reler o JSON; se outro processo gravou, o mtime muda.
+_memoria = {}
+
+
+def carregar_estado(ticker):
+    try:
+        mtime = os.stat(_caminho(ticker)).st_mtime_ns
+    except OSError:
+        return None
+    em_memoria = _memoria.get(ticker)
+    if em_memoria is not None and em_memoria[0] == mtime:
+        return em_memoria[1]
+    try:
+        with open(_caminho(ticker), "r") as f:
+            estado = EstadoIndicadores.de_dict(json.load(f))
+    except Exception:
+        return None
+    _memoria[ticker] = (mtime, estado)
+    return estado
+
+
+def salvar_estado(ticker, estado):
+    os.makedirs(DIRETORIO_ESTADO, exist_ok=True)
+    temporario = _caminho(ticker) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, "w") as f:
+        json.dump(estado.para_dict(), f)
+    os.replace(temporario, _caminho(ticker))
+    _memoria[ticker] = (os.stat(_caminho(ticker)).st_mtime_ns, estado)
+
+
+def _alimentar(estado, df):
+    valores = None
+    for data, h, l, c, v in zip(df.index, df['High'].to_numpy(), df['Low'].to_numpy(),
+                                df['Close'].to_numpy(), df['Volume'].to_numpy()):
+        valores = estado.atualizar(data, float(h), float(l), float(c), float(v))
+    return valores
+
+
+def atualizar_indicadores(ticker, df, hoje=None):
+    """
+    Indicadores da última barra do DF usando o estado persistido do ativo.
+    Só as barras posteriores ao estado são processadas; a barra do dia
+    (ainda em formação) é avaliada numa cópia, sem gravar no estado.
+    Se o histórico mudou (provento reajustou os preços), o estado é refeito.
+    """
+    if df.empty:
+        return None
+    hoje = pd.Timestamp(hoje or datetime.now().date())
+    fechadas = df[df.index.normalize() < hoje]
+    parcial = df[df.index.normalize() >= hoje]
+
+    estado = carregar_estado(ticker)
+    if estado is not None and estado.ultima_data is not None:
+        ultima = pd.Timestamp(estado.ultima_data)
+        if ultima not in fechadas.index or \
+                abs(fechadas.loc[ultima, 'Close'] - estado.prev_close) > TOLERANCIA_HISTORICO * abs(estado.prev_close):
+            estado = None
+    if estado is None:
+        estado, novas = EstadoIndicadores(), fechadas
+    else:
+        novas = fechadas[fechadas.index > pd.Timestamp(estado.ultima_data)]
+
+    try:
+        valores = _alimentar(estado, novas) if len(novas) else estado.valores()
+        if len(novas):
+            salvar_estado(ticker, estado)
+    except Exception:
+        _memoria.pop(ticker, None)  # O estado em memória pode ter ficado pela metade
+        raise
+
+    if len(parcial):
+        valores = _alimentar(copy.deepcopy(estado), parcial)
+    return valores
@@ -0,0 +1,87 @@
+import time
+import random
+import threading
+
+from metricas import metricas
+
+# --- CONFIGURAÇÃO ---
+TENTATIVAS_429 = 4
+ESPERA_BASE_429 = 15.0   # segundos; dobra a cada nova tentativa
+MARCADORES_429 = ("429", "rate limit", "ratelimit", "resource_exhausted", "quota", "too many requests")
+
+
+class LimitadorTaxa:
+    """
+    Token bucket duplo: requisições por minuto (RPM) e tokens por minuto (TPM).
+    Thread-safe: várias análises paralelas disputam o mesmo orçamento da API.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.capacidade_req = float(rpm)
+        self.capacidade_tok = float(tpm)
+        self.saldo_req = float(rpm)
+        self.saldo_tok = float(tpm)
+        self.ultimo = time.monotonic()
+        self.pausa_ate = 0.0
+        self.cond = threading.Condition()
+
+    def _repor(self):
+        agora = time.monotonic()
+        decorrido = agora - self.ultimo
+        self.ultimo = agora
+        self.saldo_req = min(self.capacidade_req, self.saldo_req + decorrido * self.capacidade_req / 60)
+        self.saldo_tok = min(self.capacidade_tok, self.saldo_tok + decorrido * self.capacidade_tok / 60)
+
+    def adquirir(self, requisicoes=1, tokens=0):
+        """Bloqueia até haver saldo para `requisicoes` chamadas e `tokens` tokens."""
+        requisicoes = min(requisicoes, self.capacidade_req)
+        tokens = min(tokens, self.capacidade_tok)
+        with self.cond:
+            while True:
+                self._repor()
+                agora = time.monotonic()
+                if agora < self.pausa_ate:
+                    self.cond.wait(self.pausa_ate - agora)
+                    continue
+                if self.saldo_req >= requisicoes and self.saldo_tok >= tokens:
+                    self.saldo_req -= requisicoes
+                    self.saldo_tok -= tokens
+                    return
+                espera_req = (requisicoes - self.saldo_req) * 60 / self.capacidade_req
+                espera_tok = (tokens - self.saldo_tok) * 60 / self.capacidade_tok
+                self.cond.wait(max(espera_req, espera_tok, 0.05))
+
+    def registrar_uso(self, tokens_estimados, tokens_reais):
+        """Acerta o saldo com o consumo real informado pela API (pode ficar negativo)."""
+        if tokens_reais is None:
+            return
+        with self.cond:
+            self.saldo_tok -= (tokens_reais - tokens_estimados)
+            self.cond.notify_all()
+
+    def pausar(self, segundos):
+        """Após um 429 ninguém chama a API até a pausa acabar."""
+        with self.cond:
+            self.pausa_ate = max(self.pausa_ate, time.monotonic() + segundos)
+            self.saldo_req = 0.0
+            self.cond.notify_all()
+
+
+def eh_rate_limit(erro):
+    texto = f"{type(erro).__name__} {erro}".lower()
+    return any(m in texto for m in MARCADORES_429)
+
+
+def executar_com_limite(funcao, limitador, requisicoes=1, tokens=0, tentativas=TENTATIVAS_429):
+    """Chama `funcao` respeitando o limitador, com backoff exponencial em 429."""
+    for tentativa in range(tentativas):
+        limitador.adquirir(requisicoes, tokens)
+        try:
+            return funcao()
+        except Exception as e:
+            if not eh_rate_limit(e) or tentativa == tentativas - 1:
+                raise
+            espera = ESPERA_BASE_429 * (2 ** tentativa) + random.uniform(0, 1)
+            metricas.contar("retentativas.429")
+            print(f"⏳ Rate limit da API (tentativa {tentativa + 1}/{tentativas}). Aguardando {espera:.0f}s...")
+            limitador.pausar(espera)
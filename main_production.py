@@ -1,6 +1,13 @@
 import os
 import json
 import time
+import queue
+import threading
+import multiprocessing
+from contextlib import contextmanager, nullcontext
+from multiprocessing import resource_tracker
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -8,32 +15,30 @@ from dotenv import load_dotenv
 # Garante que o robô ache os arquivos onde quer que esteja
 DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
 CAMINHO_ENV = os.path.join(DIRETORIO_BASE, '.env')
-CAMINHO_TRADES = os.path.join(DIRETORIO_BASE, 'trades_simulados.json')
 CAMINHO_CARTEIRA = os.path.join(DIRETORIO_BASE, 'carteira_alvo.json')
 
 load_dotenv(CAMINHO_ENV)
 
 # Bibliotecas de Dados
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from ta.momentum import RSIIndicator
-from ta.trend import SMAIndicator, ADXIndicator
-from ta.volatility import AverageTrueRange
-
-# Bibliotecas de IA
-from crewai import Agent, Task, Crew, Process
-from crewai.tools import tool
-import telebot
-
-# --- IMPORTAÇÃO DA BUSCA ---
-try:
-    from duckduckgo_search import DDGS
-except ImportError:
-    try:
-        from ddgs import DDGS
-    except ImportError:
-        DDGS = None
+from dados_mercado import carregar_ohlcv, carregar_varios
+from screener import avaliar_setup, avaliar_do_painel
+from painel import Painel
+from limitador import LimitadorTaxa, executar_com_limite
+from cache_persistente import CachePersistente
+from banco_trades import inserir_trade
+from cotacoes import servico_cotacoes
+import cassete
+from metricas import metricas
+from pipeline import FIM, nova_fila, alimentar, estagio, barreira, drenar
+from modelo_ranking import CAMINHO_MODELO, ModeloRanking, selecionar
+from decisao_ia import ESQUEMA, DecisaoInvalida, interpretar_decisao
+from notificador import notificador
+
+# Bibliotecas de IA (crewai, DDGS) só são importadas quando um ativo passa no
+# filtro: num dia sem candidatos o robô nem chega a carregá-las. O telebot só
+# é carregado pela thread do notificador, na primeira entrega.
 
 # --- CONFIGURAÇÃO DE CHAVES ---
 if os.getenv("GOOGLE_API_KEY"):
@@ -42,77 +47,24 @@ if os.getenv("GOOGLE_API_KEY"):
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
-bot = telebot.TeleBot(TELEGRAM_TOKEN)
+_trava_lazy = threading.Lock()
 
 # --- 1. O HARD SCREEN & FEATURE ENGINEERING ---
+# (regras e features ficam em screener.py, importável sem as libs de IA)
 def validar_setup_v2(ticker):
     """
     Retorna:
     1. Aprovado (Bool)
-    2. DF (DataFrame)
+    2. DF (DataFrame OHLCV)
     3. Features (Dict) - A 'Foto' técnica do mercado para auditoria/ML.
     """
     try:
-        # Baixa dados (2 anos para garantir médias longas)
-        df = yf.download(ticker, period="2y", interval="1d", progress=False)
+        # Dados do cache local (2 anos para garantir médias longas)
+        df = carregar_ohlcv(ticker, periodo="2y")
         if df.empty: return False, None, {}
-        
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-
-        # Filtro de Data (Evita dados velhos)
-        if (datetime.now() - df.index[-1].to_pydatetime()).days > 5:
-            return False, None, {}
-
-        # --- CÁLCULO DE INDICADORES ---
-        df['SMA200'] = SMAIndicator(df['Close'], window=200).sma_indicator()
-        df['SMA50'] = SMAIndicator(df['Close'], window=50).sma_indicator()
-        
-        df['RSI'] = RSIIndicator(df['Close'], window=14).rsi()
-        adx = ADXIndicator(df['High'], df['Low'], df['Close'], window=14)
-        df['ADX'] = adx.adx()
-        
-        atr = AverageTrueRange(df['High'], df['Low'], df['Close'], window=14)
-        df['ATR'] = atr.average_true_range()
-        
-        # Volume (Média de 20 dias)
-        df['Volume'] = df['Volume'].fillna(0)
-        df['Vol_SMA20'] = df['Volume'].rolling(window=20).mean()
-
-        atual = df.iloc[-1]
-
-        # --- REGRAS DE FILTRO ---
-        tendencia = (atual['Close'] > atual['SMA200']) and (atual['Close'] > atual['SMA50'])
-        forca = atual['ADX'] > 20
-        pullback = (atual['RSI'] < 65) and (atual['RSI'] > 35)
-
-        aprovado = tendencia and forca and pullback
-
-        # --- FEATURE ENGINEERING (A FOTO DO MOMENTO) ---
-        try:
-            vol_ratio = float(atual['Volume'] / atual['Vol_SMA20']) if atual['Vol_SMA20'] > 0 else 0.0
-        except:
-            vol_ratio = 0.0
-
-        features = {
-            "preco_entrada": float(atual['Close']),
-            "rsi": float(atual['RSI']),
-            "adx": float(atual['ADX']),
-            "atr_absoluto": float(atual['ATR']),
-            "atr_percentual": float(atual['ATR'] / atual['Close']) * 100,
-            
-            # Distância das Médias (%)
-            "distancia_sma200_pct": float((atual['Close'] - atual['SMA200']) / atual['SMA200']) * 100,
-            "distancia_sma50_pct": float((atual['Close'] - atual['SMA50']) / atual['SMA50']) * 100,
-            
-            # Volume Ratio
-            "volume_ratio": vol_ratio,
-            
-            # Contexto Temporal
-            "dia_semana": df.index[-1].weekday(), # 0=Seg, 4=Sex
-            "mes": df.index[-1].month
-        }
 
+        aprovado, features = avaliar_setup(ticker, df)
+        if not features: return False, None, {}
         return aprovado, df, features
 
     except Exception as e:
@@ -120,87 +72,260 @@ def validar_setup_v2(ticker):
         return False, None, {}
 
 # --- 2. FERRAMENTA DE BUSCA ---
-@tool("News Search")
-def search_news(query: str):
-    """Busca notícias recentes."""
-    if DDGS is None: return "Erro: Biblioteca DDGS ausente."
+# Memoização persistente: rodar de novo no mesmo dia não gasta DDGS nem Gemini
+cache_noticias = CachePersistente("noticias", ttl_segundos=int(os.getenv("CACHE_NOTICIAS_TTL", 6 * 3600)), max_itens=2000)
+cache_veredictos = CachePersistente("veredictos", ttl_segundos=int(os.getenv("CACHE_VEREDICTOS_TTL", 24 * 3600)), max_itens=2000)
+# Saída do Risk Manager: se só a resposta do Manager vier quebrada, ele é refeito sozinho.
+# A chave já leva a data (_chave_contexto); o TTL só precisa cobrir uma nova tentativa no mesmo dia
+cache_contexto_risco = CachePersistente("contexto_risco", ttl_segundos=int(os.getenv("CACHE_CONTEXTO_RISCO_TTL", 24 * 3600)), max_itens=2000)
+
+def _importar_ddgs():
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, region='br-pt', max_results=3))
+        from duckduckgo_search import DDGS
+    except ImportError:
+        try:
+            from ddgs import DDGS
+        except ImportError:
+            DDGS = None
+    return DDGS
+
+def _consultar_ddgs(query):
+    DDGS = _importar_ddgs()
+    if DDGS is None: raise ImportError("Biblioteca DDGS ausente.")
+    with DDGS() as ddgs:
+        return list(ddgs.text(query, region='br-pt', max_results=3))
+
+def buscar_noticias(query):
+    try:
+        with metricas.cronometro("noticias", query):
+            results = cassete.chamar("ddgs", [query], lambda: _consultar_ddgs(query))
         if not results: return "Sem notícias relevantes."
         return str(results)
+    except ImportError:
+        return "Erro: Biblioteca DDGS ausente."
     except Exception as e:
+        metricas.contar("erros.ddgs")
         return f"Erro busca: {str(e)}"
 
+def pesquisar_noticias(query: str):
+    """Busca notícias recentes."""
+    # Falhas não entram no cache (a próxima execução tenta de novo)
+    return cache_noticias.memoizar(["ddgs", query.strip().lower()], lambda: buscar_noticias(query),
+                                   cachear=lambda r: not r.startswith("Erro"))
+
+_ferramentas = {}
+
+def ferramenta_noticias():
+    """Embrulha pesquisar_noticias como ferramenta do crewai (uma vez, no primeiro uso)."""
+    with _trava_lazy:
+        if 'noticias' not in _ferramentas:
+            from crewai.tools import tool
+            _ferramentas['noticias'] = tool("News Search")(pesquisar_noticias)
+    return _ferramentas['noticias']
+
 # --- 3. AGENTES (IA) ---
 MODELO_IA = "gemini/gemini-2.0-flash"
 
-analista_risco = Agent(
-    role='Risk Manager',
-    goal='Identificar notícias de alto risco (falências, corrupção, quedas bruscas).',
-    backstory='Você protege o capital. Na dúvida, veta.',
-    tools=[search_news],
-    llm=MODELO_IA,
-    verbose=True
-)
-
-manager = Agent(
-    role='Portfolio Manager',
-    goal='Validar entrada técnica com base no risco.',
-    backstory='Você recebe o sinal técnico e as notícias. Decide o trade.',
-    llm=MODELO_IA,
-    verbose=True
-)
-
-# --- 4. TAREFAS ---
-t_risco = Task(
-    description='Busque notícias urgentes de {ticket}.',
-    expected_output='Resumo de riscos.',
-    agent=analista_risco
-)
-
-t_manager = Task(
-    description='''O ativo {ticket} tem setup técnico de COMPRA.
-    Dados Técnicos: Preço {price}, ATR {atr}.
-    Analise o risco das notícias.
-    Retorne JSON:
-    {{
-        "ticker": "{ticket}",
-        "decisao": "COMPRA" ou "CANCELAR",
-        "entrada": float,
-        "stop": float,
-        "alvo": float,
-        "confianca": "ALTA" ou "MEDIA",
-        "motivo": "string curta"
-    }}''',
-    expected_output='JSON Válido.',
-    agent=manager,
-    context=[t_risco]
-)
-
-equipe = Crew(
-    agents=[analista_risco, manager],
-    tasks=[t_risco, t_manager],
-    process=Process.sequential
-)
+# --- LIMITES DA API (governam as análises paralelas) ---
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "3"))
+LLM_RPM = float(os.getenv("LLM_RPM", "15"))
+LLM_TPM = float(os.getenv("LLM_TPM", "1000000"))
+LLM_CHAMADAS_POR_ANALISE = int(os.getenv("LLM_CHAMADAS_POR_ANALISE", "3"))  # Risk Manager + ferramenta + Manager
+LLM_TOKENS_POR_ANALISE = int(os.getenv("LLM_TOKENS_POR_ANALISE", "6000"))   # Estimativa antes da chamada
+LLM_TOKENS_POR_MANAGER = int(os.getenv("LLM_TOKENS_POR_MANAGER", "2000"))   # Só o Manager, sem ferramenta
+LLM_RETENTATIVAS_MANAGER = int(os.getenv("LLM_RETENTATIVAS_MANAGER", "1"))
+
+limitador_llm = LimitadorTaxa(LLM_RPM, LLM_TPM)
+_equipes_livres = queue.SimpleQueue()
+
+PROMPT_MANAGER = '''O ativo {ticket} tem setup técnico de COMPRA.
+        Dados Técnicos: Preço {price}, ATR {atr}.
+        Analise o risco das notícias.
+        Retorne JSON:
+        ''' + ESQUEMA
+SAIDA_MANAGER = 'Somente o objeto JSON Válido (sem markdown), números com ponto decimal e sem "R$".'
+
+def montar_equipe():
+    """Agentes + tarefas + Crew. Uma por análise simultânea (a Crew guarda estado da execução)."""
+    from crewai import Agent, Task, Crew, Process
+    search_news = ferramenta_noticias()
+
+    analista_risco = Agent(
+        role='Risk Manager',
+        goal='Identificar notícias de alto risco (falências, corrupção, quedas bruscas).',
+        backstory='Você protege o capital. Na dúvida, veta.',
+        tools=[search_news],
+        llm=MODELO_IA,
+        verbose=True
+    )
+
+    manager = Agent(
+        role='Portfolio Manager',
+        goal='Validar entrada técnica com base no risco.',
+        backstory='Você recebe o sinal técnico e as notícias. Decide o trade.',
+        llm=MODELO_IA,
+        verbose=True
+    )
+
+    # --- 4. TAREFAS ---
+    t_risco = Task(
+        description='Busque notícias urgentes de {ticket}.',
+        expected_output='Resumo de riscos.',
+        agent=analista_risco
+    )
+
+    t_manager = Task(
+        description=PROMPT_MANAGER,
+        expected_output=SAIDA_MANAGER,
+        agent=manager,
+        context=[t_risco]
+    )
+
+    return Crew(
+        agents=[analista_risco, manager],
+        tasks=[t_risco, t_manager],
+        process=Process.sequential
+    )
+
+@contextmanager
+def equipe_emprestada():
+    """Reaproveita Crews já montadas entre threads e rodadas (no modo residente ficam quentes)."""
+    try:
+        crew = _equipes_livres.get_nowait()
+    except queue.Empty:
+        crew = montar_equipe()
+    try:
+        yield crew
+    finally:
+        _equipes_livres.put(crew)
+
+def _kickoff(inputs):
+    """Chamada real à Crew (limitada por RPM/TPM). Retorna só o texto bruto."""
+    with equipe_emprestada() as crew:
+        resultado = executar_com_limite(
+            lambda: crew.kickoff(inputs=inputs),
+            limitador_llm, requisicoes=LLM_CHAMADAS_POR_ANALISE, tokens=LLM_TOKENS_POR_ANALISE
+        )
+        risco = getattr(crew.tasks[0], 'output', None)
+    uso = getattr(resultado, 'token_usage', None)
+    limitador_llm.registrar_uso(LLM_TOKENS_POR_ANALISE, getattr(uso, 'total_tokens', None))
+    if getattr(risco, 'raw', None):
+        cache_contexto_risco.gravar(_chave_contexto(inputs), risco.raw)
+    return getattr(resultado, 'raw', str(resultado))
+
+def _chave_contexto(inputs):
+    return [inputs['ticket'], datetime.now().strftime("%Y-%m-%d")]
+
+def _kickoff_manager(inputs, erro):
+    """Refaz só a tarefa do Manager sobre o resumo de riscos já guardado (1 chamada em vez da Crew)."""
+    achou, contexto = cache_contexto_risco.obter(_chave_contexto(inputs))
+    if not achou:
+        raise erro
+    from crewai import Task
+    with equipe_emprestada() as crew:
+        manager = crew.tasks[1].agent
+        tarefa = Task(
+            description=PROMPT_MANAGER.format(**inputs) +
+                        f"\n        Sua resposta anterior foi rejeitada ({erro}). Corrija e devolva SOMENTE o JSON.",
+            expected_output=SAIDA_MANAGER,
+            agent=manager
+        )
+        resultado = executar_com_limite(
+            lambda: tarefa.execute_sync(agent=manager, context=contexto),
+            limitador_llm, requisicoes=1, tokens=LLM_TOKENS_POR_MANAGER
+        )
+    uso = getattr(resultado, 'token_usage', None)
+    limitador_llm.registrar_uso(LLM_TOKENS_POR_MANAGER, getattr(uso, 'total_tokens', None))
+    return getattr(resultado, 'raw', str(resultado))
+
+def _rodar_equipe(inputs):
+    """
+    Crew -> sinal no contrato do t_manager. Resposta fora do contrato: reparo
+    local (decisao_ia) e, se não bastar, só o Manager é refeito.
+    """
+    ticker = inputs['ticket']
+    # No modo reproduzir a resposta vem do cassete: nem a Crew nem o crewai são carregados
+    with metricas.cronometro("llm", ticker):
+        raw_out = cassete.chamar("llm", [MODELO_IA, ticker], lambda: _kickoff(inputs))
+
+    for tentativa in range(LLM_RETENTATIVAS_MANAGER + 1):
+        try:
+            sinal, correcoes, fatais = interpretar_decisao(raw_out, ticker, inputs['price'])
+        except DecisaoInvalida as erro:
+            metricas.contar("llm.decisao_invalida")
+            if tentativa == LLM_RETENTATIVAS_MANAGER:
+                raise
+            print(f"🩹 {ticker}: resposta do Manager fora do contrato ({erro}). Refazendo só o Manager...")
+            with metricas.cronometro("llm", ticker):
+                raw_out = cassete.chamar("llm", [MODELO_IA, ticker, "manager", tentativa],
+                                         lambda: _kickoff_manager(inputs, erro))
+            metricas.contar("llm.retentativas_manager")
+            continue
+        # Só as correções que derrubavam o json.loads antigo ("Erro Crítico" e a
+        # Crew inteira de novo no próximo ciclo) contam como chamadas poupadas
+        if tentativa:
+            metricas.contar("llm.chamadas_poupadas", tentativa * (LLM_CHAMADAS_POR_ANALISE - 1))
+        elif correcoes:
+            metricas.contar("llm.reparos_locais")
+            if fatais:
+                metricas.contar("llm.chamadas_poupadas", LLM_CHAMADAS_POR_ANALISE)
+        if correcoes:
+            print(f"🩹 {ticker}: resposta reparada localmente ({', '.join(correcoes)})")
+        return sinal
+
+def analisar_com_ia(ticker, features_tecnicas):
+    """Roda a Crew para um ativo aprovado respeitando RPM/TPM. Retorna o sinal (dict)."""
+    inputs = {
+        'ticket': ticker, 
+        'atr': f"{features_tecnicas['atr_absoluto']:.2f}",
+        'price': f"{features_tecnicas['preco_entrada']:.2f}"
+    }
+
+    # Mesmo ativo, mesmo pregão e mesmos dados técnicos = mesmo veredito
+    chave = [ticker, datetime.now().strftime("%Y-%m-%d"), inputs['price'], inputs['atr']]
+    return cache_veredictos.memoizar(chave, lambda: _rodar_equipe(inputs))
+
+def imprimir_resumo_decisoes():
+    c = {k: metricas.contadores.get(f"llm.{k}", 0)
+         for k in ("reparos_locais", "retentativas_manager", "decisao_invalida", "chamadas_poupadas")}
+    if c["decisao_invalida"] or c["reparos_locais"]:
+        print(f"🩹 Decisões IA: {c['reparos_locais']} reparada(s) localmente | "
+              f"{c['retentativas_manager']} Manager refeito(s) | {c['decisao_invalida']} fora do contrato | "
+              f"~{c['chamadas_poupadas']} chamada(s) LLM poupada(s)")
+
+# --- 4b. RANKING ANTES DA IA (opcional) ---
+# Modelo logístico treinado offline (modelo_ranking.py) ordena os aprovados:
+# só o top-K e/ou quem passa do limiar de probabilidade vai para a Crew.
+RANKING_TOP_K = int(os.getenv("RANKING_TOP_K", "0"))          # 0 = sem limite
+RANKING_LIMIAR = float(os.getenv("RANKING_LIMIAR", "0"))      # 0 = sem limiar
+CAMINHO_MODELO_RANKING = os.getenv("RANKING_MODELO", CAMINHO_MODELO)
+
+def carregar_modelo_ranking():
+    if not (RANKING_TOP_K or RANKING_LIMIAR):
+        return None
+    try:
+        return ModeloRanking.carregar(CAMINHO_MODELO_RANKING)
+    except Exception as e:
+        print(f"⚠️ Modelo de ranking indisponível ({e}). Todos os aprovados vão para a IA.")
+        return None
+
+def ranquear_candidatos(candidatos, modelo, contagem):
+    """[(ticker, features)] -> só os que seguem para a IA. Acumula em `contagem`."""
+    enviados, descartados = selecionar(candidatos, modelo, RANKING_TOP_K, RANKING_LIMIAR)
+    for ticker, features in descartados:
+        print(f"🔻 {ticker} fora do ranking (p={features['probabilidade_modelo']:.2f}). IA poupada.")
+    for ticker, features in enviados:
+        print(f"🎯 {ticker} no ranking (p={features['probabilidade_modelo']:.2f}).")
+    contagem['avaliados'] += len(candidatos)
+    contagem['descartados'] += len(descartados)
+    return enviados
+
+def imprimir_resumo_ranking(contagem):
+    print(f"🧮 Ranking: {contagem['avaliados'] - contagem['descartados']}/{contagem['avaliados']} aprovados para a IA | "
+          f"~{contagem['descartados'] * LLM_CHAMADAS_POR_ANALISE} chamadas ao LLM economizadas")
 
 # --- 5. REGISTRO DE TRADES (DATA WAREHOUSE) ---
 def registrar_trade(sinal):
-    historico = []
-    
-    if os.path.exists(CAMINHO_TRADES):
-        try:
-            with open(CAMINHO_TRADES, "r") as f:
-                historico = json.load(f)
-        except:
-            pass 
-    
-    # Evita duplicatas do dia
-    hoje = datetime.now().strftime("%Y-%m-%d")
-    for trade in historico:
-        if trade['ticker'] == sinal['ticker'] and trade['data'].startswith(hoje):
-            return 
-
     novo_trade = {
         "data": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "ticker": sinal['ticker'],
@@ -215,16 +340,17 @@ def registrar_trade(sinal):
         "features_tecnicas": sinal.get('features_ml', {})
     }
     
-    historico.append(novo_trade)
-    
-    with open(CAMINHO_TRADES, "w") as f:
-        json.dump(historico, f, indent=4)
+    # Índice único (ticker, dia) no banco: evita duplicatas do dia sem ler o histórico
+    with metricas.cronometro("banco", sinal['ticker']):
+        inserido = inserir_trade(novo_trade)
+    if not inserido:
+        return
         
     print(f"📝 Trade Registrado: {sinal['ticker']} a R$ {sinal['entrada']}")
 
 # --- 6. TELEGRAM & EXECUÇÃO ---
 def enviar_alerta(sinal):
-    if not bot: return
+    """Só enfileira: a entrega (retentativas, limite do chat, digest) é do notificador."""
     emoji = "🟢" if sinal.get('confianca') == "ALTA" else "🟡"
     ft = sinal.get('features_ml', {})
     
@@ -244,12 +370,83 @@ def enviar_alerta(sinal):
 📝 **Motivo IA:** {sinal.get('motivo')}
     """
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, msg, parse_mode="Markdown")
+        notificador.enviar_mensagem(TELEGRAM_CHAT_ID, msg, parse_mode="Markdown", agrupar=True)
     except Exception as e:
+        metricas.contar("erros.telegram")
         print(f"Erro Telegram: {e}")
 
-def rodar_robo():
-    print("--- INICIANDO ROBÔ V7.2 (SNIPER MODE) ---")
+# --- 7. PIPELINE DE EXECUÇÃO ---
+# download (threads, I/O) -> indicadores (processos, CPU) -> IA (threads, RPM/TPM) -> saída
+# Os estágios se sobrepõem: aprovados entram na IA enquanto outros ainda baixam.
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_LOTE = int(os.getenv("DOWNLOAD_LOTE", "10"))   # Ativos por request multi-ticker
+SCREEN_PROCESSOS = int(os.getenv("SCREEN_PROCESSOS", str(min(4, os.cpu_count() or 1))))
+FILA_MAX = 32
+
+def _baixar_para_screen(lote, forcar=False):
+    """Baixa o lote e publica num painel float32 compartilhado: os workers do screener anexam sem cópia."""
+    with metricas.cronometro("download"):
+        dados = carregar_varios(lote, periodo="2y", forcar=forcar)
+    for ticker in lote:
+        if dados[ticker].empty:
+            print(f"⏹️ {ticker} sem dados.")
+    painel = Painel.de_dataframes(dados)
+    if not painel.tickers:
+        painel.liberar()
+        return []
+    painel.reservar(len(painel.tickers))  # Liberado quando o último ativo do lote for avaliado
+    return [(t, painel) for t in painel.tickers]
+
+def executar_compras(confirmados):
+    """SNIPER MODE: refresh de preço de todas as compras num único request, alerta e registro."""
+    print(f"🔄 Buscando preço em tempo real para execução ({len(confirmados)} ativo(s))...")
+    try:
+        with metricas.cronometro("cotacoes"):
+            cotacoes = servico_cotacoes.obter([t for t, _ in confirmados])
+    except Exception as e:
+        metricas.contar("erros.cotacoes")
+        print(f"⚠️ Erro no Refresh de Preço ({e}). Mantendo preço da análise.")
+        cotacoes = {}
+
+    for ticker, sinal in confirmados:
+        try:
+            cotacao = cotacoes.get(ticker)
+            if cotacao:
+                # Pega o último trade (Close do dia atual)
+                preco_real_agora = cotacao['Close']
+                print(f"📉 Preço IA: {sinal['entrada']} -> Preço REAL: {preco_real_agora:.2f}")
+                sinal['entrada'] = round(float(preco_real_agora), 2)
+            else:
+                print(f"⚠️ Sem cotação para {ticker}. Mantendo preço da análise.")
+
+            print(f"🚀 COMPRA CONFIRMADA: {ticker}")
+            enviar_alerta(sinal)
+            registrar_trade(sinal)
+        except Exception as e:
+            print(f"Erro Crítico ({ticker}): {e}")
+
+def criar_pool_screen():
+    # fork só é seguro antes de existirem threads: sobe os processos primeiro
+    contexto = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    # Rastreador de memória compartilhada no ar antes do fork: workers usam o do pai
+    # (senão cada um sobe o seu e tenta apagar os painéis dos lotes ao sair)
+    resource_tracker.ensure_running()
+    pool = ProcessPoolExecutor(max_workers=SCREEN_PROCESSOS, mp_context=contexto)
+    for f in [pool.submit(int) for _ in range(SCREEN_PROCESSOS)]:
+        f.result()
+    return pool
+
+def rodar_robo(so_screen=False, pool_screen=None, forcar_dados=False):
+    """
+    Rotina completa. Com `so_screen`, para no filtro quantitativo (sem IA nem Telegram).
+    O modo residente passa um `pool_screen` já aquecido e `forcar_dados` para
+    ignorar a validade do cache logo após o fechamento.
+    """
+    print("--- INICIANDO ROBÔ V7.2 (SNIPER MODE) ---" if not so_screen else "--- ROBÔ V7.2: SÓ SCREEN ---")
+    inicio = time.perf_counter()
+    metricas.iniciar("so_screen" if so_screen else "robo")
+    metricas.acompanhar_cache("noticias", lambda: (cache_noticias.hits, cache_noticias.misses))
+    metricas.acompanhar_cache("veredictos", lambda: (cache_veredictos.hits, cache_veredictos.misses))
     
     if not os.path.exists(CAMINHO_CARTEIRA):
         with open(CAMINHO_CARTEIRA, "w") as f:
@@ -257,61 +454,131 @@ def rodar_robo():
             
     with open(CAMINHO_CARTEIRA, "r") as f:
         carteira = json.load(f)
-        
-    for ticker in carteira:
-        print(f"\n🔎 Analisando {ticker}...")
-        aprovado, df, features_tecnicas = validar_setup_v2(ticker)
-        
-        if aprovado:
-            print(f"✅ {ticker} Aprovado no Filtro Quantitativo.")
-            
-            inputs = {
-                'ticket': ticker, 
-                'atr': f"{features_tecnicas['atr_absoluto']:.2f}",
-                'price': f"{features_tecnicas['preco_entrada']:.2f}"
-            }
-            
+
+    lotes = [carteira[i:i + DOWNLOAD_LOTE] for i in range(0, len(carteira), DOWNLOAD_LOTE)]
+    fila_lotes, fila_dados = nova_fila(FILA_MAX), nova_fila(FILA_MAX)
+    fila_aprovados, fila_veredictos = nova_fila(FILA_MAX), nova_fila(FILA_MAX)
+
+    # Worker do pool morto (OOM, segfault): o pool fica quebrado para sempre e
+    # cada ativo falharia calado. A rodada termina e o erro sobe para quem chamou.
+    pool_quebrado = []
+
+    def _verificar_pool(**extra):
+        if pool_quebrado:
+            metricas.finalizar(ativos=len(carteira), erro=f"pool do screener quebrado: {pool_quebrado[0]}", **extra)
+            raise pool_quebrado[0]
+
+    with (criar_pool_screen() if pool_screen is None else nullcontext(pool_screen)) as pool_screen:
+
+        def _screen(item):
+            ticker, painel = item
             try:
-                print("⏳ Aguardando 20s (API Rate Limit)...")
-                time.sleep(20)
-                
-                resultado = equipe.kickoff(inputs=inputs)
-                
-                # Tratamento de saída da IA
-                raw_out = getattr(resultado, 'raw', str(resultado))
-                texto_limpo = raw_out.replace('```json', '').replace('```', '').strip()
-                sinal = json.loads(texto_limpo)
-                
-                if sinal['decisao'] == "COMPRA":
-                    # --- SNIPER MODE: REFRESH DE PREÇO ---
-                    # Atualiza o preço para o segundo exato da execução
-                    print("🔄 Buscando preço em tempo real para execução...")
-                    try:
-                        ticker_obj = yf.Ticker(ticker)
-                        # Pega o último trade (Close do dia atual)
-                        preco_real_agora = ticker_obj.history(period="1d")['Close'].iloc[-1]
-                        
-                        print(f"📉 Preço IA: {sinal['entrada']} -> Preço REAL: {preco_real_agora:.2f}")
-                        sinal['entrada'] = round(float(preco_real_agora), 2)
-                        
-                    except Exception as e:
-                        print(f"⚠️ Erro no Refresh de Preço ({e}). Mantendo preço da análise.")
-
-                    # Injeta dados da caixa preta
-                    sinal['features_ml'] = features_tecnicas
-                    
-                    print(f"🚀 COMPRA CONFIRMADA: {ticker}")
-                    enviar_alerta(sinal)
-                    registrar_trade(sinal)
-                else:
-                    print(f"❌ {ticker} vetado pelo Risk Manager.")
-                    
+                with metricas.cronometro("indicadores", ticker):
+                    aprovado, features_tecnicas = pool_screen.submit(avaliar_do_painel, painel.descritor, ticker).result()
+            except BrokenProcessPool as e:
+                metricas.contar("erros.screener")
+                if not pool_quebrado:
+                    print(f"🛑 Pool do screener quebrado ({ticker}): {e}")
+                    pool_quebrado.append(e)
+                return []
             except Exception as e:
-                print(f"Erro Crítico: {e}")
-        else:
+                metricas.contar("erros.screener")
+                print(f"Erro no screener ({ticker}): {e}")
+                return []
+            finally:
+                painel.devolver()
+            if aprovado:
+                print(f"✅ {ticker} Aprovado no Filtro Quantitativo. Enviando para a IA...")
+                return [(ticker, features_tecnicas)]
             print(f"⏹️ {ticker} Reprovado no filtro técnico.")
+            return []
+
+        def _ia(item):
+            # IA limitada por RPM/TPM (no lugar do sleep fixo de 20s)
+            ticker, features_tecnicas = item
+            try:
+                return [(ticker, features_tecnicas, analisar_com_ia(ticker, features_tecnicas), None)]
+            except Exception as e:
+                metricas.contar("erros.ia")
+                return [(ticker, features_tecnicas, None, e)]
+
+        alimentar(lotes, fila_lotes)
+        estagio("download", lambda lote: _baixar_para_screen(lote, forcar_dados), fila_lotes, fila_dados, DOWNLOAD_WORKERS)
+        estagio("indicadores", _screen, fila_dados, fila_aprovados, SCREEN_PROCESSOS)
+
+        # Ranking: com top-K precisa ver todos os aprovados; só com limiar é streaming
+        modelo = carregar_modelo_ranking()
+        contagem = {'avaliados': 0, 'descartados': 0}
+        if modelo is not None:
+            fila_ranqueados = nova_fila(FILA_MAX)
+            if RANKING_TOP_K > 0:
+                barreira("ranking", lambda itens: ranquear_candidatos(itens, modelo, contagem),
+                         fila_aprovados, fila_ranqueados)
+            else:
+                estagio("ranking", lambda item: ranquear_candidatos([item], modelo, contagem),
+                        fila_aprovados, fila_ranqueados, 1)
+            fila_aprovados = fila_ranqueados
+
+        if so_screen:
+            aprovados = []
+            while True:
+                item = fila_aprovados.get()
+                if item is FIM: break
+                aprovados.append(item[0])
+            _verificar_pool(aprovados=len(aprovados))
+            print(f"📋 {len(aprovados)} aprovado(s): {', '.join(aprovados) or '-'}")
+            if modelo is not None:
+                imprimir_resumo_ranking(contagem)
+            if cassete.cassete.ativo:
+                print(f"📼 {cassete.cassete.resumo()}")
+            print(f"⏱️ {len(carteira)} ativos em {time.perf_counter() - inicio:.1f}s")
+            metricas.finalizar(ativos=len(carteira), aprovados=len(aprovados))
+            print("--- FIM DA ROTINA ---")
+            return aprovados
+
+        estagio("ia", _ia, fila_aprovados, fila_veredictos, max(1, LLM_WORKERS))
+
+        # Estágio final (thread principal): processa em lote tudo que a IA já devolveu
+        acabou = False
+        analisados = comprados = 0
+        # TELEGRAM_DIGEST=1: os alertas da rodada saem numa mensagem só, no fim do bloco
+        with notificador.digest("🚀 Sinais da rodada"):
+            while not acabou:
+                item = fila_veredictos.get()
+                if item is FIM: break
+                lote, acabou = drenar(fila_veredictos, item)
+
+                confirmados = []
+                analisados += len(lote)
+                for ticker, features_tecnicas, sinal, erro in lote:
+                    if erro is not None:
+                        print(f"Erro Crítico ({ticker}): {erro}")
+                    elif sinal['decisao'] == "COMPRA":
+                        # Injeta dados da caixa preta
+                        sinal['features_ml'] = features_tecnicas
+                        confirmados.append((ticker, sinal))
+                    else:
+                        print(f"❌ {ticker} vetado pelo Risk Manager.")
+                if confirmados:
+                    comprados += len(confirmados)
+                    executar_compras(confirmados)
+        _verificar_pool(analisados_ia=analisados, compras=comprados)
             
+    if modelo is not None:
+        imprimir_resumo_ranking(contagem)
+    print(f"📦 Cache {cache_noticias.resumo()} | {cache_veredictos.resumo()}")
+    imprimir_resumo_decisoes()
+    if cassete.cassete.ativo:
+        print(f"📼 {cassete.cassete.resumo()}")
+    print(f"⏱️ {len(carteira)} ativos em {time.perf_counter() - inicio:.1f}s")
+    metricas.finalizar(ativos=len(carteira), analisados_ia=analisados, compras=comprados)
     print("--- FIM DA ROTINA ---")
 
 if __name__ == "__main__":
-    rodar_robo()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Robô de swing trade B3")
+    parser.add_argument("--so-screen", action="store_true",
+                        help="Só o filtro quantitativo: não carrega IA nem Telegram")
+    rodar_robo(so_screen=parser.parse_args().so_screen)
+    # Alertas ainda na fila: espera um pouco; o resto é entregue na próxima execução
+    notificador.aguardar()
\ No newline at end of file
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_METRICAS = os.getenv("METRICAS_ARQUIVO", os.path.join(DIRETORIO_BASE, 'metricas', 'execucoes.jsonl'))
+
+# --- MÉTRICAS DA EXECUÇÃO ---
+# Tempo de parede por estágio (download, indicadores, notícias, LLM, cotações,
+# Telegram, banco...), latência por ativo, acertos de cache e erros/retentativas
+# de API. Ao fim de cada execução: uma linha JSON em metricas/execucoes.jsonl
+# e uma tabela resumo no terminal. Cada estágio guarda a soma das chamadas
+# ("soma") e a janela entre o primeiro início e o último fim ("janela"):
+# em threads paralelas soma >> janela (paralelismo funcionando); em chamadas
+# intercaladas com outros estágios janela >> soma. O tempo de parede do
+# estágio é o menor dos dois.
+MAIS_LENTOS = 5   # Ativos mais lentos guardados por estágio
+
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.iniciar()
+
+    def iniciar(self, execucao="execucao"):
+        """Zera tudo: chamado no começo de cada execução (o modo residente roda várias)."""
+        with self._lock:
+            self.execucao = execucao
+            self.inicio = time.time()
+            self._t0 = time.perf_counter()
+            self.estagios = defaultdict(lambda: {"chamadas": 0, "soma_s": 0.0, "max_s": 0.0,
+                                                 "primeiro": None, "ultimo": None})
+            self.latencias = defaultdict(list)     # estagio -> [(ticker, segundos)]
+            self.contadores = defaultdict(int)
+            self.caches = defaultdict(lambda: [0, 0])  # nome -> [acertos, erros]
+            self._externos = {}                    # nome -> (função de contagem, contagem inicial)
+
+    # --- COLETA ---
+    @contextmanager
+    def cronometro(self, estagio, item=None):
+        """Mede o bloco como uma chamada do `estagio` (e a latência do `item`, se informado)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            fim = time.perf_counter()
+            self.registrar(estagio, fim - inicio, item, inicio)
+
+    def registrar(self, estagio, segundos, item=None, inicio=None):
+        fim = time.perf_counter()
+        inicio = fim - segundos if inicio is None else inicio
+        with self._lock:
+            e = self.estagios[estagio]
+            e["chamadas"] += 1
+            e["soma_s"] += segundos
+            e["max_s"] = max(e["max_s"], segundos)
+            e["primeiro"] = inicio if e["primeiro"] is None else min(e["primeiro"], inicio)
+            e["ultimo"] = fim if e["ultimo"] is None else max(e["ultimo"], fim)
+            if item is not None:
+                self.latencias[estagio].append((item, segundos))
+
+    def contar(self, nome, n=1):
+        """Contadores livres, ex.: 'erros.yfinance', 'retentativas.429'."""
+        with self._lock:
+            self.contadores[nome] += n
+
+    def cache(self, nome, acertos=0, erros=0):
+        with self._lock:
+            self.caches[nome][0] += acertos
+            self.caches[nome][1] += erros
+
+    def acompanhar_cache(self, nome, contagem):
+        """Cache com contadores próprios: `contagem()` -> (acertos, erros) acumulados; conta só a diferença."""
+        with self._lock:
+            self._externos[nome] = (contagem, contagem())
+
+    # --- SAÍDA ---
+    def _resumo_latencias(self):
+        resumo = {}
+        for estagio, itens in self.latencias.items():
+            tempos = np.array([s for _, s in itens]) * 1000
+            lentos = sorted(itens, key=lambda i: i[1], reverse=True)[:MAIS_LENTOS]
+            resumo[estagio] = {
+                "n": len(itens),
+                "media_ms": float(tempos.mean()),
+                "p50_ms": float(np.percentile(tempos, 50)),
+                "p95_ms": float(np.percentile(tempos, 95)),
+                "max_ms": float(tempos.max()),
+                "mais_lentos": [[str(item), round(s * 1000, 1)] for item, s in lentos],
+            }
+        return resumo
+
+    def _resumo_caches(self):
+        contagens = {nome: tuple(c) for nome, c in self.caches.items()}
+        for nome, (contagem, (acertos_0, erros_0)) in self._externos.items():
+            acertos, erros = contagem()
+            contagens[nome] = (acertos - acertos_0, erros - erros_0)
+        resumo = {}
+        for nome, (acertos, erros) in contagens.items():
+            total = acertos + erros
+            resumo[nome] = {"acertos": acertos, "erros": erros,
+                            "taxa_acerto": acertos / total if total else None}
+        return resumo
+
+    def registro(self, **extra):
+        with self._lock:
+            estagios = {
+                nome: {"chamadas": e["chamadas"], "soma_s": round(e["soma_s"], 4), "max_s": round(e["max_s"], 4),
+                       "janela_s": round(e["ultimo"] - e["primeiro"], 4),
+                       "parede_s": round(min(e["soma_s"], e["ultimo"] - e["primeiro"]), 4)}
+                for nome, e in self.estagios.items()
+            }
+            return {
+                "execucao": self.execucao,
+                "inicio": datetime.fromtimestamp(self.inicio).strftime("%Y-%m-%d %H:%M:%S"),
+                "duracao_s": round(time.perf_counter() - self._t0, 3),
+                "estagios": estagios,
+                "latencias": self._resumo_latencias(),
+                "caches": self._resumo_caches(),
+                "contadores": dict(self.contadores),
+                **extra,
+            }
+
+    def finalizar(self, caminho=None, imprimir=True, **extra):
+        """Anexa o registro da execução ao JSONL e imprime a tabela. Retorna o registro."""
+        registro = self.registro(**extra)
+        caminho = caminho or CAMINHO_METRICAS
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+            with open(caminho, "a", encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Métricas não gravadas ({e})")
+        if imprimir:
+            print(tabela(registro))
+        return registro
+
+
+def tabela(registro):
+    """Tabela de texto com estágios (mais caros primeiro), caches e contadores."""
+    duracao = registro["duracao_s"] or 1e-9
+    linhas = [f"📊 Métricas ({registro['execucao']}, {registro['duracao_s']:.1f}s)",
+              f"{'Estágio':<14}{'Chamadas':>9}{'Soma':>10}{'Janela':>10}{'% exec':>8}{'p95/ativo':>11}"]
+    latencias = registro["latencias"]
+    for nome, e in sorted(registro["estagios"].items(), key=lambda i: i[1]["parede_s"], reverse=True):
+        p95 = f"{latencias[nome]['p95_ms']:.0f}ms" if nome in latencias else "-"
+        linhas.append(f"{nome:<14}{e['chamadas']:>9}{e['soma_s']:>9.2f}s{e['janela_s']:>9.2f}s"
+                      f"{e['parede_s'] / duracao * 100:>7.0f}%{p95:>11}")
+    for nome, c in registro["caches"].items():
+        if c["acertos"] + c["erros"] == 0:
+            continue
+        taxa = "-" if c["taxa_acerto"] is None else f"{c['taxa_acerto'] * 100:.0f}%"
+        linhas.append(f"Cache {nome}: {c['acertos']} acertos / {c['erros']} erros ({taxa})")
+    if registro["contadores"]:
+        linhas.append(" | ".join(f"{k}: {v}" for k, v in sorted(registro["contadores"].items())))
+    return "\n".join(linhas)
+
+
+def ler_execucoes(caminho=None, ultimas=None):
+    """Registros do JSONL (os `ultimas` mais recentes)."""
+    caminho = caminho or CAMINHO_METRICAS
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, "r", encoding='utf-8') as f:
+        registros = [json.loads(l) for l in f if l.strip()]
+    return registros[-ultimas:] if ultimas else registros
+
+
+# Instância compartilhada pelo processo
+metricas = Metricas()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Tabela das últimas execuções registradas")
+    parser.add_argument("--ultimas", type=int, default=1)
+    parser.add_argument("--arquivo", default=None)
+    args = parser.parse_args()
+    registros = ler_execucoes(args.arquivo, args.ultimas)
+    if not registros:
+        print("Nenhuma execução registrada.")
+    for registro in registros:
+        print(tabela(registro))
+        print()
@@ -0,0 +1,154 @@
+import os
+import json
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_MODELO = os.path.join(DIRETORIO_BASE, 'modelo_ranking.json')
+
+# --- CONFIGURAÇÃO DO TREINO ---
+L2_PADRAO = 1.0
+ITERACOES_NEWTON = 25
+FRACAO_VALIDACAO = 0.2   # Últimas datas ficam fora do treino (sem olhar o futuro)
+
+
+# --- REGRESSÃO LOGÍSTICA (NumPy puro) ---
+def _sigmoide(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -35, 35)))
+
+
+def treinar_logistica(X, y, l2=L2_PADRAO, iteracoes=ITERACOES_NEWTON):
+    """Newton-Raphson com regularização L2 (o intercepto não é penalizado). Retorna os pesos."""
+    X1 = np.column_stack([np.ones(len(X)), X])
+    w = np.zeros(X1.shape[1])
+    penal = np.full(X1.shape[1], l2)
+    penal[0] = 0.0
+    for _ in range(iteracoes):
+        p = _sigmoide(X1 @ w)
+        gradiente = X1.T @ (p - y) + penal * w
+        hessiana = (X1 * (p * (1 - p))[:, None]).T @ X1 + np.diag(penal)
+        passo = np.linalg.solve(hessiana, gradiente)
+        w -= passo
+        if np.abs(passo).max() < 1e-8:
+            break
+    return w
+
+
+def auc(y, p):
+    """Área sob a curva ROC pela estatística de Mann-Whitney (empates pela média dos postos)."""
+    ordem = np.argsort(p, kind='mergesort')
+    p_ord = p[ordem]
+    postos = np.empty(len(p))
+    _, inicio, contagem = np.unique(p_ord, return_index=True, return_counts=True)
+    postos[ordem] = np.repeat(inicio + (contagem + 1) / 2.0, contagem)
+    positivos = y.sum()
+    negativos = len(y) - positivos
+    if positivos == 0 or negativos == 0:
+        return float('nan')
+    return float((postos[y == 1].sum() - positivos * (positivos + 1) / 2) / (positivos * negativos))
+
+
+class ModeloRanking:
+    """Pontua o features_tecnicas de um candidato: P(trade ganhador). Inferência = um produto escalar."""
+
+    def __init__(self, features, media, desvio, pesos, metricas=None):
+        self.features = list(features)
+        self.media = np.asarray(media, dtype='f8')
+        self.desvio = np.asarray(desvio, dtype='f8')
+        self.pesos = np.asarray(pesos, dtype='f8')
+        self.metricas = metricas or {}
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_MODELO):
+        with open(caminho, "r") as f:
+            d = json.load(f)
+        return cls(d['features'], d['media'], d['desvio'], d['pesos'], d.get('metricas'))
+
+    def salvar(self, caminho=CAMINHO_MODELO):
+        with open(caminho, "w") as f:
+            json.dump({"features": self.features, "media": self.media.tolist(), "desvio": self.desvio.tolist(),
+                       "pesos": self.pesos.tolist(), "metricas": self.metricas}, f, indent=2)
+
+    def probabilidades(self, X):
+        z = (np.asarray(X, dtype='f8') - self.media) / self.desvio
+        return _sigmoide(self.pesos[0] + z @ self.pesos[1:])
+
+    def probabilidade(self, features_tecnicas):
+        x = np.array([float(features_tecnicas.get(f, np.nan)) for f in self.features])
+        x = np.where(np.isfinite(x), x, self.media)  # Feature ausente = valor médio do treino
+        return float(self.probabilidades(x[None, :])[0])
+
+
+def selecionar(candidatos, modelo, top_k=0, limiar=0.0):
+    """
+    candidatos: [(ticker, features)]. Retorna (enviados, descartados) ordenados pela
+    probabilidade, que também é gravada em features['probabilidade_modelo'].
+    """
+    for _, features in candidatos:
+        features['probabilidade_modelo'] = modelo.probabilidade(features)
+    ordenados = sorted(candidatos, key=lambda c: c[1]['probabilidade_modelo'], reverse=True)
+    enviados = [c for c in ordenados if c[1]['probabilidade_modelo'] >= limiar]
+    if top_k > 0:
+        enviados = enviados[:top_k]
+    escolhidos = {c[0] for c in enviados}
+    return enviados, [c for c in ordenados if c[0] not in escolhidos]
+
+
+# --- TREINO A PARTIR DO DATASET DE FEATURES ---
+def treinar(origem=None, l2=L2_PADRAO, so_aprovados=True):
+    """Treina com as barras rotuladas do dataset_features (por padrão, só as que passariam no screen)."""
+    from dataset_features import DIRETORIO_DATASET, FEATURES, carregar_dataset, matriz_features
+
+    colunas, meta = carregar_dataset(origem or DIRETORIO_DATASET)
+    filtro = np.asarray(colunas['encerrado']).copy()
+    if so_aprovados:
+        filtro &= np.asarray(colunas['aprovado'])
+    X = matriz_features(colunas, filtro).astype('f8')
+    y = np.asarray(colunas['ganho'])[filtro].astype('f8')
+    datas = np.asarray(colunas['data'])[filtro]
+    validas = np.isfinite(X).all(axis=1)
+    X, y, datas = X[validas], y[validas], datas[validas]
+    if len(X) < 100:
+        raise ValueError(f"Poucas barras rotuladas para treinar ({len(X)}).")
+
+    corte = np.quantile(datas, 1 - FRACAO_VALIDACAO)
+    treino, validacao = datas < corte, datas >= corte
+    media = X[treino].mean(axis=0)
+    desvio = X[treino].std(axis=0)
+    desvio[desvio == 0] = 1.0
+    pesos = treinar_logistica((X[treino] - media) / desvio, y[treino], l2)
+    modelo = ModeloRanking(FEATURES, media, desvio, pesos)
+
+    p_val = modelo.probabilidades(X[validacao])
+    y_val = y[validacao]
+    decil = p_val >= np.quantile(p_val, 0.9)
+    modelo.metricas = {
+        "treinado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "linhas_treino": int(treino.sum()),
+        "linhas_validacao": int(validacao.sum()),
+        "auc_validacao": auc(y_val, p_val),
+        "win_rate_base": float(y_val.mean()),
+        "win_rate_top10pct": float(y_val[decil].mean()),
+        "rotulo": meta.get("rotulo"),
+    }
+    return modelo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Modelo de ranking dos candidatos antes da IA")
+    parser.add_argument("--dataset", default=None, help="Diretório do dataset_features")
+    parser.add_argument("--saida", default=CAMINHO_MODELO)
+    parser.add_argument("--l2", type=float, default=L2_PADRAO)
+    parser.add_argument("--todas-barras", action="store_true", help="Treina também com barras reprovadas no screen")
+    args = parser.parse_args()
+
+    modelo = treinar(args.dataset, args.l2, so_aprovados=not args.todas_barras)
+    modelo.salvar(args.saida)
+    m = modelo.metricas
+    print(f"🧮 Treino {m['linhas_treino']} | validação {m['linhas_validacao']} barras")
+    print(f"AUC validação: {m['auc_validacao']:.3f} | win rate base {m['win_rate_base'] * 100:.1f}% "
+          f"-> top 10% {m['win_rate_top10pct'] * 100:.1f}%")
+    print(f"Modelo salvo em {args.saida}")
@@ -0,0 +1,123 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from ta.momentum import RSIIndicator
+from ta.trend import SMAIndicator, ADXIndicator
+
+# --- REGRAS DO SETUP (as mesmas do backtester.py) ---
+BARRA_INICIAL = 200   # Só opera depois de existir SMA200
+RSI_MIN = 35
+RSI_MAX = 55
+ADX_MIN = 20
+STOP_PCT = 0.96       # 4% de stop
+ALVO_R = 2.0          # Alvo 2x o risco
+DIAS_MAX = 15         # Time stop
+
+
+# --- INDICADORES (uma vez por ativo) ---
+def preparar_arrays(df):
+    """Converte o DF OHLCV em arrays float64 com os indicadores do setup."""
+    close, high, low = df['Close'], df['High'], df['Low']
+    adx = ADXIndicator(high, low, close, window=14)
+    return {
+        "datas": df.index.to_numpy(dtype='datetime64[ns]').astype('i8'),
+        "close": close.to_numpy(dtype='f8'),
+        "high": high.to_numpy(dtype='f8'),
+        "low": low.to_numpy(dtype='f8'),
+        "sma200": SMAIndicator(close, window=200).sma_indicator().to_numpy(dtype='f8'),
+        "sma50": SMAIndicator(close, window=50).sma_indicator().to_numpy(dtype='f8'),
+        "rsi": RSIIndicator(close, window=14).rsi().to_numpy(dtype='f8'),
+        "adx": adx.adx().to_numpy(dtype='f8'),
+    }
+
+
+# Campos do painel de indicadores (varredura): 'close' primeiro marca a presença da barra
+CAMPOS_MOTOR = ("close", "high", "low", "sma200", "sma50", "rsi", "adx")
+
+
+def painel_indicadores(painel_ohlcv, destino=None, minimo_barras=BARRA_INICIAL):
+    """
+    Painel float32 ativo x data x CAMPOS_MOTOR a partir do painel OHLCV,
+    um ativo por vez (só um DataFrame vivo). `destino` None = memória compartilhada.
+    """
+    from painel import Painel
+    faixas = {t: painel_ohlcv.faixa(t) for t in painel_ohlcv.tickers}
+    tickers = [t for t, (ini, fim) in faixas.items() if fim - ini > minimo_barras]
+    painel = Painel.criar(tickers, CAMPOS_MOTOR, painel_ohlcv.datas, destino)
+    for i, ticker in enumerate(tickers):
+        a = preparar_arrays(painel_ohlcv.para_df(ticker))
+        linhas = np.searchsorted(painel.datas, a['datas'])
+        for j, campo in enumerate(CAMPOS_MOTOR):
+            painel.valores[i, linhas, j] = a[campo]
+    return painel
+
+
+# --- KERNEL ---
+def sinais_entrada(a, rsi_min=RSI_MIN, rsi_max=RSI_MAX, adx_min=ADX_MIN):
+    """Vetor booleano: barra onde as 3 regras de entrada são verdadeiras."""
+    with np.errstate(invalid='ignore'):
+        tendencia = (a['close'] > a['sma200']) & (a['close'] > a['sma50'])
+        forca = a['adx'] > adx_min
+        pullback = (a['rsi'] < rsi_max) & (a['rsi'] > rsi_min)
+    return tendencia & forca & pullback
+
+
+def saidas_por_barra(close, high, low, stop_pct=STOP_PCT, alvo_r=ALVO_R, dias_max=DIAS_MAX):
+    """
+    Para CADA barra i, simula uma entrada no fechamento de i e devolve
+    (indice_saida, resultado_em_R). Saída >= len(close) = trade não encerrado.
+    Mesma precedência do loop original: stop, depois alvo, depois time stop.
+    """
+    n = len(close)
+    horizonte = dias_max + 1
+    stop = close * stop_pct
+    risco = close - stop
+    alvo = close + (risco * alvo_r)
+
+    # Linha i enxerga as barras i+1 .. i+horizonte (NaN depois do fim da série)
+    vazio = np.full(horizonte, np.nan)
+    low_fut = sliding_window_view(np.concatenate([low[1:], vazio]), horizonte)[:n]
+    high_fut = sliding_window_view(np.concatenate([high[1:], vazio]), horizonte)[:n]
+
+    with np.errstate(invalid='ignore'):
+        bate_stop = low_fut <= stop[:, None]
+        bate_alvo = high_fut >= alvo[:, None]
+    evento = bate_stop | bate_alvo
+    teve_evento = evento.any(axis=1)
+    passo = np.where(teve_evento, evento.argmax(axis=1), horizonte - 1)
+
+    linhas = np.arange(n)
+    saida = linhas + 1 + passo
+    foi_stop = bate_stop[linhas, passo]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fechamento_saida = close[np.minimum(saida, n - 1)]
+        res_tempo = (fechamento_saida - close) / risco
+    res = np.where(teve_evento, np.where(foi_stop, -1.0, alvo_r), res_tempo)
+    return saida, res
+
+
+def encadear_trades(sinais, saida, barra_inicial=BARRA_INICIAL):
+    """Percorre só os sinais: após cada saída, a próxima entrada é o 1º sinal seguinte."""
+    n = len(sinais)
+    candidatos = np.flatnonzero(sinais)
+    candidatos = candidatos[candidatos >= barra_inicial]
+
+    entradas = []
+    pos = 0
+    while pos < len(candidatos):
+        i = candidatos[pos]
+        fim = saida[i]
+        if fim >= n:
+            break  # Posição ainda aberta no fim dos dados (o loop original descarta)
+        entradas.append(i)
+        pos = np.searchsorted(candidatos, fim + 1)
+    return np.asarray(entradas, dtype=np.int64)
+
+
+def simular_ativo(a, rsi_min=RSI_MIN, rsi_max=RSI_MAX, adx_min=ADX_MIN,
+                  stop_pct=STOP_PCT, alvo_r=ALVO_R, dias_max=DIAS_MAX, barra_inicial=BARRA_INICIAL):
+    """Retorna (indices_entrada, indices_saida, res_em_R) de um ativo."""
+    sinais = sinais_entrada(a, rsi_min, rsi_max, adx_min)
+    saida, res = saidas_por_barra(a['close'], a['high'], a['low'], stop_pct, alvo_r, dias_max)
+    entradas = encadear_trades(sinais, saida, barra_inicial)
+    return entradas, saida[entradas], res[entradas]
@@ -0,0 +1,375 @@
+import io
+import os
+import time
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+import cassete
+from limitador import LimitadorTaxa, eh_rate_limit
+from metricas import Metricas, metricas
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_ENV = os.path.join(DIRETORIO_BASE, '.env')
+CAMINHO_FILA = os.getenv("NOTIFICADOR_ARQUIVO", os.path.join(DIRETORIO_BASE, 'fila_telegram.sqlite'))
+
+load_dotenv(CAMINHO_ENV)
+
+# --- CONFIGURAÇÃO ---
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+TELEGRAM_RPM_CHAT = float(os.getenv("TELEGRAM_RPM_CHAT", "20"))   # Limite do Telegram para grupos
+TELEGRAM_DIGEST = os.getenv("TELEGRAM_DIGEST", "0") == "1"      # Um resumo por rodada em vez de um alerta por sinal
+MAX_TENTATIVAS = 8
+ESPERA_BASE_SEG = 5.0          # Dobra a cada falha
+ESPERA_MAX_SEG = 15 * 60
+ENVIANDO_EXPIRA_SEG = 10 * 60  # Processo que morreu no meio do envio: a mensagem volta para a fila
+RETENCAO_DIAS = float(os.getenv("NOTIFICADOR_RETENCAO_DIAS", "7"))   # Enviadas/falhas ficam só para consulta
+MANUTENCAO_SEG = 3600          # Serviço residente: recuperação + limpeza de hora em hora
+LIMITE_TEXTO = 4096            # Tamanho máximo de uma mensagem do Telegram
+SEPARADOR_DIGEST = "\n━━━━━━━━━━\n"
+
+# --- NOTIFICADOR EM SEGUNDO PLANO ---
+# O robô e o auditor só gravam a mensagem numa fila em SQLite e seguem; uma
+# thread entrega em ordem, respeitando o limite por chat, com backoff
+# exponencial nas falhas (e o retry_after do Telegram nos 429). A fila
+# sobrevive a quedas: o que não saiu é entregue na próxima execução. No modo
+# digest os alertas de uma rodada ficam retidos e saem numa mensagem só.
+# Métricas: o custo de enfileirar entra no estágio "telegram" da execução que
+# enviou; a entrega (chamada à API e tempo na fila) tem registro próprio, com
+# execucao "telegram", gravado quando a fila fica ociosa e no aguardar().
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS mensagens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat TEXT NOT NULL,
+    tipo TEXT NOT NULL,            -- mensagem | documento
+    texto TEXT,
+    parse_mode TEXT,
+    arquivo BLOB,
+    nome_arquivo TEXT,
+    estado TEXT NOT NULL,          -- retida | pendente | enviando | enviada | falhou
+    lote TEXT,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_em REAL NOT NULL,
+    criado_em REAL NOT NULL,
+    erro TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_mensagens_fila ON mensagens (estado, proxima_em);
+"""
+
+
+def _processo_vivo(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class Notificador:
+    def __init__(self, caminho=CAMINHO_FILA, token=TELEGRAM_TOKEN):
+        self.caminho = caminho
+        self.token = token
+        self._bot = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self._lote = None
+        self._limitadores = {}
+        self.metricas = Metricas()
+        self.metricas.iniciar("telegram")
+        self._lock_registro = threading.Lock()
+        self._atividade = False
+
+    # --- FILA ---
+    def _conexao(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+            self._conn = sqlite3.connect(self.caminho, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(ESQUEMA)
+            self._conn.commit()
+        return self._conn
+
+    def _inserir(self, chat, tipo, texto, parse_mode=None, arquivo=None, nome_arquivo=None,
+                 estado="pendente", lote=None):
+        agora = time.time()
+        with metricas.cronometro("telegram"), self._lock:
+            conn = self._conexao()
+            conn.execute("INSERT INTO mensagens (chat, tipo, texto, parse_mode, arquivo, nome_arquivo, estado, lote, "
+                         "proxima_em, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (str(chat), tipo, texto, parse_mode, arquivo, nome_arquivo, estado, lote, agora, agora))
+            conn.commit()
+
+    def enviar_mensagem(self, chat, texto, parse_mode=None, agrupar=False):
+        """Enfileira e volta na hora. `agrupar`: dentro de um digest() vai no resumo da rodada."""
+        if not self.token or not chat:
+            return
+        if agrupar and self._lote is not None:
+            self._inserir(chat, "mensagem", texto, parse_mode, estado="retida", lote=self._lote)
+            return
+        self._inserir(chat, "mensagem", texto, parse_mode)
+        self.iniciar()
+
+    def enviar_documento(self, chat, caminho, legenda=None, parse_mode=None):
+        """O conteúdo é copiado para a fila: o arquivo pode ser regravado antes do envio."""
+        if not self.token or not chat:
+            return
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+        self._inserir(chat, "documento", legenda, parse_mode, conteudo, os.path.basename(caminho))
+        self.iniciar()
+
+    # --- DIGEST ---
+    @contextmanager
+    def digest(self, titulo, ativo=None):
+        """Alertas com agrupar=True dentro do bloco saem numa mensagem só ao final."""
+        if not (TELEGRAM_DIGEST if ativo is None else ativo):
+            yield
+            return
+        self._lote = f"{titulo}|{os.getpid()}|{datetime.now():%Y-%m-%d %H:%M:%S}"
+        try:
+            yield
+        finally:
+            lote, self._lote = self._lote, None
+            self._fechar_lote(lote)
+
+    def _fechar_lote(self, lote):
+        with self._lock:
+            conn = self._conexao()
+            linhas = conn.execute("SELECT id, chat, texto, parse_mode FROM mensagens WHERE estado = 'retida' "
+                                  "AND lote = ? ORDER BY id", (lote,)).fetchall()
+            conn.execute("DELETE FROM mensagens WHERE estado = 'retida' AND lote = ?", (lote,))
+            conn.commit()
+        titulo = lote.split("|")[0]
+        por_chat = {}
+        for _, chat, texto, parse_mode in linhas:
+            por_chat.setdefault((chat, parse_mode), []).append(texto.strip())
+        for (chat, parse_mode), textos in por_chat.items():
+            # Respeita o limite de tamanho: o resumo pode virar mais de uma mensagem
+            partes, atual = [], f"{titulo} ({len(textos)})"
+            for texto in textos:
+                if len(atual) + len(SEPARADOR_DIGEST) + len(texto) > LIMITE_TEXTO:
+                    partes.append(atual)
+                    atual = texto
+                else:
+                    atual += SEPARADOR_DIGEST + texto
+            partes.append(atual)
+            for parte in partes:
+                self._inserir(chat, "mensagem", parte, parse_mode)
+        if linhas:
+            self.iniciar()
+
+    def _recuperar(self):
+        """Digests interrompidos por uma queda, envios que ficaram pela metade e limpeza do histórico."""
+        with self._lock:
+            conn = self._conexao()
+            conn.execute("UPDATE mensagens SET estado = 'pendente' WHERE estado = 'enviando' AND proxima_em < ?",
+                         (time.time() - ENVIANDO_EXPIRA_SEG,))
+            # proxima_em das enviadas/falhas = última tentativa
+            conn.execute("DELETE FROM mensagens WHERE estado IN ('enviada', 'falhou') AND proxima_em < ?",
+                         (time.time() - RETENCAO_DIAS * 86400,))
+            conn.commit()
+            lotes = [l for (l,) in conn.execute("SELECT DISTINCT lote FROM mensagens WHERE estado = 'retida'")]
+        for lote in lotes:
+            if lote != self._lote and not _processo_vivo(int(lote.split("|")[1])):
+                self._fechar_lote(lote)
+
+    # --- ENTREGA ---
+    def _obter_bot(self):
+        if self._bot is None:
+            import telebot
+            self._bot = telebot.TeleBot(self.token)
+        return self._bot
+
+    def _limitador(self, chat):
+        if chat not in self._limitadores:
+            self._limitadores[chat] = LimitadorTaxa(TELEGRAM_RPM_CHAT, 1e12)   # Sem limite de tokens
+        return self._limitadores[chat]
+
+    def _reservar(self):
+        """Próxima mensagem vencida da fila, marcada como 'enviando' (outro processo não pega a mesma)."""
+        agora = time.time()
+        with self._lock:
+            conn = self._conexao()
+            linha = conn.execute("SELECT id, chat, tipo, texto, parse_mode, arquivo, nome_arquivo, tentativas, criado_em "
+                                 "FROM mensagens WHERE estado = 'pendente' AND proxima_em <= ? "
+                                 "ORDER BY proxima_em, id LIMIT 1", (agora,)).fetchone()
+            if linha is None:
+                proxima = conn.execute("SELECT MIN(proxima_em) FROM mensagens WHERE estado = 'pendente'").fetchone()[0]
+                return None, proxima
+            alterou = conn.execute("UPDATE mensagens SET estado = 'enviando', proxima_em = ? "
+                                   "WHERE id = ? AND estado = 'pendente'", (agora, linha[0])).rowcount
+            conn.commit()
+        return (linha if alterou else None), agora
+
+    def _marcar(self, id_mensagem, estado, tentativas=None, proxima_em=None, erro=None, texto_puro=False):
+        campos, valores = ["estado = ?"], [estado]
+        if tentativas is not None:
+            campos.append("tentativas = ?")
+            valores.append(tentativas)
+        if proxima_em is not None:
+            campos.append("proxima_em = ?")
+            valores.append(proxima_em)
+        if erro is not None:
+            campos.append("erro = ?")
+            valores.append(erro)
+        if texto_puro:
+            campos.append("parse_mode = NULL")
+        # Enviada: o conteúdo (documentos) não precisa mais ficar no disco
+        if estado == "enviada":
+            campos.append("arquivo = NULL")
+        with self._lock:
+            conn = self._conexao()
+            conn.execute(f"UPDATE mensagens SET {', '.join(campos)} WHERE id = ?", (*valores, id_mensagem))
+            conn.commit()
+
+    def _entregar(self, chat, tipo, texto, parse_mode, arquivo, nome_arquivo):
+        bot = self._obter_bot()
+        with self.metricas.cronometro("entrega", chat):
+            if tipo == "documento":
+                documento = io.BytesIO(arquivo)
+                documento.name = nome_arquivo
+                return cassete.chamar("telegram", [chat, "documento"],
+                                      lambda: bot.send_document(chat, documento, caption=texto, parse_mode=parse_mode))
+            return cassete.chamar("telegram", [chat, "mensagem"],
+                                  lambda: bot.send_message(chat, texto, parse_mode=parse_mode))
+
+    def _processar(self, linha):
+        id_mensagem, chat, tipo, texto, parse_mode, arquivo, nome_arquivo, tentativas, criado_em = linha
+        self._atividade = True
+        limitador = self._limitador(chat)
+        limitador.adquirir()
+        try:
+            self._entregar(chat, tipo, texto, parse_mode, arquivo, nome_arquivo)
+        except Exception as e:
+            tentativas += 1
+            codigo = getattr(e, "error_code", None)
+            if eh_rate_limit(e) or codigo == 429:
+                # O Telegram diz quanto esperar; vale para o chat inteiro
+                espera = float((getattr(e, "result_json", None) or {}).get("parameters", {}).get("retry_after", 30))
+                limitador.pausar(espera)
+                self.metricas.contar("retentativas.telegram")
+                self._marcar(id_mensagem, "pendente", tentativas - 1, time.time() + espera, str(e))
+                return
+            if codigo == 400 and parse_mode and "parse" in str(e).lower():
+                # Markdown quebrado (ex.: '_' num motivo da IA): reenvia como texto puro
+                self._marcar(id_mensagem, "pendente", tentativas, time.time(), str(e), texto_puro=True)
+                return
+            if codigo in (400, 401, 403, 404) or tentativas >= MAX_TENTATIVAS:
+                self.metricas.contar("erros.telegram")
+                print(f"❌ Telegram desistiu da mensagem {id_mensagem} ({tentativas} tentativa(s)): {e}")
+                self._marcar(id_mensagem, "falhou", tentativas, erro=str(e))
+                return
+            espera = min(ESPERA_MAX_SEG, ESPERA_BASE_SEG * 2 ** (tentativas - 1)) * random.uniform(0.8, 1.2)
+            self.metricas.contar("retentativas.telegram")
+            self._marcar(id_mensagem, "pendente", tentativas, time.time() + espera, str(e))
+            return
+        self.metricas.contar("telegram.enviadas")
+        # Tempo na fila: do enfileiramento até a entrega (retentativas e pausas incluídas)
+        self.metricas.registrar("fila", time.time() - criado_em, id_mensagem)
+        self._marcar(id_mensagem, "enviada", tentativas)
+
+    def registrar_entregas(self):
+        """Grava o registro de entrega acumulado (se houve envio) e começa outro."""
+        with self._lock_registro:
+            if not self._atividade:
+                return None
+            self._atividade = False
+            registro = self.metricas.finalizar(imprimir=False, pendentes=self.pendentes())
+            self.metricas.iniciar("telegram")
+        return registro
+
+    def _laco(self):
+        manutencao = 0.0
+        while not self._parar.is_set():
+            linha = None
+            try:
+                if time.monotonic() >= manutencao:
+                    self._recuperar()
+                    manutencao = time.monotonic() + MANUTENCAO_SEG
+                linha, proxima = self._reservar()
+                if linha is not None:
+                    self._processar(linha)
+                    continue
+                self.registrar_entregas()
+            except Exception as e:
+                # Erro inesperado (ex.: sqlite3.Error no _marcar) não pode matar a thread
+                self.metricas.contar("erros.notificador")
+                print(f"⚠️ Fila do Telegram: {type(e).__name__}: {e}")
+                if linha is not None:
+                    try:
+                        self._marcar(linha[0], "pendente", proxima_em=time.time() + ESPERA_BASE_SEG, erro=str(e))
+                    except sqlite3.Error:
+                        pass   # Fica em 'enviando' e o _recuperar devolve depois de ENVIANDO_EXPIRA_SEG
+                proxima = time.time() + ESPERA_BASE_SEG
+            espera = 60.0 if proxima is None else min(60.0, max(0.05, proxima - time.time()))
+            self._acordar.wait(espera)
+            self._acordar.clear()
+
+    def iniciar(self):
+        """Sobe a thread de entrega (uma por processo). Depois de criar pools com fork."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._parar.clear()
+                self._thread = threading.Thread(target=self._laco, name="notificador", daemon=True)
+                self._thread.start()
+        self._acordar.set()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def pendentes(self):
+        with self._lock:
+            return self._conexao().execute(
+                "SELECT COUNT(*) FROM mensagens WHERE estado IN ('pendente', 'enviando', 'retida')").fetchone()[0]
+
+    def aguardar(self, timeout=30.0):
+        """
+        Fim de um script avulso: dá até `timeout` s para a fila esvaziar (o que
+        sobrar continua no disco para a próxima execução). Retorna os pendentes.
+        """
+        if not self.token:
+            return 0
+        restantes = self.pendentes()
+        if restantes:
+            self.iniciar()
+        limite = time.monotonic() + timeout
+        while restantes and time.monotonic() < limite:
+            time.sleep(0.2)
+            restantes = self.pendentes()
+        self.registrar_entregas()
+        if restantes:
+            print(f"📨 {restantes} mensagem(ns) do Telegram ficam na fila para a próxima execução.")
+        return restantes
+
+    def resumo(self):
+        with self._lock:
+            contagem = dict(self._conexao().execute("SELECT estado, COUNT(*) FROM mensagens GROUP BY estado"))
+        return " | ".join(f"{estado}: {n}" for estado, n in sorted(contagem.items())) or "fila vazia"
+
+
+# Instância compartilhada pelo processo
+notificador = Notificador()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Fila de entrega do Telegram")
+    parser.add_argument("--entregar", action="store_true", help="Entrega o que estiver pendente e sai")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    print(f"📨 {notificador.resumo()}")
+    if args.entregar:
+        notificador.aguardar(args.timeout)
+        print(f"📨 {notificador.resumo()}")
@@ -0,0 +1,208 @@
+import os
+import json
+import uuid
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from dados_mercado import COLUNAS, carregar_varios
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_PAINEL = os.path.join(DIRETORIO_BASE, 'painel')
+
+# --- PAINEL ATIVO x DATA x CAMPO ---
+# Um único bloco float32 contíguo (NaN = ativo sem barra na data) e um índice
+# de datas int64 (ns). Fica em memória compartilhada ou num .npy mapeado:
+# os workers recebem só um descritor pequeno e enxergam os mesmos bytes.
+DTYPE_VALORES = np.float32
+ALINHAMENTO = 64
+LOTE_CACHE = 50
+
+
+class Painel:
+    def __init__(self, tickers, campos, datas, valores, shm=None, descritor=None):
+        self.tickers = list(tickers)
+        self.campos = list(campos)
+        self.datas = datas          # int64 ns, ordenado
+        self.valores = valores      # [ativo, data, campo] float32
+        self._shm = shm
+        self._descritor = descritor
+        self._posicao = {t: i for i, t in enumerate(self.tickers)}
+        # Presença da barra é decidida pelo fechamento (Open/Volume podem vir NaN)
+        fechamento = [i for i, c in enumerate(self.campos) if c.lower() == "close"]
+        self._presenca = fechamento[0] if fechamento else 0
+        self._usos = 0
+        self._trava = threading.Lock()
+
+    # --- CRIAÇÃO ---
+    @classmethod
+    def criar(cls, tickers, campos, datas, destino=None):
+        """
+        Aloca o painel preenchido com NaN. `destino` None = memória compartilhada;
+        caminho = arquivo .npy mapeado (persiste e pode ser aberto por outro processo).
+        """
+        datas = np.asarray(datas, dtype='i8')
+        forma = (len(tickers), len(datas), len(campos))
+        if destino is None:
+            offset = -(-datas.nbytes // ALINHAMENTO) * ALINHAMENTO
+            tamanho = offset + int(np.prod(forma)) * np.dtype(DTYPE_VALORES).itemsize
+            shm = shared_memory.SharedMemory(create=True, size=max(tamanho, 1),
+                                             name=f"painel_{os.getpid()}_{uuid.uuid4().hex[:8]}")
+            indice = np.ndarray(datas.shape, dtype='i8', buffer=shm.buf)
+            indice[:] = datas
+            valores = np.ndarray(forma, dtype=DTYPE_VALORES, buffer=shm.buf, offset=offset)
+            descritor = {"tipo": "shm", "nome": shm.name, "tickers": list(tickers),
+                         "campos": list(campos), "n_datas": len(datas), "offset": offset}
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+            valores = np.lib.format.open_memmap(destino, mode='w+', dtype=DTYPE_VALORES, shape=forma)
+            np.save(destino + ".datas.npy", datas)
+            with open(destino + ".json", "w") as f:
+                json.dump({"tickers": list(tickers), "campos": list(campos)}, f)
+            indice, shm = np.load(destino + ".datas.npy", mmap_mode='r'), None
+            descritor = {"tipo": "arquivo", "caminho": os.path.abspath(destino)}
+        valores[...] = np.nan
+        return cls(tickers, campos, indice, valores, shm, descritor)
+
+    @classmethod
+    def anexar(cls, descritor):
+        """Abre um painel existente sem copiar (no worker, a partir do descritor)."""
+        if descritor["tipo"] == "shm":
+            shm = shared_memory.SharedMemory(name=descritor["nome"])
+            n_datas = descritor["n_datas"]
+            forma = (len(descritor["tickers"]), n_datas, len(descritor["campos"]))
+            datas = np.ndarray((n_datas,), dtype='i8', buffer=shm.buf)
+            valores = np.ndarray(forma, dtype=DTYPE_VALORES, buffer=shm.buf, offset=descritor["offset"])
+            return cls(descritor["tickers"], descritor["campos"], datas, valores, shm, descritor)
+        caminho = descritor["caminho"]
+        with open(caminho + ".json", "r") as f:
+            meta = json.load(f)
+        return cls(meta["tickers"], meta["campos"], np.load(caminho + ".datas.npy", mmap_mode='r'),
+                   np.load(caminho, mmap_mode='r'), descritor=descritor)
+
+    @classmethod
+    def de_dataframes(cls, dfs, campos=COLUNAS, destino=None):
+        """Painel com a união das datas de {ticker: DataFrame OHLCV}."""
+        dfs = {t: df for t, df in dfs.items() if not df.empty}
+        datas = _uniao_datas(_datas_df(df) for df in dfs.values())
+        painel = cls.criar(list(dfs), campos, datas, destino)
+        for i, df in enumerate(dfs.values()):
+            linhas = np.searchsorted(datas, _datas_df(df))
+            painel.valores[i, linhas, :] = df[list(campos)].to_numpy(dtype=DTYPE_VALORES)
+        return painel
+
+    @classmethod
+    def de_arrays(cls, arrays, campos, destino=None):
+        """Painel a partir de {ticker: {'datas': i8, campo: array}} (ex.: preparar_arrays)."""
+        datas = _uniao_datas(a['datas'] for a in arrays.values())
+        painel = cls.criar(list(arrays), campos, datas, destino)
+        for i, a in enumerate(arrays.values()):
+            linhas = np.searchsorted(datas, a['datas'])
+            for j, campo in enumerate(campos):
+                painel.valores[i, linhas, j] = a[campo]
+        return painel
+
+    # --- ACESSO ---
+    @property
+    def descritor(self):
+        return self._descritor
+
+    def __contains__(self, ticker):
+        return ticker in self._posicao
+
+    def faixa(self, ticker):
+        """(início, fim) das barras do ativo (fim exclusivo); (0, 0) se não tem nenhuma."""
+        presentes = np.flatnonzero(~np.isnan(self.valores[self._posicao[ticker], :, self._presenca]))
+        return (int(presentes[0]), int(presentes[-1]) + 1) if len(presentes) else (0, 0)
+
+    def arrays(self, ticker):
+        """
+        {'datas', campo: array} do ativo, como views sobre o painel (sem cópia).
+        Só copia se o ativo tiver buracos no meio (dias sem negociação).
+        """
+        inicio, fim = self.faixa(ticker)
+        bloco = self.valores[self._posicao[ticker], inicio:fim]
+        datas = self.datas[inicio:fim]
+        presentes = ~np.isnan(bloco[:, self._presenca])
+        if not presentes.all():
+            bloco, datas = bloco[presentes], datas[presentes]
+        resultado = {campo: bloco[:, j] for j, campo in enumerate(self.campos)}
+        resultado['datas'] = datas
+        return resultado
+
+    def para_df(self, ticker):
+        """DataFrame float64 do ativo (cópia) para quem precisa de pandas/ta."""
+        a = self.arrays(ticker)
+        return pd.DataFrame({c: a[c].astype('f8') for c in self.campos},
+                            index=pd.DatetimeIndex(np.asarray(a['datas']).astype('datetime64[ns]'), name="Date"))
+
+    # --- CICLO DE VIDA ---
+    def fechar(self):
+        """Solta a referência deste processo (o painel continua existindo para os outros)."""
+        self.valores = self.datas = None
+        if self._shm is not None:
+            self._shm.close()
+
+    def reservar(self, usos):
+        """O painel será liberado depois de `usos` chamadas a devolver()."""
+        with self._trava:
+            self._usos += usos
+
+    def devolver(self):
+        with self._trava:
+            self._usos -= 1
+            ultimo = self._usos == 0
+        if ultimo:
+            self.liberar()
+
+    def liberar(self):
+        """Dono do painel: fecha e apaga o bloco compartilhado/arquivos."""
+        shm, descritor = self._shm, self._descritor
+        self.fechar()
+        if shm is not None:
+            shm.unlink()
+        elif descritor is not None:
+            for sufixo in ("", ".datas.npy", ".json"):
+                if os.path.exists(descritor["caminho"] + sufixo):
+                    os.remove(descritor["caminho"] + sufixo)
+
+
+def _datas_df(df):
+    return df.index.as_unit('ns').asi8
+
+
+def _uniao_datas(partes):
+    partes = [np.asarray(p, dtype='i8') for p in partes]
+    return np.unique(np.concatenate(partes)) if partes else np.zeros(0, dtype='i8')
+
+
+def montar_do_cache(tickers, destino=None, inicio=None, periodo=None, lote=LOTE_CACHE):
+    """
+    Painel OHLCV direto do cache local, em lotes: nunca há mais que `lote`
+    DataFrames vivos, então a memória fica plana com o universo inteiro.
+    1ª passada atualiza o cache e junta as datas; 2ª preenche o arquivo.
+    """
+    lotes = [tickers[i:i + lote] for i in range(0, len(tickers), lote)]
+    datas, validos = [], []
+    for parte in lotes:
+        for ticker, df in carregar_varios(parte, inicio=inicio, periodo=periodo).items():
+            if not df.empty:
+                datas.append(_datas_df(df))
+                validos.append(ticker)
+    datas = _uniao_datas(datas)
+
+    painel = Painel.criar(validos, COLUNAS, datas, destino)
+    posicao = {t: i for i, t in enumerate(validos)}
+    for parte in lotes:
+        parte = [t for t in parte if t in posicao]
+        # Cache recém-atualizado: a 2ª leitura vem do disco (mmap), sem rede
+        for ticker, df in carregar_varios(parte, inicio=inicio, periodo=periodo).items():
+            df = df[np.isin(_datas_df(df), datas)]  # Barra que surgiu entre as passadas fica de fora
+            linhas = np.searchsorted(datas, _datas_df(df))
+            painel.valores[posicao[ticker], linhas, :] = df[COLUNAS].to_numpy(dtype=DTYPE_VALORES)
+    if isinstance(painel.valores, np.memmap):
+        painel.valores.flush()
+    return painel
@@ -0,0 +1,95 @@
+import queue
+import threading
+
+# --- PIPELINE DE ESTÁGIOS COM FILAS LIMITADAS ---
+# Cada estágio tem N threads que consomem a fila de entrada e publicam na de saída.
+# Filas com maxsize dão backpressure: um estágio rápido espera o lento em vez de
+# acumular tudo em memória. O fim do fluxo é sinalizado com FIM.
+
+FIM = object()
+
+
+def nova_fila(tamanho):
+    return queue.Queue(maxsize=tamanho)
+
+
+def alimentar(itens, saida):
+    """Thread produtora: publica os itens e depois FIM."""
+    def _rodar():
+        for item in itens:
+            saida.put(item)
+        saida.put(FIM)
+    thread = threading.Thread(target=_rodar, name="pipeline-fonte", daemon=True)
+    thread.start()
+    return thread
+
+
+def estagio(nome, funcao, entrada, saida, workers=1):
+    """
+    Inicia `workers` threads aplicando `funcao(item)`, que devolve uma lista
+    (vazia = item filtrado) de itens para a fila `saida`. Erros são impressos e
+    o item é descartado. Quando a última thread termina, publica FIM em `saida`.
+    """
+    restantes = [workers]
+    trava = threading.Lock()
+
+    def _rodar():
+        while True:
+            item = entrada.get()
+            if item is FIM:
+                entrada.put(FIM)  # Repassa para as outras threads do estágio
+                break
+            try:
+                for resultado in funcao(item) or ():
+                    saida.put(resultado)
+            except Exception as e:
+                print(f"Erro no estágio {nome}: {e}")
+        with trava:
+            restantes[0] -= 1
+            if restantes[0] == 0:
+                saida.put(FIM)
+
+    threads = [threading.Thread(target=_rodar, name=f"pipeline-{nome}-{i}", daemon=True)
+               for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def barreira(nome, funcao, entrada, saida):
+    """
+    Estágio que precisa ver tudo antes de decidir (ex.: top-K): junta os itens
+    até FIM, chama `funcao(lista)` uma vez e publica o resultado seguido de FIM.
+    """
+    def _rodar():
+        itens = []
+        while True:
+            item = entrada.get()
+            if item is FIM:
+                break
+            itens.append(item)
+        try:
+            resultados = funcao(itens) or ()
+        except Exception as e:
+            print(f"Erro no estágio {nome}: {e}. Seguindo sem ele.")
+            resultados = itens
+        for resultado in resultados:
+            saida.put(resultado)
+        saida.put(FIM)
+
+    thread = threading.Thread(target=_rodar, name=f"pipeline-{nome}", daemon=True)
+    thread.start()
+    return thread
+
+
+def drenar(entrada, primeiro):
+    """Junta ao `primeiro` tudo que já está pronto na fila (sem bloquear). Retorna (lote, acabou)."""
+    lote = [primeiro]
+    while True:
+        try:
+            item = entrada.get_nowait()
+        except queue.Empty:
+            return lote, False
+        if item is FIM:
+            return lote, True
+        lote.append(item)
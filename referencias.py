@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import requests
+
+import cassete
+from metricas import metricas
+from dados_mercado import carregar_varios
+
+# --- INFRAESTRUTURA BLINDADA ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_REFERENCIAS = os.path.join(DIRETORIO_BASE, 'cache_referencias')
+
+# --- CONFIGURAÇÃO ---
+URL_SGS = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{serie}/dados"
+SERIE_CDI = 11                 # CDI diário (% ao dia) no SGS do Banco Central
+TICKER_IBOV = "^BVSP"
+INICIO_PADRAO = "2015-01-01"   # Cobre todo o histórico de trades
+VALIDADE_CDI_H = float(os.getenv("CDI_VALIDADE_H", "6"))   # O BCB publica uma vez por dia
+JANELA_SGS_DIAS = 3650         # O SGS recusa consultas diárias acima de 10 anos
+DTYPE_CDI = np.dtype([('data', '<i8'), ('taxa', '<f8')])
+
+# --- SÉRIES DE REFERÊNCIA ---
+# CDI e IBOV ficam guardados localmente e só as observações novas são
+# buscadas (CDI num .npy próprio; IBOV no cache OHLCV do dados_mercado).
+# Cada série vira um vetor de níveis acumulados (produto prefixado dos fatores
+# diários do CDI; fechamento do IBOV), então o retorno entre duas datas
+# quaisquer é nível(fim) / nível(início) - 1: duas buscas binárias, e o
+# mesmo cálculo vale vetorizado para milhares de trades de uma vez.
+
+
+def _para_ns(datas):
+    """Data(s) (str, Timestamp, datetime64) -> int64 ns à meia-noite."""
+    indice = pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(datas)))
+    if indice.tz is not None:
+        indice = indice.tz_localize(None)
+    return indice.normalize().as_unit('ns').asi8
+
+
+class SerieReferencia:
+    def __init__(self, nome, datas, niveis):
+        self.nome = nome
+        self.datas = np.asarray(datas, dtype='i8')   # ns, ordenado
+        self.niveis = np.asarray(niveis, dtype='f8')  # Nível no fechamento de cada data
+
+    def __len__(self):
+        return len(self.datas)
+
+    def nivel(self, datas):
+        """Nível no fechamento da data (ou do último pregão antes dela); NaN antes da série."""
+        pos = np.searchsorted(self.datas, _para_ns(datas), side='right') - 1
+        return np.where(pos >= 0, self.niveis[np.clip(pos, 0, None)], np.nan)
+
+    def cobre(self, datas):
+        """True onde a série já tem observação na data (ou depois dela)."""
+        if len(self.datas) == 0:
+            return np.zeros(len(np.atleast_1d(datas)), dtype=bool)
+        return _para_ns(datas) <= self.datas[-1]
+
+    def retorno(self, inicio, fim):
+        """Retorno (%) entre fechamentos; escalar ou vetor. NaN sem dados."""
+        if len(self.datas) == 0:
+            resultado = np.full(np.broadcast(np.atleast_1d(inicio), np.atleast_1d(fim)).shape, np.nan)
+        else:
+            resultado = (self.nivel(fim) / self.nivel(inicio) - 1) * 100
+        return float(resultado[0]) if np.ndim(inicio) == 0 and np.ndim(fim) == 0 else resultado
+
+
+# --- CDI (SGS 11) ---
+def _caminhos_cdi():
+    return os.path.join(DIRETORIO_REFERENCIAS, "cdi.npy"), os.path.join(DIRETORIO_REFERENCIAS, "cdi.json")
+
+
+def _ler_cdi():
+    caminho, caminho_meta = _caminhos_cdi()
+    if not (os.path.exists(caminho) and os.path.exists(caminho_meta)):
+        return np.zeros(0, dtype=DTYPE_CDI), {}
+    try:
+        with open(caminho_meta, "r") as f:
+            return np.load(caminho), json.load(f)
+    except Exception:
+        return np.zeros(0, dtype=DTYPE_CDI), {}
+
+
+def _gravar_cdi(registros, meta):
+    caminho, caminho_meta = _caminhos_cdi()
+    os.makedirs(DIRETORIO_REFERENCIAS, exist_ok=True)
+    sufixo = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(caminho + sufixo, "wb") as f:
+        np.save(f, registros)
+    with open(caminho_meta + sufixo, "w") as f:
+        json.dump(meta, f)
+    os.replace(caminho + sufixo, caminho)
+    os.replace(caminho_meta + sufixo, caminho_meta)
+
+
+def _baixar_sgs(serie, inicio, fim):
+    """Observações do SGS entre as datas, em janelas de até 10 anos -> array DTYPE_CDI."""
+    partes = []
+    while inicio <= fim:
+        fim_janela = min(fim, inicio + timedelta(days=JANELA_SGS_DIAS))
+        params = {"formato": "json", "dataInicial": inicio.strftime("%d/%m/%Y"),
+                  "dataFinal": fim_janela.strftime("%d/%m/%Y")}
+
+        def _baixar():
+            resposta = requests.get(URL_SGS.format(serie=serie), params=params, timeout=30)
+            # Sem observações no intervalo o SGS responde 404
+            if resposta.status_code == 404:
+                return []
+            resposta.raise_for_status()
+            return resposta.json()
+
+        metricas.contar("requests.bcb")
+        dados = cassete.chamar("bcb", ["sgs", serie], _baixar)
+        if dados:
+            bloco = np.zeros(len(dados), dtype=DTYPE_CDI)
+            bloco['data'] = _para_ns([datetime.strptime(d['data'], "%d/%m/%Y") for d in dados])
+            bloco['taxa'] = [float(d['valor']) for d in dados]
+            partes.append(bloco)
+        inicio = fim_janela + timedelta(days=1)
+    return np.concatenate(partes) if partes else np.zeros(0, dtype=DTYPE_CDI)
+
+
+def atualizar_cdi(inicio=INICIO_PADRAO, forcar=False):
+    """
+    Anexa ao arquivo local só as taxas posteriores à última guardada.
+    Falha no BCB: mantém o que já está no disco (avisa, não inventa taxa).
+    """
+    registros, meta = _ler_cdi()
+    hoje = datetime.now()
+    cobre_inicio = len(registros) > 0 and meta.get('inicio_coberto', "9999") <= inicio
+    if cobre_inicio and not forcar and (time.time() - meta.get('atualizado_em', 0)) / 3600 < VALIDADE_CDI_H:
+        return registros
+
+    if cobre_inicio:
+        desde = pd.Timestamp(int(registros['data'][-1])).to_pydatetime() + timedelta(days=1)
+    else:
+        registros, desde = np.zeros(0, dtype=DTYPE_CDI), datetime.strptime(inicio, "%Y-%m-%d")
+    try:
+        novos = _baixar_sgs(SERIE_CDI, desde, hoje)
+    except Exception as e:
+        metricas.contar("erros.bcb")
+        print(f"⚠️ CDI: BCB indisponível ({e}); usando {len(registros)} taxas em disco")
+        return registros
+
+    if len(registros) and len(novos):
+        novos = novos[novos['data'] > registros['data'][-1]]
+    registros = np.concatenate([registros, novos])
+    _gravar_cdi(registros, {"inicio_coberto": meta.get('inicio_coberto', inicio) if cobre_inicio else inicio,
+                            "atualizado_em": time.time()})
+    return registros
+
+
+def serie_cdi(inicio=INICIO_PADRAO, atualizar=True):
+    registros = atualizar_cdi(inicio) if atualizar else _ler_cdi()[0]
+    # Nível no fechamento do dia d = produto dos fatores diários até d
+    return SerieReferencia("cdi", registros['data'], np.cumprod(1 + registros['taxa'] / 100))
+
+
+# --- IBOV ---
+def serie_ibov(inicio=INICIO_PADRAO):
+    """Fechamentos do ^BVSP pelo cache OHLCV (download incremental do dados_mercado)."""
+    df = carregar_varios([TICKER_IBOV], inicio=inicio).get(TICKER_IBOV)
+    if df is None or df.empty:
+        metricas.contar("erros.ibov")
+        return SerieReferencia("ibov", [], [])
+    return SerieReferencia("ibov", _para_ns(df.index), df['Close'].to_numpy(dtype='f8'))
+
+
+def carregar_referencias(inicio=INICIO_PADRAO):
+    """{'cdi': SerieReferencia, 'ibov': SerieReferencia} atualizadas."""
+    return {"cdi": serie_cdi(inicio), "ibov": serie_ibov(inicio)}
+
+
+def comparar_trades(referencias, entradas, saidas, resultados_pct):
+    """
+    Mesma janela de cada trade em todas as referências (vetorizado).
+    Retorna {nome: (retorno da referência no período %, excesso do trade %)}.
+    """
+    resultados_pct = np.asarray(resultados_pct, dtype='f8')
+    if len(resultados_pct) == 0:
+        return {nome: (np.zeros(0), np.zeros(0)) for nome in referencias}
+    comparacao = {}
+    for nome, serie in referencias.items():
+        periodo = serie.retorno(entradas, saidas)
+        comparacao[nome] = (periodo, resultados_pct - periodo)
+    return comparacao
+
+
+if __name__ == "__main__":
+    refs = carregar_referencias()
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    for nome, serie in refs.items():
+        if len(serie) == 0:
+            print(f"⚠️ {nome.upper()}: sem dados")
+            continue
+        primeira = pd.Timestamp(int(serie.datas[0])).strftime("%Y-%m-%d")
+        ultima = pd.Timestamp(int(serie.datas[-1])).strftime("%Y-%m-%d")
+        doze_meses = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+        print(f"{nome.upper()}: {len(serie)} observações ({primeira} a {ultima}) | "
+              f"12 meses {serie.retorno(doze_meses, hoje):.2f}% | desde {primeira} {serie.retorno(primeira, hoje):.2f}%")
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from painel import montar_do_cache
+from motor_backtest import RSI_MIN, RSI_MAX, ADX_MIN, STOP_PCT, ALVO_R, DIAS_MAX, painel_indicadores
+from varredura import (CAPITAL_INICIAL, RISCO_POR_TRADE, MINIMO_TRADES, PARAMS_ENTRADA, PARAMS_SAIDA,
+                       arrays_do_painel, trades_por_combinacao, metricas_trades, executar_varredura, ranquear,
+                       ler_grade)
+from metricas import metricas
+
+# --- CONFIGURAÇÃO ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_CARTEIRA = os.path.join(DIRETORIO_BASE, 'carteira_alvo.json')
+CAMINHO_JANELAS = os.path.join(DIRETORIO_BASE, 'walk_forward.csv')
+DATA_INICIO = "2016-01-01"   # Walk-forward precisa de várias janelas de treino + teste
+SIMULACOES = 20_000
+ELEMENTOS_POR_LOTE = 4_000_000   # simulações x trades por lote (~32 MB em float64)
+PERCENTIS = (5, 25, 50, 75, 95)
+LIMITE_DD = 20.0         # % de drawdown considerado inaceitável
+PROB_PREJUIZO_MAX = 5.0  # % das simulações terminando no prejuízo
+TREINO_ANOS = 3
+TESTE_ANOS = 1
+
+# --- ROBUSTEZ ---
+# Um backtest é uma única ordem dos trades e um único conjunto de parâmetros.
+# Monte Carlo: reamostra a lista de trades (bootstrap com reposição, ou só
+# permutação da ordem) em lotes de matrizes simulações x trades e calcula
+# curva, pico e drawdown de todas as linhas de uma vez com cumsum/accumulate.
+# Walk-forward: otimiza a grade da varredura numa janela de treino, aplica os
+# melhores parâmetros no período seguinte (fora da amostra) e rola a janela.
+# Os indicadores vêm do painel do histórico inteiro (são causais), então a
+# janela de teste já começa aquecida e só o recorte de datas muda.
+
+
+def monte_carlo(res, simulacoes=SIMULACOES, capital=CAPITAL_INICIAL, risco=RISCO_POR_TRADE,
+                reposicao=True, seed=42):
+    """
+    Retorno e drawdown máximo (%) de `simulacoes` ordens dos trades (em R,
+    mesma contabilidade do backtester). Retorna (retornos, drawdowns).
+    """
+    pnl = np.asarray(res, dtype='f8') * capital * risco
+    n = len(pnl)
+    retornos, drawdowns = np.zeros(simulacoes), np.zeros(simulacoes)
+    if n == 0:
+        return retornos, drawdowns
+
+    rng = np.random.default_rng(seed)
+    lote = max(1, ELEMENTOS_POR_LOTE // n)
+    for ini in range(0, simulacoes, lote):
+        k = min(lote, simulacoes - ini)
+        if reposicao:
+            curva = pnl[rng.integers(0, n, size=(k, n))]
+        else:
+            curva = rng.permuted(np.broadcast_to(pnl, (k, n)), axis=1)
+        np.cumsum(curva, axis=1, out=curva)
+        curva += capital
+        pico = np.maximum.accumulate(curva, axis=1)
+        np.maximum(pico, capital, out=pico)
+        drawdowns[ini:ini + k] = ((pico - curva) / pico).max(axis=1) * 100
+        retornos[ini:ini + k] = (curva[:, -1] - capital) / capital * 100
+    return retornos, drawdowns
+
+
+def resumo_monte_carlo(retornos, drawdowns, limite_dd=LIMITE_DD):
+    return {
+        "simulacoes": len(retornos),
+        "retorno_pct": {f"p{p}": float(v) for p, v in zip(PERCENTIS, np.percentile(retornos, PERCENTIS))},
+        "drawdown_pct": {f"p{p}": float(v) for p, v in zip(PERCENTIS, np.percentile(drawdowns, PERCENTIS))},
+        "prob_prejuizo": float((retornos < 0).mean() * 100),
+        "prob_dd_acima": float((drawdowns > limite_dd).mean() * 100),
+    }
+
+
+def imprimir_monte_carlo(resumo, limite_dd=LIMITE_DD):
+    r, dd = resumo["retorno_pct"], resumo["drawdown_pct"]
+    print(f"🎲 Monte Carlo ({resumo['simulacoes']} ordens reamostradas)")
+    print("   " + " | ".join(f"{p}: {v:.1f}%" for p, v in r.items()) + "  (retorno)")
+    print("   " + " | ".join(f"{p}: {v:.1f}%" for p, v in dd.items()) + "  (drawdown máx.)")
+    print(f"   P(prejuízo) {resumo['prob_prejuizo']:.1f}% | P(drawdown > {limite_dd:.0f}%) {resumo['prob_dd_acima']:.1f}%")
+
+
+def robusto(resumo, limite_dd=LIMITE_DD, prob_prejuizo_max=PROB_PREJUIZO_MAX):
+    """Critério de aprovação sobre a distribuição, não sobre uma única ordem dos trades."""
+    return resumo["prob_prejuizo"] <= prob_prejuizo_max and resumo["drawdown_pct"]["p95"] <= limite_dd
+
+
+def _ns(data):
+    return pd.Timestamp(data).value
+
+
+def janelas_walk_forward(datas, treino_anos=TREINO_ANOS, teste_anos=TESTE_ANOS):
+    """[(início treino, fim treino = início teste, fim teste)] em ns, teste sem sobreposição."""
+    primeira, ultima = pd.Timestamp(int(datas[0])), pd.Timestamp(int(datas[-1]))
+    janelas = []
+    inicio = primeira
+    while inicio + pd.DateOffset(years=treino_anos) <= ultima:
+        fim_treino = inicio + pd.DateOffset(years=treino_anos)
+        fim_teste = fim_treino + pd.DateOffset(years=teste_anos)
+        janelas.append((_ns(inicio), _ns(fim_treino), min(_ns(fim_teste), int(datas[-1]) + 1)))
+        inicio += pd.DateOffset(years=teste_anos)
+    return janelas
+
+
+def walk_forward(painel, treino_anos=TREINO_ANOS, teste_anos=TESTE_ANOS, grade=None, processos=None,
+                 ordenar_por="retorno_pct", minimo_trades=MINIMO_TRADES):
+    """
+    Otimiza na janela de treino e testa os melhores parâmetros na janela
+    seguinte. Retorna (DataFrame por janela, res fora da amostra, datas de saída).
+    """
+    linhas, res_oos, datas_oos = [], [], []
+    for ini, fim_treino, fim_teste in janelas_walk_forward(painel.datas, treino_anos, teste_anos):
+        linha = {"treino": pd.Timestamp(ini).date(), "teste": pd.Timestamp(fim_treino).date(),
+                 "fim": pd.Timestamp(fim_teste - 1).date()}
+        with metricas.cronometro("otimizacao"):
+            ranking = ranquear(executar_varredura(painel, grade, processos, janela=(ini, fim_treino)),
+                               ordenar_por, minimo_trades)
+        if ranking.empty:
+            linhas.append(linha)
+            continue
+        melhor = ranking.iloc[0]
+        params_entrada = tuple(melhor[p] for p in PARAMS_ENTRADA)
+        params_saida = (melhor["stop_pct"], melhor["alvo_r"], int(melhor["dias_max"]))   # A linha vira float
+
+        with metricas.cronometro("fora_amostra"):
+            arrays = arrays_do_painel(painel, (fim_treino, fim_teste))
+            _, res, datas = next(trades_por_combinacao(arrays, params_saida, [params_entrada], 0))
+        teste = metricas_trades(res, datas)
+        res_oos.append(res)
+        datas_oos.append(datas)
+
+        linha.update({p: melhor[p] for p in PARAMS_ENTRADA + PARAMS_SAIDA})
+        linha.update({"is_trades": int(melhor["trades"]), "is_retorno_pct": melhor["retorno_pct"],
+                      "oos_trades": teste["trades"], "oos_win_rate": teste["win_rate"],
+                      "oos_retorno_pct": teste["retorno_pct"], "oos_drawdown_pct": teste["drawdown_pct"]})
+        # Eficiência: retorno anual fora da amostra / retorno anual no treino
+        anual_is = melhor["retorno_pct"] / treino_anos
+        anual_oos = teste["retorno_pct"] * 365.25 / max((fim_teste - fim_treino) / 86_400e9, 1)
+        linha["eficiencia"] = anual_oos / anual_is if anual_is > 0 else np.nan
+        linhas.append(linha)
+
+    if not res_oos:
+        return pd.DataFrame(linhas), np.zeros(0), np.zeros(0, dtype='i8')
+    return pd.DataFrame(linhas), np.concatenate(res_oos), np.concatenate(datas_oos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo e walk-forward sobre o backtest")
+    parser.add_argument("--inicio", default=DATA_INICIO)
+    parser.add_argument("--simulacoes", type=int, default=SIMULACOES)
+    parser.add_argument("--permutacao", action="store_true", help="Só reordena os trades (sem reposição)")
+    parser.add_argument("--treino", type=int, default=TREINO_ANOS, help="anos")
+    parser.add_argument("--teste", type=int, default=TESTE_ANOS, help="anos")
+    parser.add_argument("--grade", help="Faixas da varredura: JSON ou arquivo .json")
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--ordenar-por", default="retorno_pct", choices=["retorno_pct", "win_rate", "trades"])
+    parser.add_argument("--sem-walk-forward", action="store_true")
+    args = parser.parse_args()
+
+    grade = ler_grade(args.grade)
+    try:
+        with open(CAMINHO_CARTEIRA, "r") as f:
+            ativos = json.load(f)
+    except:
+        raise SystemExit("Erro: Gere a carteira_alvo.json primeiro.")
+
+    print(f"--- ROBUSTEZ ({len(ativos)} ativos desde {args.inicio}) ---")
+    metricas.iniciar("robustez")
+    with metricas.cronometro("indicadores"):
+        ohlcv = montar_do_cache(ativos, inicio=args.inicio)
+        painel = painel_indicadores(ohlcv)
+        ohlcv.liberar()
+    try:
+        # 1) Parâmetros atuais do motor no período inteiro
+        padrao = ((STOP_PCT, ALVO_R, DIAS_MAX), [(RSI_MIN, RSI_MAX, ADX_MIN)])
+        _, res, datas = next(trades_por_combinacao(arrays_do_painel(painel), *padrao))
+        base = metricas_trades(res, datas)
+        print(f"\nParâmetros atuais: {base['trades']} trades | win rate {base['win_rate']:.1f}% | "
+              f"retorno {base['retorno_pct']:.1f}% | drawdown {base['drawdown_pct']:.1f}%")
+        t0 = time.perf_counter()
+        with metricas.cronometro("monte_carlo"):
+            resumo = resumo_monte_carlo(*monte_carlo(res, args.simulacoes, reposicao=not args.permutacao))
+        imprimir_monte_carlo(resumo)
+        print(f"   ({time.perf_counter() - t0:.2f}s) -> {'✅ ROBUSTO' if robusto(resumo) else '⚠️ FRÁGIL'}")
+
+        # 2) Walk-forward
+        if not args.sem_walk_forward:
+            print(f"\n🔁 Walk-forward: treino {args.treino}a -> teste {args.teste}a")
+            janelas, res_oos, datas_oos = walk_forward(painel, args.treino, args.teste, grade,
+                                                       args.processos, args.ordenar_por)
+            if janelas.empty:
+                print("Histórico curto demais para uma janela de treino.")
+            else:
+                janelas.to_csv(CAMINHO_JANELAS, index=False)
+                print(janelas.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+                oos = metricas_trades(res_oos, datas_oos)
+                print(f"\nFora da amostra (janelas encadeadas): {oos['trades']} trades | "
+                      f"win rate {oos['win_rate']:.1f}% | retorno {oos['retorno_pct']:.1f}% | "
+                      f"drawdown {oos['drawdown_pct']:.1f}% | eficiência média {janelas.get('eficiencia', pd.Series(dtype='f8')).mean():.2f}")
+                if len(res_oos):
+                    imprimir_monte_carlo(resumo_monte_carlo(*monte_carlo(res_oos, args.simulacoes,
+                                                                         reposicao=not args.permutacao)))
+                print(f"Janelas salvas em {CAMINHO_JANELAS}")
+    finally:
+        painel.liberar()
+    metricas.finalizar(ativos=len(ativos))
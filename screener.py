@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from indicadores_incrementais import atualizar_indicadores
+from painel import Painel
+
+# --- HARD SCREEN & FEATURE ENGINEERING ---
+# Sem dependências de IA/Telegram: roda em workers de processo e no modo screen-only.
+RSI_MIN = 35
+RSI_MAX = 65
+ADX_MIN = 20
+
+def avaliar_setup(ticker, df):
+    """
+    Aplica as regras do setup na última barra do DF OHLCV.
+    Retorna (aprovado, features) - features vazio se o ativo não pôde ser avaliado.
+    """
+    # Filtro de Data (Evita dados velhos)
+    if (datetime.now() - df.index[-1].to_pydatetime()).days > 5:
+        return False, {}
+
+    # --- CÁLCULO DE INDICADORES ---
+    # Motor incremental: só as barras novas desde a última execução são
+    # processadas (SMA200, SMA50, RSI, ADX, ATR e Vol_SMA20, fórmulas da lib `ta`)
+    atual = atualizar_indicadores(ticker, df)
+    if atual is None: return False, {}
+
+    # --- REGRAS DE FILTRO ---
+    tendencia = (atual['Close'] > atual['SMA200']) and (atual['Close'] > atual['SMA50'])
+    forca = atual['ADX'] > ADX_MIN
+    pullback = (atual['RSI'] < RSI_MAX) and (atual['RSI'] > RSI_MIN)
+
+    aprovado = tendencia and forca and pullback
+
+    # --- FEATURE ENGINEERING (A FOTO DO MOMENTO) ---
+    try:
+        vol_ratio = float(atual['Volume'] / atual['Vol_SMA20']) if atual['Vol_SMA20'] > 0 else 0.0
+    except:
+        vol_ratio = 0.0
+
+    features = {
+        "preco_entrada": float(atual['Close']),
+        "rsi": float(atual['RSI']),
+        "adx": float(atual['ADX']),
+        "atr_absoluto": float(atual['ATR']),
+        "atr_percentual": float(atual['ATR'] / atual['Close']) * 100,
+
+        # Distância das Médias (%)
+        "distancia_sma200_pct": float((atual['Close'] - atual['SMA200']) / atual['SMA200']) * 100,
+        "distancia_sma50_pct": float((atual['Close'] - atual['SMA50']) / atual['SMA50']) * 100,
+
+        # Volume Ratio
+        "volume_ratio": vol_ratio,
+
+        # Contexto Temporal
+        "dia_semana": df.index[-1].weekday(), # 0=Seg, 4=Sex
+        "mes": df.index[-1].month
+    }
+
+    return aprovado, features
+
+
+def avaliar_do_painel(descritor, ticker):
+    """Versão para workers: anexa o painel do lote (sem cópia/pickle do DF) e avalia o ativo."""
+    painel = Painel.anexar(descritor)
+    try:
+        return avaliar_setup(ticker, painel.para_df(ticker))
+    finally:
+        painel.fechar()
@@ -0,0 +1,136 @@
+import os
+import sys
+import signal
+import argparse
+import threading
+from datetime import timedelta
+from concurrent.futures.process import BrokenProcessPool
+
+import main_production as robo
+import calendario_b3 as cal
+from auditor import auditar
+from dados_mercado import carregar_ohlcv
+from notificador import notificador
+
+# --- MODO RESIDENTE ---
+# Um processo só, de segunda a sexta: bibliotecas, pool do screener, Crews,
+# estado dos indicadores e cache OHLCV (mmap) ficam carregados entre rodadas.
+# O robô opera barras diárias: a "barra nova" é o pregão fechado. O Yahoo já
+# mostra a barra parcial do dia desde a abertura (e com ~15 min de atraso), então
+# a barra só conta como fechada quando Close/Volume do ativo sentinela param de
+# mudar por BARRA_ESTAVEL_MIN depois do fechamento; aí a carteira é escaneada.
+# Durante o pregão o auditor roda na sua própria cadência.
+TICKER_SENTINELA = os.getenv("TICKER_SENTINELA", "^BVSP")
+INTERVALO_POLL_SEG = int(os.getenv("RESIDENTE_POLL_SEG", "60"))
+MARGEM_FECHAMENTO_MIN = int(os.getenv("RESIDENTE_MARGEM_MIN", "10"))   # Leilão de fechamento + publicação
+LIMITE_ESPERA_BARRA_MIN = int(os.getenv("RESIDENTE_LIMITE_BARRA_MIN", "180"))
+BARRA_ESTAVEL_MIN = int(os.getenv("RESIDENTE_BARRA_ESTAVEL_MIN", "15"))   # Cobre o atraso do Yahoo e o leilão
+AUDITORIA_INTERVALO_MIN = int(os.getenv("AUDITORIA_INTERVALO_MIN", "30"))
+
+
+class RoboResidente:
+    def __init__(self):
+        # Processos do screener sobem antes de qualquer thread (fork seguro) e duram o serviço todo
+        self.pool_screen = robo.criar_pool_screen()
+        # Entrega do Telegram numa thread do serviço (inclusive o que ficou na fila da última execução)
+        notificador.iniciar()
+        self.parar = threading.Event()
+        self.ultimo_scan = None         # Último pregão escaneado
+        self.ultimo_fechamento = None   # Último pregão com auditoria de fechamento enviada
+        self.proxima_auditoria = None
+        self.leitura_sentinela = None   # (dia, close, volume, visto desde)
+        self.codigo_saida = 0
+
+    def barra_fechada_disponivel(self, dia, momento):
+        """Barra do dia publicada e sem mudar há BARRA_ESTAVEL_MIN (não é mais a parcial)."""
+        df = carregar_ohlcv(TICKER_SENTINELA, periodo="5d", forcar=True)
+        if df.empty or df.index[-1].date() < dia:
+            return False
+        ultima = df.iloc[-1]
+        leitura = (dia, float(ultima['Close']), float(ultima['Volume']))
+        if self.leitura_sentinela is None or self.leitura_sentinela[:3] != leitura:
+            self.leitura_sentinela = (*leitura, momento)
+            return False
+        return momento - self.leitura_sentinela[3] >= timedelta(minutes=BARRA_ESTAVEL_MIN)
+
+    def _tarefa(self, nome, funcao, *args, **kwargs):
+        """Erros são impressos: uma rodada com problema não derruba o serviço."""
+        try:
+            funcao(*args, **kwargs)
+        except Exception as e:
+            print(f"Erro no modo residente ({nome}): {e}")
+
+    def escanear(self):
+        try:
+            robo.rodar_robo(pool_screen=self.pool_screen, forcar_dados=True)
+        except BrokenProcessPool as e:
+            # Refazer o fork aqui não é seguro (threads do notificador/pipeline já existem):
+            # sai com erro e o supervisor (systemd etc.) sobe um processo novo
+            print(f"🛑 Pool do screener quebrado ({e}). Encerrando para o supervisor reiniciar o serviço.")
+            self.codigo_saida = 1
+            self.parar.set()
+        except Exception as e:
+            print(f"Erro no modo residente (scan): {e}")
+
+    def ciclo(self, momento):
+        """Uma volta do agendador. Retorna o momento da próxima volta."""
+        dia = momento.date()
+        if not cal.eh_pregao(dia):
+            return cal.proxima_abertura(momento)
+
+        abertura, fechamento = cal.horario_pregao(dia)
+        if momento < abertura:
+            return abertura
+
+        if momento < fechamento:
+            # Durante o pregão: só a auditoria (stops/alvos intraday), sem Telegram
+            if self.proxima_auditoria is None or momento >= self.proxima_auditoria:
+                self._tarefa("auditoria", auditar, enviar=False)
+                self.proxima_auditoria = momento + timedelta(minutes=AUDITORIA_INTERVALO_MIN)
+            return min(self.proxima_auditoria, fechamento + timedelta(minutes=MARGEM_FECHAMENTO_MIN))
+
+        if momento < fechamento + timedelta(minutes=MARGEM_FECHAMENTO_MIN):
+            return fechamento + timedelta(minutes=MARGEM_FECHAMENTO_MIN)
+
+        if self.ultimo_scan != dia:
+            atrasada = momento >= fechamento + timedelta(minutes=LIMITE_ESPERA_BARRA_MIN)
+            if not atrasada and not self.barra_fechada_disponivel(dia, momento):
+                return momento + timedelta(seconds=INTERVALO_POLL_SEG)
+            if atrasada:
+                print(f"⚠️ Barra de {dia} não apareceu em {TICKER_SENTINELA}. Escaneando assim mesmo.")
+            if self.ultimo_fechamento != dia:
+                # Fecha os trades com a barra do dia antes de abrir novos
+                self._tarefa("auditoria", auditar, enviar=True)
+                self.ultimo_fechamento = dia
+            self.escanear()
+            self.ultimo_scan = dia
+            self.proxima_auditoria = None
+
+        return cal.proxima_abertura(momento)
+
+    def rodar(self, escanear_agora=False):
+        print(f"--- MODO RESIDENTE (sentinela {TICKER_SENTINELA}) ---")
+        if escanear_agora:
+            self.escanear()
+        while not self.parar.is_set():
+            momento = cal.agora()
+            proxima = self.ciclo(momento)
+            espera = max(1.0, (proxima - cal.agora()).total_seconds())
+            if espera > 300:
+                print(f"💤 Próxima verificação: {proxima:%d/%m %H:%M}")
+            self.parar.wait(espera)
+        self.pool_screen.shutdown()
+        notificador.aguardar()
+        print("--- MODO RESIDENTE ENCERRADO ---")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Robô residente agendado pelo calendário da B3")
+    parser.add_argument("--agora", action="store_true", help="Escaneia a carteira ao subir, sem esperar o fechamento")
+    args = parser.parse_args()
+
+    residente = RoboResidente()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sinal, lambda *_: residente.parar.set())
+    residente.rodar(escanear_agora=args.agora)
+    sys.exit(residente.codigo_saida)
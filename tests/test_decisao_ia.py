@@ -0,0 +1,210 @@
+import pytest
+
+from decisao_ia import DecisaoInvalida, _para_float, extrair_json, validar_decisao, interpretar_decisao
+
+
+# --- _para_float ---
+@pytest.mark.parametrize("valor, esperado", [
+    (34.5, 34.5),
+    (34, 34.0),
+    ("34.5", 34.5),
+    ("R$ 34,50", 34.5),
+    ("1.234,56", 1234.56),
+    ("1,234.56", 1234.56),
+    ("-2,5", -2.5),
+    ("1.300", 1.3),          # Sem contexto pt-BR o ponto é decimal
+])
+def test_para_float(valor, esperado):
+    assert _para_float(valor) == pytest.approx(esperado)
+
+
+@pytest.mark.parametrize("valor", [None, True, "abc", "", [1.0]])
+def test_para_float_invalido(valor):
+    assert _para_float(valor) is None
+
+
+def test_para_float_milhar_com_virgula_decimal():
+    assert _para_float("1.300", virgula_decimal=True) == 1300.0
+    assert _para_float("12.300.000", virgula_decimal=True) == 12300000.0
+    # Só ponto seguido de exatamente três dígitos vira milhar
+    assert _para_float("1.3", virgula_decimal=True) == 1.3
+    assert _para_float("12.50", virgula_decimal=True) == 12.5
+
+
+# --- extrair_json ---
+def test_extrair_json_puro():
+    dados, correcoes = extrair_json('{"decisao": "COMPRA"}')
+    assert dados == {"decisao": "COMPRA"}
+    assert correcoes == []
+
+
+def test_extrair_json_cercas_nao_contam_como_correcao():
+    dados, correcoes = extrair_json('```json\n{"decisao": "COMPRA"}\n```')
+    assert dados == {"decisao": "COMPRA"}
+    assert correcoes == []
+
+
+def test_extrair_json_texto_em_volta():
+    dados, correcoes = extrair_json('Segue a decisão: {"decisao": "CANCELAR"} Abraços')
+    assert dados == {"decisao": "CANCELAR"}
+    assert correcoes == ["texto fora do JSON"]
+
+
+@pytest.mark.parametrize("bloco", [
+    '{"decisao": "COMPRA", "stop": 10,}',
+    '{"decisao": “COMPRA”, "stop": 10}',
+    '{"decisao": "COMPRA", "extra": None, "ok": True}',
+    '{"decisao": "COMPRA", // comentário\n "stop": 10}',
+])
+def test_extrair_json_sintaxe_reparada(bloco):
+    dados, correcoes = extrair_json(bloco)
+    assert dados["decisao"] == "COMPRA"
+    assert correcoes == ["sintaxe JSON"]
+
+
+def test_extrair_json_aspas_simples():
+    dados, correcoes = extrair_json("{'decisao': 'COMPRA', 'stop': 10.5}")
+    assert dados == {"decisao": "COMPRA", "stop": 10.5}
+    assert correcoes == ["aspas simples"]
+
+
+@pytest.mark.parametrize("texto, problema", [
+    ("Não recomendo a compra.", "resposta sem objeto JSON"),
+    ("} invertido {", "resposta sem objeto JSON"),
+    ('{"decisao": COMPRA sem aspas}', "JSON malformado"),
+])
+def test_extrair_json_invalido(texto, problema):
+    with pytest.raises(DecisaoInvalida) as erro:
+        extrair_json(texto)
+    assert erro.value.problemas == [problema]
+    assert erro.value.texto == texto
+
+
+# --- validar_decisao ---
+def _compra(**campos):
+    return {"ticker": "PETR4.SA", "decisao": "COMPRA", "entrada": 34.5, "stop": 33.0, "alvo": 37.5,
+            "confianca": "ALTA", "motivo": "Pullback na tendência", **campos}
+
+
+def test_validar_decisao_no_contrato():
+    sinal, correcoes, _ = validar_decisao(_compra(), "PETR4.SA")
+    assert correcoes == []
+    assert list(sinal) == ["ticker", "decisao", "entrada", "stop", "alvo", "confianca", "motivo"]
+    assert sinal["decisao"] == "COMPRA"
+
+
+def test_validar_decisao_sinonimos_e_tipos():
+    dados = {"Ativo": "petr4", "Decisão": "comprar", "preco_entrada": "R$ 34,50", "stop_loss": "33,00",
+             "target": "37,50", "confidence": "high", "justificativa": " ok "}
+    sinal, correcoes, _ = validar_decisao(dados, "PETR4.SA")
+    assert sinal["ticker"] == "PETR4.SA"
+    assert (sinal["entrada"], sinal["stop"], sinal["alvo"]) == (34.5, 33.0, 37.5)
+    assert sinal["confianca"] == "ALTA"
+    assert sinal["motivo"] == "ok"
+    assert "campo preco_entrada->entrada" in correcoes
+    assert "decisao" in correcoes
+
+
+def test_validar_decisao_milhar_pt_br():
+    dados = _compra(entrada="1.234,56", stop="1.200,00", alvo="1.300")
+    sinal, correcoes, _ = validar_decisao(dados, "PETR4.SA")
+    assert (sinal["entrada"], sinal["stop"], sinal["alvo"]) == (1234.56, 1200.0, 1300.0)
+    assert correcoes == ["entrada", "stop", "alvo"]
+
+
+def test_validar_decisao_confianca_ausente_vira_media():
+    dados = _compra()
+    del dados["confianca"]
+    sinal, correcoes, _ = validar_decisao(dados, "PETR4.SA")
+    assert sinal["confianca"] == "MEDIA"
+    assert "confianca" in correcoes
+
+
+def test_validar_decisao_entrada_do_setup_tecnico():
+    sinal, correcoes, _ = validar_decisao(_compra(entrada=None), "PETR4.SA", preco=34.0)
+    assert sinal["entrada"] == 34.0
+    assert "entrada do setup técnico" in correcoes
+
+
+def test_validar_decisao_cancelar_sem_precos():
+    dados = {"ticker": "PETR4.SA", "decisao": "veto", "confianca": "MEDIA", "motivo": "Notícia ruim"}
+    sinal, correcoes, _ = validar_decisao(dados, "PETR4.SA", preco=34.0)
+    assert sinal["decisao"] == "CANCELAR"
+    assert sinal["entrada"] is None   # Só a COMPRA herda o preço do setup
+    assert correcoes == ["decisao"]
+
+
+def test_validar_decisao_campos_extras_no_fim():
+    sinal, _, _ = validar_decisao(_compra(risco="baixo"), "PETR4.SA")
+    assert list(sinal)[-1] == "risco"
+
+
+@pytest.mark.parametrize("dados, trecho", [
+    (_compra(decisao="talvez"), "decisao inválida"),
+    (_compra(stop=None), "preços ausentes/inválidos: stop"),
+    (_compra(alvo=-1), "preços ausentes/inválidos: alvo"),
+    (_compra(entrada=40.0), "esperado stop < entrada < alvo"),
+    (_compra(stop=37.5, alvo=33.0), "stop/alvo invertidos"),   # Não troca: o Manager é refeito
+])
+def test_validar_decisao_invalida(dados, trecho):
+    with pytest.raises(DecisaoInvalida) as erro:
+        validar_decisao(dados, "PETR4.SA")
+    assert any(trecho in p for p in erro.value.problemas)
+
+
+@pytest.mark.parametrize("campos", [
+    {"ticker": "PETR4"},               # Ticker completado
+    {"confianca": "alta"},             # Caixa da confiança
+    {"entrada": "34.5", "stop": 33},   # Número em string que float() já lia
+])
+def test_validar_decisao_correcao_cosmetica_nao_era_fatal(campos):
+    _, correcoes, fatais = validar_decisao(_compra(**campos), "PETR4.SA")
+    assert correcoes
+    assert fatais == []
+
+
+def test_validar_decisao_campo_renomeado_so_fatal_se_obrigatorio():
+    dados = _compra()
+    dados["Ticker"] = dados.pop("ticker")
+    _, correcoes, fatais = validar_decisao(dados, "PETR4.SA")
+    assert "campo Ticker->ticker" in correcoes
+    assert fatais == []
+
+    dados = _compra()
+    dados["preco_entrada"] = dados.pop("entrada")
+    _, _, fatais = validar_decisao(dados, "PETR4.SA")
+    assert fatais == ["campo preco_entrada->entrada"]
+
+
+def test_validar_decisao_fatais_antes():
+    dados = _compra(stop="R$ 33,00")
+    del dados["entrada"]
+    _, _, fatais = validar_decisao(dados, "PETR4.SA", preco=34.0)
+    assert fatais == ["entrada do setup técnico", "stop"]
+
+
+def test_interpretar_decisao_reparo_de_sintaxe_era_fatal():
+    _, _, fatais = interpretar_decisao("{'decisao': 'CANCELAR', 'motivo': 'x'}", "PETR4.SA")
+    assert fatais == ["aspas simples"]
+    _, correcoes, fatais = interpretar_decisao('```json\n{"decisao": "cancelar"}\n```', "PETR4.SA")
+    assert correcoes and fatais == []
+
+
+def test_validar_decisao_nao_objeto():
+    with pytest.raises(DecisaoInvalida):
+        validar_decisao(["COMPRA"], "PETR4.SA")
+
+
+# --- interpretar_decisao ---
+def test_interpretar_decisao_junta_correcoes():
+    texto = "Decisão final:\n{'decisao': 'COMPRA', 'entrada': '34,5', 'stop': 33, 'alvo': 37.5, 'confianca': 'ALTA'}"
+    sinal, correcoes, _ = interpretar_decisao(texto, "PETR4.SA")
+    assert sinal["entrada"] == 34.5
+    assert correcoes[:2] == ["texto fora do JSON", "aspas simples"]
+
+
+def test_interpretar_decisao_guarda_texto_no_erro():
+    texto = '{"decisao": "COMPRA", "entrada": 34.5}'
+    with pytest.raises(DecisaoInvalida) as erro:
+        interpretar_decisao(texto, "PETR4.SA")
+    assert erro.value.texto == texto
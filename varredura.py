@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from painel import Painel, montar_do_cache
+from motor_backtest import BARRA_INICIAL, painel_indicadores, sinais_entrada, saidas_por_barra, encadear_trades
+
+# --- CONFIGURAÇÃO ---
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_CARTEIRA = os.path.join(DIRETORIO_BASE, 'carteira_alvo.json')
+CAMINHO_RESULTADO = os.path.join(DIRETORIO_BASE, 'varredura_resultados.csv')
+DATA_INICIO = "2023-01-01"
+CAPITAL_INICIAL = 10000.0
+RISCO_POR_TRADE = 0.02   # Mesma contabilidade em R do backtester.py
+MINIMO_TRADES = 20       # Combinações com poucos trades não entram no ranking
+
+# Faixas padrão (o produto cartesiano é a grade). O backtester usa RSI 35-55;
+# o validar_setup_v2 usa RSI < 65 -> a grade cobre os dois.
+GRADE_PADRAO = {
+    "rsi_min": [30, 35, 40],
+    "rsi_max": [55, 60, 65],
+    "adx_min": [15, 20, 25],
+    "stop_pct": [0.95, 0.96, 0.97],
+    "alvo_r": [1.5, 2.0, 2.5],
+    "dias_max": [10, 15, 20],
+}
+PARAMS_ENTRADA = ("rsi_min", "rsi_max", "adx_min")
+PARAMS_SAIDA = ("stop_pct", "alvo_r", "dias_max")
+
+# Indicadores de todos os ativos num painel float32 em memória compartilhada,
+# calculado uma vez no processo pai. O worker recebe só o descritor e monta
+# views sobre o mesmo bloco (sem cópia nem pickle dos arrays).
+_PAINEL = None
+_ARRAYS = {}
+_BARRA_INICIAL = BARRA_INICIAL
+
+
+def recortar(a, janela):
+    """Arrays do ativo só dentro de `janela` = (início, fim) em ns, fim exclusivo (views)."""
+    if janela is None:
+        return a
+    ini, fim = np.searchsorted(a['datas'], janela)
+    return {c: v[ini:fim] for c, v in a.items()}
+
+
+def arrays_do_painel(painel, janela=None):
+    """{ticker: arrays} de todos os ativos com barras na janela."""
+    arrays = {t: recortar(painel.arrays(t), janela) for t in painel.tickers}
+    return {t: a for t, a in arrays.items() if len(a['datas'])}
+
+
+def _iniciar_worker(descritor, janela=None):
+    global _PAINEL, _ARRAYS, _BARRA_INICIAL
+    _PAINEL = Painel.anexar(descritor)
+    _ARRAYS = arrays_do_painel(_PAINEL, janela)
+    # Janela recortada: os indicadores já vêm aquecidos do histórico anterior
+    _BARRA_INICIAL = BARRA_INICIAL if janela is None else 0
+
+
+def metricas_trades(res, datas_saida):
+    """Win rate, retorno e drawdown máximo da curva de capital em ordem cronológica."""
+    total = len(res)
+    if total == 0:
+        return {"trades": 0, "win_rate": 0.0, "retorno_pct": 0.0, "drawdown_pct": 0.0}
+    res = res[np.argsort(datas_saida, kind='stable')]
+    risco_reais = CAPITAL_INICIAL * RISCO_POR_TRADE
+    curva = CAPITAL_INICIAL + np.cumsum(res * risco_reais)
+    pico = np.maximum.accumulate(np.concatenate([[CAPITAL_INICIAL], curva]))[1:]
+    return {
+        "trades": total,
+        "win_rate": float((res > 0).sum() / total * 100),
+        "retorno_pct": float((curva[-1] - CAPITAL_INICIAL) / CAPITAL_INICIAL * 100),
+        "drawdown_pct": float(((pico - curva) / pico).max() * 100),
+    }
+
+
+def trades_por_combinacao(arrays, params_saida, combos_entrada, barra_inicial=BARRA_INICIAL):
+    """Gera (combinação, res em R, datas de saída) de cada entrada x o mesmo conjunto de saída."""
+    stop_pct, alvo_r, dias_max = params_saida
+
+    # As saídas por barra só dependem dos parâmetros de saída: calcula uma vez por ativo
+    saidas = {t: saidas_por_barra(a['close'], a['high'], a['low'], stop_pct, alvo_r, dias_max)
+              for t, a in arrays.items()}
+
+    for rsi_min, rsi_max, adx_min in combos_entrada:
+        res_todos, datas_todas = [np.zeros(0)], [np.zeros(0, dtype='i8')]
+        for ticker, a in arrays.items():
+            saida, res = saidas[ticker]
+            entradas = encadear_trades(sinais_entrada(a, rsi_min, rsi_max, adx_min), saida, barra_inicial)
+            res_todos.append(res[entradas])
+            datas_todas.append(a['datas'][saida[entradas]])
+        combo = dict(zip(PARAMS_ENTRADA + PARAMS_SAIDA, (rsi_min, rsi_max, adx_min, stop_pct, alvo_r, dias_max)))
+        yield combo, np.concatenate(res_todos), np.concatenate(datas_todas)
+
+
+def _avaliar_bloco(params_saida, combos_entrada):
+    """Uma tarefa do pool: um conjunto de parâmetros de saída x várias entradas."""
+    return [{**combo, **metricas_trades(res, datas)}
+            for combo, res, datas in trades_por_combinacao(_ARRAYS, params_saida, combos_entrada, _BARRA_INICIAL)]
+
+
+def executar_varredura(painel, grade=None, processos=None, janela=None):
+    """
+    Roda todas as combinações da grade sobre o painel de indicadores (pool de
+    processos). `janela` = (início, fim) em ns restringe as datas. Retorna DataFrame.
+    """
+    grade = {**GRADE_PADRAO, **(grade or {})}
+    combos_entrada = [c for c in itertools.product(*(grade[p] for p in PARAMS_ENTRADA)) if c[0] < c[1]]
+    combos_saida = list(itertools.product(*(grade[p] for p in PARAMS_SAIDA)))
+
+    linhas = []
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_worker,
+                             initargs=(painel.descritor, janela)) as pool:
+        futuros = [pool.submit(_avaliar_bloco, s, combos_entrada) for s in combos_saida]
+        for futuro in futuros:
+            linhas.extend(futuro.result())
+    return pd.DataFrame(linhas)
+
+
+# Sentido de cada critério (drawdown: menor é melhor) e o desempate usado com ele
+CRESCENTE = {"retorno_pct": False, "win_rate": False, "trades": False, "drawdown_pct": True}
+DESEMPATE = {"drawdown_pct": "retorno_pct"}
+
+
+def ranquear(df, ordenar_por="retorno_pct", minimo_trades=MINIMO_TRADES):
+    df = df[df['trades'] >= minimo_trades]
+    desempate = DESEMPATE.get(ordenar_por, "drawdown_pct")
+    return df.sort_values([ordenar_por, desempate],
+                          ascending=[CRESCENTE[ordenar_por], CRESCENTE[desempate]]).reset_index(drop=True)
+
+
+def ler_grade(valor):
+    """--grade: JSON direto na linha de comando ou caminho de um arquivo .json."""
+    if valor is None:
+        return None
+    if valor.lstrip().startswith("{"):
+        return json.loads(valor)
+    with open(valor, "r") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid search dos parâmetros do backtester")
+    parser.add_argument("--grade", help="Faixas da grade: JSON (ex: '{\"rsi_max\": [55, 65]}') ou arquivo .json")
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--ordenar-por", default="retorno_pct",
+                        choices=list(CRESCENTE))
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    grade = ler_grade(args.grade)
+
+    try:
+        with open(CAMINHO_CARTEIRA, "r") as f:
+            ativos = json.load(f)
+    except:
+        raise SystemExit("Erro: Gere a carteira_alvo.json primeiro.")
+
+    print(f"--- VARREDURA DE PARÂMETROS ({DATA_INICIO}) ---")
+    inicio = time.perf_counter()
+    ohlcv = montar_do_cache(ativos, inicio=DATA_INICIO)
+    painel = painel_indicadores(ohlcv)
+    ohlcv.liberar()
+    try:
+        resultado = executar_varredura(painel, grade, args.processos)
+    finally:
+        n_ativos = len(painel.tickers)
+        painel.liberar()
+    ranking = ranquear(resultado, args.ordenar_por)
+    ranking.to_csv(CAMINHO_RESULTADO, index=False)
+
+    print(f"{len(resultado)} combinações x {n_ativos} ativos em {time.perf_counter() - inicio:.1f}s")
+    print(ranking.head(args.top).to_string(float_format=lambda v: f"{v:.2f}"))
+    print(f"Ranking completo salvo em {CAMINHO_RESULTADO}")